@@ -0,0 +1,109 @@
+"""
+API login
+
+``POST /api/login/`` takes an ``identifier`` (phone, or email if it contains
+``@``) and a ``password`` and returns a JWT pair. The old flow OR-ed email,
+phone and ``name__iexact`` (no index can answer that), compared plaintext
+and echoed the whole user row, password included.
+
+* The identifier is resolved through one unique index, and the handful of
+  fields login needs are cached per identifier, so a repeat login usually
+  runs no query at all. The records hold password hashes, so they stay in
+  the per-process ``local`` tier and never reach the shared (on-disk)
+  cache; only the namespace version is shared. Once a save/delete that
+  touches a login field commits, the User signals bump that version and
+  every process drops its records.
+* Passwords are checked with Django's hashers. Accounts still holding a
+  plaintext password are accepted (constant-time compare) and upgraded to a
+  hash on that login.
+* Later calls send ``Authorization: Bearer <access>``;
+  JWTStatelessUserAuthentication validates the signature without touching
+  the users or sessions tables. ``/api/token/refresh/`` renews the access token.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from django.db import transaction
+from django.utils.crypto import constant_time_compare
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .caching import LOCAL_CACHE, CacheNamespace
+from .models import User
+
+LOGIN_CACHE_TIMEOUT = getattr(settings, 'LOGIN_CACHE_TIMEOUT', 60 * 10)
+LOGIN_FIELDS = ('id', 'password', 'is_active', 'name', 'email', 'phone', 'role')
+
+login_cache = CacheNamespace('login', alias=LOCAL_CACHE, timeout=LOGIN_CACHE_TIMEOUT, versioned=True)
+
+
+def login_lookup(identifier):
+    """(field, value) for the unique column ``identifier`` refers to, or None"""
+    identifier = (identifier or '').strip()
+    if not identifier:
+        return None
+    if '@' in identifier:
+        return 'email', identifier
+    # As typed: stored phones were never normalised, so stripping spaces/dashes would miss them
+    return 'phone', identifier
+
+
+def _cache_key(field, value):
+    # Hashed: identifiers as typed may hold spaces, which are not valid cache key characters
+    return f'{field}:{hashlib.sha1(value.lower().encode()).hexdigest()}'
+
+
+def get_login_record(identifier):
+    """The LOGIN_FIELDS of the user ``identifier`` names (cached), or None"""
+    lookup = login_lookup(identifier)
+    if lookup is None:
+        return None
+    key = _cache_key(*lookup)
+    record = login_cache.get(key)
+    if record is None:
+        record = User.objects.filter(**dict([lookup])).values(*LOGIN_FIELDS).first()
+        if record is not None:
+            login_cache.set(key, record)
+    return record
+
+
+def invalidate_login_cache():
+    """Make every process drop its cached login records"""
+    login_cache.clear()
+
+
+def is_password_hashed(stored):
+    try:
+        identify_hasher(stored)
+    except ValueError:
+        return False
+    return True
+
+
+def verify_password(stored, raw):
+    """Check ``raw`` against a stored password, hashed or (legacy) plaintext"""
+    if not stored or raw is None:
+        return False
+    if is_password_hashed(stored):
+        return check_password(raw, stored)
+    return constant_time_compare(stored, raw)
+
+
+def authenticate_login(identifier, password):
+    """The login record for valid credentials of an active user, else None"""
+    record = get_login_record(identifier)
+    if record is None or not record['is_active'] or not verify_password(record['password'], password):
+        return None
+    if not is_password_hashed(record['password']):
+        User.objects.filter(pk=record['id'], password=record['password']).update(password=make_password(password))
+        transaction.on_commit(invalidate_login_cache)
+    return record
+
+
+def issue_tokens(record):
+    """A refresh/access pair for a login record (no user query needed)"""
+    refresh = RefreshToken()
+    refresh[jwt_settings.USER_ID_CLAIM] = record['id']
+    refresh['role'] = record['role']
+    return {'refresh': str(refresh), 'access': str(refresh.access_token)}
@@ -0,0 +1,471 @@
+"""
+Seeded view benchmarks
+
+The ``benchmark_views`` command builds a throwaway test database, seeds it
+with a production-shaped dataset (``SCALES``: works, SIMs, EC sales and the
+supervisor → FOS → retailer tree) and drives the critical pages through the
+test client. Each scenario records its query count and median time over
+several runs, and the results are compared with the stored baselines in
+BENCHMARK_BASELINE_PATH, keyed by scale and database vendor:
+
+* any rise in a scenario's query count is a regression;
+* so is a median slower than baseline * BENCHMARK_TIME_TOLERANCE plus
+  BENCHMARK_TIME_SLACK_MS (the slack absorbs timer noise on small pages).
+
+POST scenarios (work close, EC upload, SIM batch accept) get fresh rows
+before every run, outside the timed part, so each run does the full write.
+"""
+import json
+import logging
+import random
+import statistics
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from .dispatch import rebuild_technician_load
+from .hierarchy import rebuild_user_hierarchy
+from .models import (
+    CollectionTransfer, EcSale, FosOperatorMap, FosWallet, Operator, Pincode, PincodeAssignment, Product,
+    RetailerFosMap, RetailerWallet, SimStock, SimTransfer, SupervisorCategory, SupervisorWallet, TypeOfService,
+    User, UserProductStock, WorkFromTheRole, WorkReport, WorkStb,
+)
+from .query_budget import QueryRecorder
+from .stock_summary import rebuild_stock_summary
+from .user_search import normalize_name
+
+BENCHMARK_BASELINE_PATH = Path(getattr(
+    settings, 'BENCHMARK_BASELINE_PATH', Path(__file__).resolve().parent / 'benchmark_baselines.json'
+))
+BENCHMARK_TIME_TOLERANCE = getattr(settings, 'BENCHMARK_TIME_TOLERANCE', 1.5)
+BENCHMARK_TIME_SLACK_MS = getattr(settings, 'BENCHMARK_TIME_SLACK_MS', 25)
+
+SCALES = {
+    'full': {
+        'works': 50_000, 'sims': 200_000, 'ec_sales': 100_000, 'retailers': 5_000,
+        'supervisors': 20, 'fos': 200, 'technicians': 200, 'pincodes': 500, 'products': 10,
+    },
+    'small': {
+        'works': 1_000, 'sims': 4_000, 'ec_sales': 2_000, 'retailers': 100,
+        'supervisors': 4, 'fos': 10, 'technicians': 10, 'pincodes': 20, 'products': 3,
+    },
+}
+
+BATCH_SIZE = 2000
+BENCH_PASSWORD = 'bench'
+OPERATORS = ('Airtel', 'Jio', 'Vi', 'Tata Play')
+
+
+class BenchmarkError(Exception):
+    """A scenario failed to run (error status or its write did not happen)"""
+
+
+# ==================== SEEDING ====================
+
+def _create_users(role, count, extra=None, start=0):
+    """Bulk-create ``count`` users of ``role``; returns them re-read in id order"""
+    users = []
+    for i in range(count):
+        name = f'Bench {role.title()} {i}'
+        users.append(User(
+            name=name,
+            # bulk_create skips User.save(), which normally fills search_name
+            search_name=normalize_name(name),
+            phone=f'{7_000_000_000 + start + i}',
+            email=f'bench.{role}{i}@example.com',
+            password=BENCH_PASSWORD,
+            role=role,
+            **(extra(i) if extra else {}),
+        ))
+    User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+    return list(User.objects.filter(role=role).order_by('id'))
+
+
+def seed_benchmark_data(scale='small', seed=1):
+    """Fill the (test) database with a ``SCALES[scale]`` dataset; returns the users and rows scenarios need"""
+    sizes = SCALES[scale]
+    rng = random.Random(seed)
+    now = timezone.now()
+    today = timezone.localdate()
+
+    operators = [Operator.objects.create(name=name) for name in OPERATORS]
+    services = [TypeOfService.objects.create(name=name) for name in ('Installation', 'Repair')]
+    sources = [WorkFromTheRole.objects.create(name=name) for name in ('Office', 'Field')]
+    category, _ = SupervisorCategory.objects.get_or_create(name='Both')
+
+    admin = User.objects.create_user(
+        name='Bench Admin', phone='6999999999', email='bench.admin@example.com', password=BENCH_PASSWORD, role='admin'
+    )
+    admin.is_admin = True
+    admin.save(update_fields=['is_admin'])
+
+    supervisors = _create_users('supervisor', sizes['supervisors'], lambda i: {'supervisor_category': category})
+    fos_users = _create_users(
+        'fos', sizes['fos'], lambda i: {'supervisor': supervisors[i % len(supervisors)]}, start=100_000,
+    )
+    technicians = _create_users(
+        'technician', sizes['technicians'],
+        lambda i: {
+            'supervisor': supervisors[i % len(supervisors)],
+            'technician_type': 'freelance' if i % 5 == 0 else 'own',
+            'collection_amount': Decimal('5000.00'),
+        },
+        start=200_000,
+    )
+    retailers = _create_users('retailer', sizes['retailers'], start=300_000)
+
+    # Retailer → FOS → supervisor tree, then the closure table over it
+    fos_of = {retailer.id: fos_users[i % len(fos_users)] for i, retailer in enumerate(retailers)}
+    RetailerFosMap.objects.bulk_create(
+        [RetailerFosMap(retailer=retailer, fos=fos_of[retailer.id]) for retailer in retailers], batch_size=BATCH_SIZE
+    )
+    FosOperatorMap.objects.bulk_create(
+        [FosOperatorMap(fos=fos, operator=operator) for fos in fos_users for operator in operators],
+        batch_size=BATCH_SIZE,
+    )
+    rebuild_user_hierarchy()
+
+    pincodes = [f'{600_001 + i}' for i in range(sizes['pincodes'])]
+    Pincode.objects.bulk_create(
+        [Pincode(pincode=code, area_name=f'Area {code}', city='Chennai', state='Tamil Nadu') for code in pincodes]
+    )
+    PincodeAssignment.objects.bulk_create([
+        PincodeAssignment(pincode=pincode, supervisor=supervisors[i % len(supervisors)], assigned_by=admin)
+        for i, pincode in enumerate(Pincode.objects.order_by('pincode'))
+    ])
+
+    Product.objects.bulk_create([
+        Product(name=f'{operator.name} Item {i}', operator=operator, price=Decimal('250.00'))
+        for operator in operators for i in range(sizes['products'])
+    ])
+    products = list(Product.objects.order_by('id'))
+    UserProductStock.objects.bulk_create(
+        [UserProductStock(user=holder, product=product, qty=Decimal(rng.randrange(1, 50)))
+         for holder in [admin, *supervisors, *technicians] for product in products],
+        batch_size=BATCH_SIZE,
+    )
+
+    _seed_works(rng, sizes['works'], now, operators, services, sources, technicians, pincodes, admin)
+    _seed_sims(rng, sizes['sims'], now, operators, admin, supervisors, fos_users, retailers)
+    _seed_ec_sales(rng, sizes['ec_sales'], today, operators, retailers, fos_of, admin)
+
+    CollectionTransfer.objects.bulk_create([
+        CollectionTransfer(technician=technician, supervisor_id=technician.supervisor_id, amount=Decimal(amount))
+        for technician in technicians for amount in (500, 750)
+    ] + [
+        CollectionTransfer(technician=supervisor, supervisor=admin, amount=Decimal('1500.00'))
+        for supervisor in supervisors
+    ])
+
+    first_supervisor = supervisors[0]
+    fos = next(user for user in fos_users if user.supervisor_id == first_supervisor.id)
+    return SimpleNamespace(
+        scale=scale,
+        admin=admin,
+        supervisor=first_supervisor,
+        fos=fos,
+        retailers=[retailer for retailer in retailers if fos_of[retailer.id].id == fos.id],
+        operator=operators[0],
+    )
+
+
+def _seed_works(rng, count, now, operators, services, sources, technicians, pincodes, admin):
+    statuses = ('Pending', 'Closed', 'Cancelled', 'Expired')
+    works = []
+    for i in range(count):
+        technician = rng.choice(technicians)
+        status = rng.choices(statuses, weights=(30, 60, 5, 5))[0]
+        works.append(WorkStb(
+            customer_name=f'Customer {i}',
+            address=f'{i} Bench Street',
+            pincode=rng.choice(pincodes),
+            mobile_no=f'{8_000_000_000 + i}',
+            operator=rng.choice(operators),
+            type_of_service=rng.choice(services),
+            work_from=rng.choice(sources),
+            work_deadline_time=now + timedelta(hours=rng.randrange(-96, 96)),
+            work_closing_time=now if status == 'Closed' else None,
+            created_by=admin,
+            supervisor_id=technician.supervisor_id,
+            assigned_technician=technician,
+            amount=Decimal(rng.choice((150, 250, 400))),
+            status=status,
+        ))
+    WorkStb.objects.bulk_create(works, batch_size=BATCH_SIZE)
+
+    # Every work has a report (a post_save signal makes it, which bulk_create skips)
+    WorkReport.objects.bulk_create(
+        [WorkReport(
+            work_id=work_id,
+            subtotal_amount=amount,
+            collected_amount=amount if status == 'Closed' else 0,
+            who_collected_id=technician_id if status == 'Closed' else None,
+        ) for work_id, status, amount, technician_id in WorkStb.objects.values_list(
+            'id', 'status', 'amount', 'assigned_technician_id'
+        ).iterator()],
+        batch_size=BATCH_SIZE,
+    )
+    rebuild_technician_load()
+
+
+def _seed_sims(rng, count, now, operators, admin, supervisors, fos_users, retailers):
+    holders = ((admin,), supervisors, fos_users, retailers)
+    sims = []
+    for i in range(count):
+        sold = rng.random() < 0.2
+        sims.append(SimStock(
+            serial_number=f'8991{i:012d}',
+            operator=rng.choice(operators),
+            current_holder=rng.choice(rng.choices(holders, weights=(40, 20, 20, 20))[0]),
+            status='sold' if sold else 'available',
+            purchase_price=Decimal('20.00'),
+            selling_price=Decimal('25.00'),
+            sold_date=now if sold else None,
+        ))
+    SimStock.objects.bulk_create(sims, batch_size=BATCH_SIZE)
+    rebuild_stock_summary()
+
+
+def _third(amount):
+    return (amount / 3).quantize(Decimal('0.01'))
+
+
+def _seed_ec_sales(rng, count, today, operators, retailers, fos_of, admin):
+    retailer_totals = {}
+    sales = []
+    for i in range(count):
+        retailer = rng.choice(retailers)
+        fos = fos_of[retailer.id]
+        operator = rng.choice(operators)
+        transfer_amount = Decimal(rng.randrange(100, 5000))
+        commission = (transfer_amount * Decimal('0.03')).quantize(Decimal('0.01'))
+        sales.append(EcSale(
+            order_id=f'BENCH{i:09d}',
+            order_date=today - timedelta(days=rng.randrange(365)),
+            operator=operator,
+            supervisor_id=fos.supervisor_id,
+            fos=fos,
+            retailer=retailer,
+            partner_id=f'P{retailer.id}',
+            partner_name=retailer.name,
+            transfer_amount=transfer_amount,
+            commission=commission,
+            amount_without_commission=transfer_amount - commission,
+            uploaded_by=admin,
+        ))
+        key = (retailer.id, operator.id)
+        retailer_totals[key] = retailer_totals.get(key, 0) + transfer_amount - commission
+    EcSale.objects.bulk_create(sales, batch_size=BATCH_SIZE)
+
+    # Roughly a third of each retailer's dues has reached their FOS, and a third of that the supervisor
+    fos_totals, supervisor_totals = {}, {}
+    for (retailer_id, operator_id), total in retailer_totals.items():
+        fos = fos_of[retailer_id]
+        collected = _third(total)
+        fos_totals[(fos.id, operator_id)] = fos_totals.get((fos.id, operator_id), 0) + collected
+        key = (fos.supervisor_id, operator_id)
+        supervisor_totals[key] = supervisor_totals.get(key, 0) + _third(collected)
+
+    RetailerWallet.objects.bulk_create([
+        RetailerWallet(retailer_id=retailer_id, operator_id=operator_id, pending_amount=total - _third(total),
+                       total_sales=total)
+        for (retailer_id, operator_id), total in retailer_totals.items()
+    ], batch_size=BATCH_SIZE)
+    FosWallet.objects.bulk_create([
+        FosWallet(fos_id=fos_id, operator_id=operator_id, pending_amount=total - _third(total),
+                  total_collected_from_retailers=total, total_paid_to_supervisor=_third(total))
+        for (fos_id, operator_id), total in fos_totals.items()
+    ], batch_size=BATCH_SIZE)
+    SupervisorWallet.objects.bulk_create([
+        SupervisorWallet(supervisor_id=supervisor_id, operator_id=operator_id, pending_amount=total,
+                         total_collected_from_fos=total)
+        for (supervisor_id, operator_id), total in supervisor_totals.items()
+    ], batch_size=BATCH_SIZE)
+
+
+# ==================== SCENARIOS ====================
+
+class Scenario:
+    """One page hit as ``user``; ``prepare(run)`` (untimed) returns the path and POST data for that run"""
+
+    def __init__(self, name, user, path=None, prepare=None, check=None):
+        self.name = name
+        self.user = user
+        self.prepare = prepare or (lambda run: (path, None))
+        self.check = check
+
+
+def _work_close(data):
+    """Admin closes a different pending work each run (admins close without an OTP)"""
+    pending = iter(
+        WorkStb.objects.filter(status='Pending', assigned_technician__isnull=False).order_by('id').values_list('id', flat=True)
+    )
+    closing = {}
+
+    def prepare(run):
+        closing[run] = next(pending)
+        return reverse('work_close', args=[closing[run]]), {'collected_amount': '250', 'cancellation_remark': ''}
+
+    def check(run):
+        return WorkStb.objects.filter(pk=closing[run], status='Closed').exists()
+
+    return Scenario('work_close', data.admin, prepare=prepare, check=check)
+
+
+def _ec_upload(data, rows=10):
+    """Admin uploads ``rows`` manual EC entries for retailers under one FOS"""
+    def prepare(run):
+        order_ids = [f'BENCHUP{run:04d}{row:03d}' for row in range(rows)]
+        retailers = [data.retailers[row % len(data.retailers)] for row in range(rows)]
+        return reverse('ec_upload_select'), {
+            'operator': data.operator.id,
+            'supervisor': data.supervisor.id,
+            'fos': data.fos.id,
+            'entry_type': 'manual',
+            'order_id[]': order_ids,
+            'order_date[]': [timezone.localdate().isoformat()] * rows,
+            'partner_id[]': [f'P{retailer.id}' for retailer in retailers],
+            'partner_name[]': [retailer.name for retailer in retailers],
+            'transfer_amount[]': ['1000'] * rows,
+            'commission[]': ['30'] * rows,
+            'amount_without_commission[]': ['970'] * rows,
+        }
+
+    def check(run):
+        return EcSale.objects.filter(order_id__startswith=f'BENCHUP{run:04d}').count() == rows
+
+    return Scenario('ec_upload', data.admin, prepare=prepare, check=check)
+
+
+def _sim_batch_accept(data, size=20):
+    """The FOS accepts a fresh ``size``-SIM batch from their supervisor each run"""
+    def prepare(run):
+        batch_id = f'BENCH-{run}'
+        sims = list(SimStock.objects.filter(current_holder=data.supervisor, status='available').order_by('id')[:size])
+        if len(sims) < size:
+            raise BenchmarkError(f'sim_batch_accept: the supervisor has only {len(sims)} SIMs left')
+        SimTransfer.objects.bulk_create([
+            SimTransfer(sim=sim, from_user=data.supervisor, to_user=data.fos, batch_id=batch_id) for sim in sims
+        ])
+        return reverse('sim_transfer_action', args=[batch_id, 'accept']), {}
+
+    def check(run):
+        return not SimTransfer.objects.filter(batch_id=f'BENCH-{run}', status='pending').exists()
+
+    return Scenario('sim_batch_accept', data.fos, prepare=prepare, check=check)
+
+
+def get_scenarios(data):
+    """The critical pages, in run order"""
+    pending_work = WorkStb.objects.filter(status='Pending', assigned_technician__isnull=False).order_by('-id').first()
+    return [
+        Scenario('dashboard', data.admin, reverse('dashboard')),
+        Scenario('work_list', data.admin, reverse('work_list')),
+        Scenario('work_list_supervisor', data.supervisor, reverse('work_list')),
+        Scenario('work_close_form', data.admin, reverse('work_close', args=[pending_work.pk])),
+        _work_close(data),
+        Scenario('ec_upload_form', data.admin, reverse('ec_upload_select')),
+        _ec_upload(data),
+        _sim_batch_accept(data),
+        Scenario('stock_overview', data.admin, reverse('stock_overview')),
+        Scenario('collection_pending', data.supervisor, reverse('pending_transfers')),
+        Scenario('collection_history', data.admin, reverse('transfer_history')),
+        Scenario('ec_pending_collections', data.admin, reverse('ec_pending_collections')),
+    ]
+
+
+def run_scenario(scenario, repeats=5):
+    """One untimed warm-up run, then ``repeats`` measured runs; returns queries, median ms and repeats"""
+    client = Client()
+    client.force_login(scenario.user)
+    counts, timings, recorder = [], [], None
+    for run in range(repeats + 1):
+        path, payload = scenario.prepare(run)
+        recorder = QueryRecorder()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+            started = time.perf_counter()
+            response = client.post(path, payload) if payload is not None else client.get(path)
+            elapsed = time.perf_counter() - started
+
+        if response.status_code >= 400:
+            raise BenchmarkError(f'{scenario.name}: {path} returned {response.status_code}')
+        if scenario.check and not scenario.check(run):
+            raise BenchmarkError(f'{scenario.name}: {path} did not complete its write')
+        if run:
+            counts.append(recorder.count)
+            timings.append(elapsed * 1000)
+
+    return {
+        'queries': max(counts),
+        'ms': round(statistics.median(timings), 1),
+        'n_plus_one': recorder.n_plus_one,
+        'top_repeat': recorder.duplicates(1)[0][0][:200] if recorder.duplicates(1) else None,
+    }
+
+
+def run_benchmarks(data, repeats=5, only=None):
+    """{scenario name: result} for every scenario (or those named in ``only``)"""
+    # The inspector middleware would log a warning for every flagged request; the table reports them instead
+    queries_logger = logging.getLogger('core.queries')
+    level = queries_logger.level
+    queries_logger.setLevel(logging.ERROR)
+    try:
+        return {
+            scenario.name: run_scenario(scenario, repeats)
+            for scenario in get_scenarios(data)
+            if not only or scenario.name in only
+        }
+    finally:
+        queries_logger.setLevel(level)
+
+
+# ==================== BASELINES ====================
+
+def baseline_key():
+    """Timings and even query counts (savepoints) differ by database, so baselines are kept per vendor"""
+    return connection.vendor
+
+
+def load_baselines(path=BENCHMARK_BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baseline(results, scale, path=BENCHMARK_BASELINE_PATH):
+    """Store ``results`` as the baseline for ``scale`` on this vendor, keeping the others"""
+    baselines = load_baselines(path)
+    baselines.setdefault(scale, {})[baseline_key()] = {
+        name: {'queries': result['queries'], 'ms': result['ms']} for name, result in results.items()
+    }
+    Path(path).write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+
+
+def compare(results, baseline, tolerance=BENCHMARK_TIME_TOLERANCE, slack_ms=BENCHMARK_TIME_SLACK_MS):
+    """{scenario name: [regression messages]} for the scenarios that got worse than ``baseline``"""
+    regressions = {}
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        problems = []
+        if result['queries'] > expected['queries']:
+            problems.append(f'{result["queries"]} queries, baseline {expected["queries"]}')
+        limit = expected['ms'] * tolerance + slack_ms
+        if result['ms'] > limit:
+            problems.append(f'{result["ms"]}ms, limit {limit:.1f}ms (baseline {expected["ms"]}ms)')
+        if problems:
+            regressions[name] = problems
+    return regressions
@@ -0,0 +1,118 @@
+"""
+Cache tiers, namespaces and shared versions
+
+Two cache aliases are configured per environment (see CACHES in settings):
+
+* ``default`` is the shared tier. Under IIS/wfastcgi every worker is its own
+  process, so anything that must be seen by all of them lives here: version
+  counters and OTP failure counts. Nothing secret goes here. Production backs it with the
+  file system or the database.
+* ``local`` is a per-process LRU (LocMemCache). It suits large, rebuildable
+  values whose keys already carry a shared version, such as cached pages and
+  login records.
+
+CacheNamespace prefixes an app cache's keys (``core:<name>:...``) and can
+drop all of them at once by bumping its shared version. SharedVersion is
+the counter the process-wide tables (pincode routing, master data) poll to
+notice that another process has invalidated them.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+SHARED_CACHE = 'default'
+LOCAL_CACHE = 'local' if 'local' in getattr(settings, 'CACHES', {}) else SHARED_CACHE
+
+
+def _seed():
+    # Clock-based, so a version that was evicted never comes back as an old value
+    return time.time_ns()
+
+
+class SharedVersion:
+    """A counter in the shared cache; bump() tells every process its copy is stale"""
+
+    def __init__(self, name):
+        self.key = f'core:{name}:version'
+
+    def get(self):
+        cache = caches[SHARED_CACHE]
+        version = cache.get(self.key)
+        if version is None:
+            cache.add(self.key, _seed(), None)
+            version = cache.get(self.key)
+        return version
+
+    def bump(self):
+        cache = caches[SHARED_CACHE]
+        try:
+            cache.incr(self.key)
+        except ValueError:
+            cache.set(self.key, _seed(), None)
+
+
+def get_versions(versions):
+    """Current values of several SharedVersions in one cache round trip"""
+    cache = caches[SHARED_CACHE]
+    found = cache.get_many([version.key for version in versions])
+    return [found[version.key] if version.key in found else version.get() for version in versions]
+
+
+class CacheNamespace:
+    """
+    Keys of one app cache, kept under ``core:<name>:`` in the given tier.
+    ``clear()`` invalidates the whole namespace by bumping its version.
+    """
+
+    def __init__(self, name, alias=SHARED_CACHE, timeout=DEFAULT_TIMEOUT, versioned=False):
+        self.name = name
+        self.alias = alias
+        self.timeout = timeout
+        self.version = SharedVersion(name) if versioned else None
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def key(self, *parts):
+        return ':'.join(['core', self.name, *(str(part) for part in parts)])
+
+    def _version(self):
+        return self.version.get() if self.version else None
+
+    def get(self, key, default=None):
+        return self.cache.get(self.key(key), default, version=self._version())
+
+    def get_many(self, keys):
+        prefixed = {self.key(key): key for key in keys}
+        found = self.cache.get_many(list(prefixed), version=self._version())
+        return {prefixed[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+        self.cache.set(self.key(key), value, timeout, version=self._version())
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT):
+        timeout = self.timeout if timeout is DEFAULT_TIMEOUT else timeout
+        return self.cache.add(self.key(key), value, timeout, version=self._version())
+
+    def incr(self, key, timeout=DEFAULT_TIMEOUT):
+        """Increment a counter, creating it at 1"""
+        try:
+            return self.cache.incr(self.key(key), version=self._version())
+        except ValueError:
+            self.set(key, 1, timeout)
+            return 1
+
+    def delete(self, key):
+        self.cache.delete(self.key(key), version=self._version())
+
+    def delete_many(self, keys):
+        self.cache.delete_many([self.key(key) for key in keys], version=self._version())
+
+    def clear(self):
+        if self.version is None:
+            raise TypeError(f'Cache namespace {self.name} is not versioned')
+        self.version.bump()
@@ -0,0 +1,17 @@
+"""System checks for settings each deployment has to provide"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+from .notifications import DEFAULT_BACKEND, WHATSAPP_API_TOKEN
+
+
+@register()
+def whatsapp_token_check(app_configs, **kwargs):
+    """Without a gateway token WhatsbotBackend fails every message, and not retryably"""
+    if WHATSAPP_API_TOKEN or getattr(settings, 'WHATSAPP_BACKEND', DEFAULT_BACKEND) != DEFAULT_BACKEND:
+        return []
+    return [Warning(
+        'WHATSAPP_API_TOKEN is not set, so every WhatsApp message (work assignments, OTPs) will be marked failed.',
+        hint='Set the WHATSAPP_API_TOKEN environment variable for the site (DEPLOYMENT_GUIDE_IIS.md, step 2.4).',
+        id='core.W001',
+    )]
@@ -0,0 +1,270 @@
+"""
+Load-aware technician dispatcher
+
+Scores the technicians under a work's supervisor and picks the best one:
+
+    score = open_works * LOAD_WEIGHT (doubled for urgent works)
+            - decayed recent throughput * THROUGHPUT_WEIGHT
+            - familiarity with the work's pincode * PINCODE_WEIGHT
+
+Lower is better; ties go to whoever was assigned least recently. All inputs
+come from the TechnicianLoad / TechnicianPincodeStat index, which WorkStb
+signals keep current, so scoring never counts works per request.
+``dispatch_works`` assigns a whole burst in one pass: it loads the index
+once, updates the in-memory loads after every pick so work spreads out, and
+writes everything back with bulk updates.
+"""
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Case, Count, F, Value, When
+from django.utils import timezone
+
+from .models import User, WorkStb, WorkReport, TechnicianLoad, TechnicianPincodeStat
+from .serials import chunked
+
+
+LOAD_WEIGHT = 10.0
+THROUGHPUT_WEIGHT = 2.0
+PINCODE_WEIGHT = 3.0
+URGENT_WITHIN = timedelta(hours=6)
+THROUGHPUT_HALF_LIFE_DAYS = 7.0
+
+
+# ==================== LOAD INDEX MAINTENANCE ====================
+
+def _decayed(value, since, now):
+    if not value or since is None:
+        return 0.0
+    age_days = max((now - since).total_seconds(), 0) / 86400.0
+    return value * math.pow(0.5, age_days / THROUGHPUT_HALF_LIFE_DAYS)
+
+
+def _ensure_loads(technician_ids):
+    """Create any missing TechnicianLoad rows up front, so counters only ever change through F() updates"""
+    TechnicianLoad.objects.bulk_create(
+        [TechnicianLoad(technician_id=technician_id) for technician_id in technician_ids], ignore_conflicts=True
+    )
+
+
+def adjust_open_works(deltas):
+    """Apply {technician_id: +/-n} to open_works"""
+    deltas = {technician_id: delta for technician_id, delta in deltas.items() if technician_id and delta}
+    if not deltas:
+        return
+    _ensure_loads(deltas)
+    for technician_id, delta in deltas.items():
+        if delta > 0:
+            open_works = F('open_works') + delta
+        else:
+            # Never go below zero if the index drifted (open_works is unsigned on MySQL)
+            open_works = Case(When(open_works__gte=-delta, then=F('open_works') + delta), default=Value(0))
+        TechnicianLoad.objects.filter(technician_id=technician_id).update(open_works=open_works)
+
+
+def record_assignment(technician_id, pincodes, when=None):
+    """Bump pincode familiarity and last_assigned_at after works were given to a technician"""
+    when = when or timezone.now()
+    _ensure_loads([technician_id])
+    TechnicianLoad.objects.filter(technician_id=technician_id).update(last_assigned_at=when)
+    counts = Counter(pincodes)
+    TechnicianPincodeStat.objects.bulk_create(
+        [TechnicianPincodeStat(technician_id=technician_id, pincode=pincode) for pincode in counts],
+        ignore_conflicts=True,
+    )
+    for pincode, count in counts.items():
+        TechnicianPincodeStat.objects.filter(technician_id=technician_id, pincode=pincode).update(
+            works_count=F('works_count') + count
+        )
+
+
+def record_closed(technician_id, when=None):
+    """Add one closed work to the technician's decayed throughput"""
+    when = when or timezone.now()
+    with transaction.atomic():
+        load, _ = TechnicianLoad.objects.select_for_update().get_or_create(technician_id=technician_id)
+        load.recent_closed = _decayed(load.recent_closed, load.recent_closed_at, when) + 1.0
+        load.recent_closed_at = when
+        load.save(update_fields=['recent_closed', 'recent_closed_at', 'updated_at'])
+
+
+def release_expiring(works):
+    """
+    Call with a queryset of Pending works *before* it is bulk-updated away from
+    Pending (e.g. check_expired_works), so their technicians' open counts drop.
+    """
+    rows = works.filter(assigned_technician__isnull=False).values('assigned_technician').annotate(n=Count('id')).order_by()
+    adjust_open_works({row['assigned_technician']: -row['n'] for row in rows})
+
+
+def rebuild_technician_load():
+    """Recompute the whole index from WorkStb (``manage.py rebuild_technician_load``, for repair)"""
+    now = timezone.now()
+    with transaction.atomic():
+        TechnicianPincodeStat.objects.all().delete()
+        TechnicianLoad.objects.all().delete()
+
+        open_counts = dict(
+            WorkStb.objects.filter(status='Pending', assigned_technician__isnull=False)
+            .values_list('assigned_technician').annotate(n=Count('id')).order_by()
+        )
+        since = now - timedelta(days=THROUGHPUT_HALF_LIFE_DAYS * 4)
+        closed = defaultdict(float)
+        for technician_id, closed_at in WorkStb.objects.filter(
+            status='Closed', assigned_technician__isnull=False, work_closing_time__gte=since
+        ).values_list('assigned_technician', 'work_closing_time').iterator():
+            closed[technician_id] += _decayed(1.0, closed_at, now)
+
+        technician_ids = User.objects.filter(role='technician').values_list('id', flat=True)
+        TechnicianLoad.objects.bulk_create([
+            TechnicianLoad(
+                technician_id=technician_id,
+                open_works=open_counts.get(technician_id, 0),
+                recent_closed=closed.get(technician_id, 0.0),
+                recent_closed_at=now if technician_id in closed else None,
+            )
+            for technician_id in technician_ids
+        ], batch_size=1000)
+
+        stats = WorkStb.objects.filter(
+            assigned_technician__role='technician'
+        ).values_list('assigned_technician', 'pincode').annotate(n=Count('id')).order_by()
+        TechnicianPincodeStat.objects.bulk_create(
+            [TechnicianPincodeStat(technician_id=t, pincode=p, works_count=n) for t, p, n in stats],
+            batch_size=1000,
+        )
+
+
+# ==================== SCORING ====================
+
+class _Candidate:
+    __slots__ = ('technician', 'open_works', 'throughput', 'last_assigned_at', 'pincodes')
+
+    def __init__(self, technician, load, pincodes, now):
+        self.technician = technician
+        self.open_works = load.open_works if load else 0
+        self.throughput = _decayed(load.recent_closed, load.recent_closed_at, now) if load else 0.0
+        self.last_assigned_at = load.last_assigned_at if load else None
+        self.pincodes = pincodes
+
+    def score(self, work, now):
+        load_weight = LOAD_WEIGHT
+        if work.work_deadline_time and work.work_deadline_time - now <= URGENT_WITHIN:
+            # Deadline pressure: urgent works go to whoever is freest
+            load_weight *= 2
+        familiarity = math.log1p(self.pincodes.get(work.pincode, 0))
+        return (
+            self.open_works * load_weight
+            - self.throughput * THROUGHPUT_WEIGHT
+            - familiarity * PINCODE_WEIGHT
+        )
+
+    def sort_key(self, work, now):
+        # Never-assigned technicians first on a tie, then the longest idle
+        last = self.last_assigned_at.timestamp() if self.last_assigned_at else float('-inf')
+        return (self.score(work, now), last, self.technician.name)
+
+
+def _candidates_by_supervisor(supervisor_ids, pincodes, now):
+    technicians = list(User.objects.filter(role='technician', supervisor_id__in=supervisor_ids).order_by('name'))
+    ids = [t.id for t in technicians]
+    loads = {load.technician_id: load for load in TechnicianLoad.objects.filter(technician_id__in=ids)}
+    familiarity = defaultdict(dict)
+    for technician_id, pincode, count in TechnicianPincodeStat.objects.filter(
+        technician_id__in=ids, pincode__in=pincodes
+    ).values_list('technician_id', 'pincode', 'works_count'):
+        familiarity[technician_id][pincode] = count
+
+    grouped = defaultdict(list)
+    for technician in technicians:
+        grouped[technician.supervisor_id].append(
+            _Candidate(technician, loads.get(technician.id), familiarity[technician.id], now)
+        )
+    return grouped
+
+
+def rank_technicians(work, technicians=None):
+    """Technicians for ``work`` ordered best-first (defaults to the work supervisor's team)"""
+    now = timezone.now()
+    if technicians is None:
+        candidates = _candidates_by_supervisor([work.supervisor_id], [work.pincode], now).get(work.supervisor_id, [])
+    else:
+        technicians = list(technicians)
+        ids = [t.id for t in technicians]
+        loads = {load.technician_id: load for load in TechnicianLoad.objects.filter(technician_id__in=ids)}
+        familiarity = defaultdict(dict)
+        for technician_id, count in TechnicianPincodeStat.objects.filter(
+            technician_id__in=ids, pincode=work.pincode
+        ).values_list('technician_id', 'works_count'):
+            familiarity[technician_id][work.pincode] = count
+        candidates = [_Candidate(t, loads.get(t.id), familiarity[t.id], now) for t in technicians]
+    return [c.technician for c in sorted(candidates, key=lambda c: c.sort_key(work, now))]
+
+
+# ==================== DISPATCH ====================
+
+def _lock_candidates(works):
+    """Lock the unassigned Pending works in ``works``; concurrent dispatch runs skip (or wait for) them"""
+    candidates = works.filter(status='Pending', assigned_technician__isnull=True, supervisor__isnull=False)
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    return list(candidates.select_for_update(skip_locked=skip_locked).values_list('id', flat=True))
+
+
+def dispatch_works(works):
+    """
+    Assign every unassigned Pending work in ``works`` to the best technician
+    under its supervisor. Returns a list of (work, technician) pairs; works
+    with no supervisor or no technicians are skipped.
+
+    The candidate rows stay locked until the assignments are written, so two
+    dispatch runs never hand out (or count) the same work twice.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        work_ids = _lock_candidates(works)
+        if not work_ids:
+            return []
+        works = list(
+            WorkStb.objects.filter(pk__in=work_ids).select_related('operator', 'type_of_service', 'work_from')
+        )
+
+        # Most urgent first so they get the freest technicians
+        far_future = now + timedelta(days=36500)
+        works.sort(key=lambda w: (w.work_deadline_time or far_future, w.created_at))
+
+        grouped = _candidates_by_supervisor(
+            {w.supervisor_id for w in works}, {w.pincode for w in works}, now
+        )
+
+        assignments = []
+        for work in works:
+            candidates = grouped.get(work.supervisor_id)
+            if not candidates:
+                continue
+            best = min(candidates, key=lambda c: c.sort_key(work, now))
+            work.assigned_technician = best.technician
+            work.updated_at = now
+            # Keep the in-memory view current for the rest of the burst
+            best.open_works += 1
+            best.last_assigned_at = now
+            best.pincodes[work.pincode] = best.pincodes.get(work.pincode, 0) + 1
+            assignments.append((work, best.technician))
+
+        if not assignments:
+            return []
+
+        # bulk_update skips WorkStb signals, so maintain the index here
+        WorkStb.objects.bulk_update([w for w, _ in assignments], ['assigned_technician', 'updated_at'], batch_size=500)
+        # Newly assigned works' reports must reach the technician's device too (core.sync)
+        for chunk in chunked([w.pk for w, _ in assignments], 500):
+            WorkReport.objects.filter(work_id__in=chunk).update(updated_at=now)
+        per_technician = defaultdict(list)
+        for work, technician in assignments:
+            per_technician[technician.id].append(work.pincode)
+        adjust_open_works({tid: len(pincodes) for tid, pincodes in per_technician.items()})
+        for technician_id, pincodes in per_technician.items():
+            record_assignment(technician_id, pincodes, when=now)
+
+    return assignments
@@ -0,0 +1,70 @@
+"""
+Streaming CSV / XLSX download helpers
+
+Rows are pulled lazily (typically from ``values_list(...).iterator()``) so an
+export of a full year of data never has to sit in memory as model instances or
+as a pandas DataFrame.
+"""
+import csv
+import tempfile
+from datetime import datetime
+from itertools import chain
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class _Echo:
+    """File-like object whose write() just hands the line back to csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    """Excel cannot store timezone-aware datetimes; show them in local time"""
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        return timezone.make_naive(timezone.localtime(value))
+    return value
+
+
+def stream_csv(filename, header, rows):
+    """Return a StreamingHttpResponse that writes ``rows`` as CSV one line at a time"""
+    writer = csv.writer(_Echo())
+    lines = (
+        writer.writerow([_plain(value) for value in row])
+        for row in chain([header], rows)
+    )
+    response = StreamingHttpResponse(lines, content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_xlsx(filename, header, rows, sheet_title='Sheet1'):
+    """
+    Write ``rows`` to an XLSX file with openpyxl's write-only workbook and
+    stream it back. Write-only mode flushes each row to disk, so memory stays
+    flat regardless of row count.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=sheet_title)
+    sheet.append(list(header))
+    for row in rows:
+        sheet.append([_plain(value) for value in row])
+
+    spool = tempfile.TemporaryFile()
+    workbook.save(spool)
+    spool.seek(0)
+    return FileResponse(spool, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def stream_export(export_format, filename_stem, header, rows, sheet_title='Sheet1'):
+    """Dispatch to CSV or XLSX based on the ``?export=`` query parameter"""
+    if export_format == 'xlsx':
+        return stream_xlsx(f'{filename_stem}.xlsx', header, rows, sheet_title=sheet_title)
+    return stream_csv(f'{filename_stem}.csv', header, rows)
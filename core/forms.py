@@ -1,3 +1,5 @@
+import re
+
 from django import forms
 from .models import (
     Product,
@@ -15,6 +17,9 @@ from .models import (
     WorkFiberTypeOption,
     WorkFrIssueOption,
 )
+from .routing import is_routable, route_supervisor_id
+from .pincodes import resolve_pincodes
+from .serials import iter_serials
 
 class StockSaleForm(forms.ModelForm):
     class Meta:
@@ -97,27 +102,39 @@ class PincodeAssignmentForm(forms.Form):
     pincodes = forms.ModelMultipleChoiceField(
         queryset=Pincode.objects.filter(is_active=True),
         widget=forms.CheckboxSelectMultiple(attrs={"class": "form-check-input"}),
-        required=True,
+        required=False,
         help_text="Select multiple pincodes to assign to the supervisor"
     )
+    pincode_codes = forms.CharField(
+        required=False,
+        widget=forms.Textarea(attrs={"class": "form-control", "rows": 4, "placeholder": "560001, 560002 or one per line"}),
+        help_text="Or paste pincodes (comma, space or newline separated)"
+    )
+    pincode_file = forms.FileField(
+        required=False,
+        widget=forms.FileInput(attrs={"class": "form-control", "accept": ".csv,.txt"}),
+        help_text="Or upload a CSV/text file with pincodes in the first column"
+    )
 
     def clean(self):
         cleaned_data = super().clean()
-        supervisor = cleaned_data.get('supervisor')
-        pincodes = cleaned_data.get('pincodes')
-
-        if supervisor and pincodes:
-            # Check for existing assignments
-            existing_assignments = PincodeAssignment.objects.filter(
-                pincode__in=pincodes
-            ).exclude(supervisor=supervisor)
-            
-            if existing_assignments.exists():
-                assigned_pincodes = [str(assignment.pincode.pincode) for assignment in existing_assignments]
-                raise forms.ValidationError(
-                    f"The following pincodes are already assigned to other supervisors: {', '.join(assigned_pincodes)}"
-                )
-        
+        pincode_ids = [p.pk for p in cleaned_data.get('pincodes') or []]
+
+        codes = re.split(r'[\s,;]+', cleaned_data.get('pincode_codes') or '')
+        upload = cleaned_data.get('pincode_file')
+        if upload:
+            codes.extend(code for code in iter_serials(upload=upload) if code.isdigit())
+        if any(codes):
+            resolved, unknown = resolve_pincodes(codes)
+            if unknown:
+                sample = ', '.join(unknown[:20]) + (' …' if len(unknown) > 20 else '')
+                raise forms.ValidationError(f"Unknown or inactive pincodes: {sample}")
+            pincode_ids.extend(resolved)
+
+        if not pincode_ids:
+            raise forms.ValidationError("Select, paste or upload at least one pincode.")
+        # Conflicts with other supervisors are checked in core.pincodes.assign_pincodes
+        cleaned_data['pincode_ids'] = pincode_ids
         return cleaned_data
 
 
@@ -235,10 +252,8 @@ class WorkForm(forms.ModelForm):
 
     def clean_pincode(self):
         pincode = self.cleaned_data.get('pincode')
-        if pincode:
-            from .models import PincodeAssignment
-            if not PincodeAssignment.objects.filter(pincode__pincode=pincode).exists():
-                raise forms.ValidationError("Enter a pincode assigned to a supervisor.")
+        if pincode and not is_routable(pincode):
+            raise forms.ValidationError("Enter a pincode assigned to a supervisor.")
         return pincode
 
     def save(self, commit=True):
@@ -251,10 +266,9 @@ class WorkForm(forms.ModelForm):
         # Auto-assign supervisor from pincode
         pincode = self.cleaned_data.get('pincode')
         if pincode:
-            from .models import PincodeAssignment
-            assignment = PincodeAssignment.objects.filter(pincode__pincode=pincode).first()
-            if assignment:
-                obj.supervisor = assignment.supervisor
+            supervisor_id = route_supervisor_id(pincode)
+            if supervisor_id:
+                obj.supervisor_id = supervisor_id
         if commit:
             obj.save()
         return obj
@@ -276,10 +290,8 @@ class RetailerWorkForm(forms.ModelForm):
 
     def clean_pincode(self):
         pincode = self.cleaned_data.get('pincode')
-        if pincode:
-            from .models import PincodeAssignment
-            if not PincodeAssignment.objects.filter(pincode__pincode=pincode).exists():
-                raise forms.ValidationError("Enter a pincode assigned to a supervisor.")
+        if pincode and not is_routable(pincode):
+            raise forms.ValidationError("Enter a pincode assigned to a supervisor.")
         return pincode
 
     def save(self, commit=True):
@@ -292,10 +304,9 @@ class RetailerWorkForm(forms.ModelForm):
         # Auto-assign supervisor from pincode
         pincode = self.cleaned_data.get('pincode')
         if pincode:
-            from .models import PincodeAssignment
-            assignment = PincodeAssignment.objects.filter(pincode__pincode=pincode).first()
-            if assignment:
-                obj.supervisor = assignment.supervisor
+            supervisor_id = route_supervisor_id(pincode)
+            if supervisor_id:
+                obj.supervisor_id = supervisor_id
         if commit:
             obj.save()
         return obj
@@ -345,12 +356,23 @@ class SimStockForm(forms.ModelForm):
 
 class SimTransferForm(forms.Form):
     serial_numbers = forms.CharField(
+        required=False,
         widget=forms.Textarea(attrs={'rows': 5, 'placeholder': 'Enter serial numbers, one per line'}),
-        help_text='Enter one serial number per line'
+        help_text='One serial per line, or a range like 8991000000000000-8991000000000999'
+    )
+    serial_file = forms.FileField(
+        required=False, label='Or upload serial file',
+        help_text='.txt / .csv, one serial or range per line (first column for CSV)'
     )
     to_user = forms.ModelChoiceField(queryset=None, label='Transfer To')
     remark = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 2}))
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('serial_numbers', '').strip() and not cleaned_data.get('serial_file'):
+            raise forms.ValidationError('Enter serial numbers or upload a serial file.')
+        return cleaned_data
+
     def __init__(self, *args, **kwargs):
         from_user = kwargs.pop('from_user', None)
         super().__init__(*args, **kwargs)
@@ -434,8 +456,14 @@ class HandsetPurchaseForm(forms.ModelForm):
 class HandsetTransferForm(forms.Form):
     to_user = forms.ModelChoiceField(queryset=None, label="Transfer To")
     serial_numbers = forms.CharField(
+        required=False,
         widget=forms.Textarea(attrs={'rows': 10, 'placeholder': 'Enter serial numbers (one per line)'}),
-        label="Serial Numbers"
+        label="Serial Numbers",
+        help_text="One serial per line, or a range like HS0100-HS0199"
+    )
+    serial_file = forms.FileField(
+        required=False, label="Or upload serial file",
+        help_text=".txt / .csv, one serial or range per line (first column for CSV)"
     )
     remark = forms.CharField(
         widget=forms.Textarea(attrs={'rows': 3, 'placeholder': 'Optional remarks'}),
@@ -463,3 +491,9 @@ class HandsetTransferForm(forms.Form):
                 retailer_ids = RetailerFosMap.objects.filter(fos=from_user).values_list('retailer_id', flat=True)
                 self.fields['to_user'].queryset = User.objects.filter(id__in=retailer_ids, role='retailer')
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('serial_numbers', '').strip() and not cleaned_data.get('serial_file'):
+            raise forms.ValidationError("Enter serial numbers or upload a serial file.")
+        return cleaned_data
+
@@ -0,0 +1,226 @@
+"""
+HTTP client for the WhatsApp gateway
+
+One pooled, keep-alive ``requests.Session`` per process is shared by every
+sender (the outbox worker's thread pool included), so consecutive messages
+reuse TCP/TLS connections instead of opening a new one each. The pool size
+caps concurrent connections, connect/read timeouts are separate, and every
+call is recorded in a latency histogram (``gateway_metrics``).
+
+FakeGatewayServer is a local stand-in for the gateway: point
+WHATSAPP_API_URL (or a GatewayClient) at its ``url`` to run tests and
+benchmarks without network access.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULT_API_URL = 'https://whatsbot.tech/api/send_sms'
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+# ==================== METRICS ====================
+
+class LatencyHistogram:
+    """Thread-safe fixed-bucket latency histogram with outcome counters"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * (len(self.buckets) + 1)
+            self.total = 0
+            self.total_ms = 0.0
+            self.max_ms = 0.0
+            self.statuses = {}
+            self.errors = {}
+
+    def observe(self, elapsed_ms, status=None, error=None):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, elapsed_ms)] += 1
+            self.total += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            if status is not None:
+                self.statuses[status] = self.statuses.get(status, 0) + 1
+            if error is not None:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls (max_ms for the overflow bucket)"""
+        with self._lock:
+            if not self.total:
+                return 0.0
+            target = fraction * self.total
+            running = 0
+            for index, count in enumerate(self.counts):
+                running += count
+                if running >= target:
+                    return float(self.buckets[index]) if index < len(self.buckets) else self.max_ms
+            return self.max_ms
+
+    def snapshot(self):
+        with self._lock:
+            total, total_ms, max_ms = self.total, self.total_ms, self.max_ms
+            statuses, errors = dict(self.statuses), dict(self.errors)
+            buckets = {f'le_{bound}ms': count for bound, count in zip(self.buckets, self.counts)}
+            buckets['overflow'] = self.counts[-1]
+        return {
+            'requests': total,
+            'avg_ms': round(total_ms / total, 2) if total else 0.0,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': round(max_ms, 2),
+            'statuses': statuses,
+            'errors': errors,
+            'buckets': buckets,
+        }
+
+
+gateway_metrics = LatencyHistogram()
+
+
+# ==================== CLIENT ====================
+
+class GatewayClient:
+    """Pooled keep-alive client for one gateway URL"""
+
+    def __init__(self, url, pool_size=10, connect_timeout=3.05, read_timeout=10, metrics=None):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.metrics = metrics if metrics is not None else gateway_metrics
+        self.session = requests.Session()
+        # Retries are the outbox's job; block instead of opening extra connections
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, params):
+        """GET the gateway URL with ``params``; raises requests.RequestException on transport errors"""
+        started = time.perf_counter()
+        try:
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            self.metrics.observe((time.perf_counter() - started) * 1000, error=type(e).__name__)
+            raise
+        self.metrics.observe((time.perf_counter() - started) * 1000, status=response.status_code)
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+_client_lock = threading.Lock()
+_client = {'client': None, 'key': None}
+
+
+def get_gateway_client():
+    """The process-wide client for settings.WHATSAPP_API_URL (recreated after a fork or a settings change)"""
+    key = (
+        os.getpid(),
+        getattr(settings, 'WHATSAPP_API_URL', DEFAULT_API_URL),
+        getattr(settings, 'WHATSAPP_HTTP_POOL_SIZE', 10),
+        getattr(settings, 'WHATSAPP_HTTP_TIMEOUT', 10),
+    )
+    client = _client['client']
+    if client is not None and _client['key'] == key:
+        return client
+    with _client_lock:
+        if _client['client'] is None or _client['key'] != key:
+            if _client['client'] is not None and _client['key'][0] == key[0]:
+                _client['client'].close()
+            _, url, pool_size, timeout = key
+            _client['client'] = GatewayClient(url, pool_size=pool_size, read_timeout=timeout)
+            _client['key'] = key
+        return _client['client']
+
+
+# ==================== FAKE SERVER ====================
+
+class _FakeGatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real gateway
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        with server.lock:
+            server.requests.append({key: values[0] for key, values in query.items()})
+            fail = server.fail_next > 0
+            if fail:
+                server.fail_next -= 1
+        if server.latency:
+            time.sleep(server.latency)
+        status = server.fail_status if fail else 200
+        body = json.dumps({'status': 'error' if fail else 'success'}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeGatewayServer:
+    """
+    Local HTTP stand-in for the gateway, run on a background thread:
+
+        with FakeGatewayServer(latency=0.02) as fake:
+            client = GatewayClient(fake.url)
+
+    ``requests`` lists the query of every call; ``fail_next`` makes that many
+    upcoming calls answer ``fail_status``.
+    """
+
+    def __init__(self, latency=0.0, fail_status=503):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), _FakeGatewayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.requests = []
+        self.httpd.fail_next = 0
+        self.httpd.latency = latency
+        self.httpd.fail_status = fail_status
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/api/send_sms'
+        self._thread = None
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def fail_next(self):
+        return self.httpd.fail_next
+
+    @fail_next.setter
+    def fail_next(self, value):
+        with self.httpd.lock:
+            self.httpd.fail_next = value
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-gateway', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
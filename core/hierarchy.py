@@ -0,0 +1,139 @@
+"""
+User hierarchy closure table (supervisor → FOS → retailer)
+
+A user's parents are its ``supervisor``, the FOS linked through
+``RetailerFosMap`` and the FOS in ``fos_links``. ``UserHierarchy`` stores every
+(ancestor, descendant, depth) pair so "everything under me" is a single indexed
+join instead of chained subqueries. Signals in ``core.signals`` keep it current.
+"""
+from collections import deque
+
+from django.apps import apps as django_apps
+from django.db import transaction
+
+
+def _models():
+    return (
+        django_apps.get_model('core', 'User'),
+        django_apps.get_model('core', 'RetailerFosMap'),
+        django_apps.get_model('core', 'UserHierarchy'),
+    )
+
+
+def _fos_link_model(User):
+    # retailer.fos_links: from_user = retailer, to_user = FOS
+    return User._meta.get_field('fos_links').remote_field.through
+
+
+def _parents_of(ids):
+    """Map each id in ``ids`` to the set of its direct parents"""
+    User, RetailerFosMap, _ = _models()
+    parents = {user_id: set() for user_id in ids}
+    for user_id, supervisor_id in User.objects.filter(id__in=ids, supervisor__isnull=False).values_list('id', 'supervisor_id'):
+        parents[user_id].add(supervisor_id)
+    for retailer_id, fos_id in RetailerFosMap.objects.filter(retailer_id__in=ids).values_list('retailer_id', 'fos_id'):
+        parents[retailer_id].add(fos_id)
+    for retailer_id, fos_id in _fos_link_model(User).objects.filter(from_user_id__in=ids).values_list('from_user_id', 'to_user_id'):
+        parents[retailer_id].add(fos_id)
+    return parents
+
+
+def _children_of(ids):
+    """Set of users directly below any id in ``ids``"""
+    User, RetailerFosMap, _ = _models()
+    children = set(User.objects.filter(supervisor_id__in=ids).values_list('id', flat=True))
+    children.update(RetailerFosMap.objects.filter(fos_id__in=ids).values_list('retailer_id', flat=True))
+    children.update(_fos_link_model(User).objects.filter(to_user_id__in=ids).values_list('from_user_id', flat=True))
+    return children
+
+
+def _closure_rows(user_ids):
+    """Build UserHierarchy rows (with shortest depth) for the given descendants"""
+    _, _, UserHierarchy = _models()
+
+    # Load the parent graph above user_ids one level at a time
+    parent_map = {}
+    frontier = set(user_ids)
+    while frontier:
+        level = _parents_of(frontier)
+        parent_map.update(level)
+        frontier = set().union(*level.values()) - parent_map.keys()
+
+    rows = []
+    for user_id in user_ids:
+        depths = {user_id: 0}
+        queue = deque([user_id])
+        while queue:
+            node = queue.popleft()
+            for parent in parent_map.get(node, ()):
+                if parent not in depths:
+                    depths[parent] = depths[node] + 1
+                    queue.append(parent)
+        rows.extend(
+            UserHierarchy(ancestor_id=ancestor, descendant_id=user_id, depth=depth)
+            for ancestor, depth in depths.items()
+        )
+    return rows
+
+
+def refresh_user_hierarchy(user_ids):
+    """Recompute closure rows for ``user_ids`` and everyone currently below them"""
+    User, _, UserHierarchy = _models()
+
+    affected = set(user_ids)
+    frontier = set(affected)
+    while frontier:
+        frontier = _children_of(frontier) - affected
+        affected |= frontier
+
+    # Users deleted in the meantime simply drop out (their rows cascade away)
+    affected = set(User.objects.filter(id__in=affected).values_list('id', flat=True))
+    if not affected:
+        return
+
+    with transaction.atomic():
+        UserHierarchy.objects.filter(descendant_id__in=affected).delete()
+        UserHierarchy.objects.bulk_create(_closure_rows(affected), batch_size=1000)
+
+
+def rebuild_user_hierarchy():
+    """Rebuild the whole closure table from scratch"""
+    User, _, UserHierarchy = _models()
+    user_ids = set(User.objects.values_list('id', flat=True))
+    with transaction.atomic():
+        UserHierarchy.objects.all().delete()
+        UserHierarchy.objects.bulk_create(_closure_rows(user_ids), batch_size=1000)
+
+
+def schedule_refresh(user_ids):
+    """Refresh after the current transaction commits, so cascaded deletes settle first"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if user_ids:
+        transaction.on_commit(lambda: refresh_user_hierarchy(user_ids))
+
+
+def descendant_ids(user, roles=None, include_self=False, max_depth=None):
+    """
+    Ids of users below ``user`` (a User or an id), as a values_list queryset
+    that can be used directly in ``__in`` filters.
+    """
+    from .models import UserHierarchy
+
+    rows = UserHierarchy.objects.filter(ancestor=user)
+    if not include_self:
+        rows = rows.filter(depth__gt=0)
+    if max_depth is not None:
+        rows = rows.filter(depth__lte=max_depth)
+    if roles:
+        rows = rows.filter(descendant__role__in=roles)
+    return rows.values_list('descendant_id', flat=True)
+
+
+def scope_to_user(queryset, user, field):
+    """
+    Restrict ``queryset`` to rows whose ``field`` (a User FK) is ``user`` or
+    someone below them. Admins are not restricted.
+    """
+    if user.role == 'admin' or user.is_admin:
+        return queryset
+    return queryset.filter(**{f'{field}__in': descendant_ids(user, include_self=True)})
@@ -0,0 +1,104 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+def _backend(spec):
+    from django.utils.module_loading import import_string
+
+    params = {key: value for key, value in spec.items() if key not in ('BACKEND', 'LOCATION')}
+    return import_string(spec['BACKEND'])(spec.get('LOCATION', ''), params)
+
+
+def _worker(spec, probe, ops, keys, value_size, seed):
+    """One wfastcgi-like process: a fresh interpreter hitting the tier with a 90/10 get/set mix"""
+    import django
+
+    django.setup()
+    cache = _backend(spec)
+    rng = random.Random(seed)
+    value = os.urandom(value_size)
+    shared = cache.get(probe[0]) == probe[1]
+
+    samples = []
+    started_all = time.perf_counter()
+    for _ in range(ops):
+        key = f'bench:{rng.randrange(keys)}'
+        started = time.perf_counter_ns()
+        if rng.random() < 0.9:
+            if cache.get(key) is None:
+                cache.set(key, value, 300)
+        else:
+            cache.set(key, value, 300)
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return shared, samples, time.perf_counter() - started_all
+
+
+class Command(BaseCommand):
+    help = "Compare the cache tiers (local memory, file, database) with several processes, as under IIS/wfastcgi"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4, help="Worker processes, like wfastcgi maxInstances")
+        parser.add_argument("--ops", type=int, default=2000, help="Cache operations per process")
+        parser.add_argument("--keys", type=int, default=500)
+        parser.add_argument("--value-size", type=int, default=2048, help="Bytes per cached value")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument(
+            "--tiers", default="",
+            help="Comma-separated CACHES aliases and/or 'file' for a throwaway file tier (default: all of them)",
+        )
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options["tiers"].split(",") if name.strip()]
+        names = names or [*settings.CACHES, "file"]
+
+        with tempfile.TemporaryDirectory() as scratch:
+            tiers = {}
+            for name in names:
+                if name == "file" and name not in settings.CACHES:
+                    tiers[name] = {
+                        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                        "LOCATION": os.path.join(scratch, "cache"),
+                    }
+                elif name in settings.CACHES:
+                    tiers[name] = settings.CACHES[name]
+                else:
+                    self.stderr.write(f"Unknown cache tier {name}; skipped")
+
+            # Spawned workers start empty, as separate wfastcgi processes do
+            context = multiprocessing.get_context("spawn")
+            self.stdout.write(
+                f"{options['processes']} processes x {options['ops']} ops, "
+                f"{options['keys']} keys, {options['value_size']} byte values"
+            )
+            for name, spec in tiers.items():
+                self._run(context, name, spec, options)
+
+    def _run(self, context, name, spec, options):
+        probe = (f"bench:probe:{uuid.uuid4().hex}", uuid.uuid4().hex)
+        _backend(spec).set(probe[0], probe[1], 300)
+
+        jobs = [
+            (spec, probe, options["ops"], options["keys"], options["value_size"], options["seed"] + index)
+            for index in range(options["processes"])
+        ]
+        with context.Pool(options["processes"]) as pool:
+            results = pool.starmap(_worker, jobs)
+
+        # Throughput over the slowest worker's busy time, leaving out process start-up
+        elapsed = max(busy for _, _, busy in results)
+        samples = sorted(sample for _, worker_samples, _ in results for sample in worker_samples)
+        seen = sum(1 for shared, _, _ in results if shared)
+        quantiles = statistics.quantiles(samples, n=100)
+        self.stdout.write(
+            f"{name:<8} {spec['BACKEND'].rsplit('.', 1)[-1]:<16} "
+            f"{len(samples) / elapsed:>9.0f} ops/s  p50 {quantiles[49]:.0f}us  p95 {quantiles[94]:.0f}us  "
+            f"p99 {quantiles[98]:.0f}us  shared across processes: {seen}/{len(results)}"
+        )
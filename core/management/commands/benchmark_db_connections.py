@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+class Command(BaseCommand):
+    help = (
+        "Time simulated requests with per-request connections (CONN_MAX_AGE=0) against persistent ones, "
+        "with and without health checks. Run with --settings=service_booking.settings_production for MySQL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--queries", type=int, default=3, help="Queries per simulated request")
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--max-age", type=int, default=600, help="CONN_MAX_AGE for the persistent modes")
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        self.stdout.write(
+            f"{connection.vendor} ({connection.settings_dict['NAME']}): "
+            f"{options['requests']} requests x {options['queries']} queries"
+        )
+        modes = [
+            ("per-request", 0, False),
+            ("persistent", options["max_age"], False),
+            ("persistent+health", options["max_age"], True),
+        ]
+        for label, max_age, health_checks in modes:
+            self._run(connection, label, max_age, health_checks, options)
+
+    def _run(self, connection, label, max_age, health_checks, options):
+        saved = {key: connection.settings_dict[key] for key in ("CONN_MAX_AGE", "CONN_HEALTH_CHECKS")}
+        # Both settings are read when a connection opens
+        connection.close()
+        connection.settings_dict.update(CONN_MAX_AGE=max_age, CONN_HEALTH_CHECKS=health_checks)
+
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        samples = []
+        try:
+            for _ in range(options["requests"]):
+                # The same signals the WSGI handler sends around each request
+                started = time.perf_counter()
+                request_started.send(sender=self.__class__)
+                with connection.cursor() as cursor:
+                    for _ in range(options["queries"]):
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                request_finished.send(sender=self.__class__)
+                samples.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(count_connection)
+            connection.close()
+            connection.settings_dict.update(saved)
+
+        quantiles = statistics.quantiles(samples, n=100)
+        self.stdout.write(
+            f"{label:<18} avg {statistics.mean(samples):.3f}ms  p50 {quantiles[49]:.3f}ms  "
+            f"p95 {quantiles[94]:.3f}ms  connections opened {len(opened)}"
+        )
@@ -0,0 +1,84 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from core.benchmarks import (
+    BENCHMARK_BASELINE_PATH, BENCHMARK_TIME_SLACK_MS, BENCHMARK_TIME_TOLERANCE, SCALES, BenchmarkError,
+    baseline_key, compare, load_baselines, run_benchmarks, save_baseline, seed_benchmark_data,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway test database and compare the critical pages' query counts and timings "
+        "with the stored baselines; exits non-zero on a regression"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--repeats", type=int, default=5, help="Measured runs per scenario (after one warm-up)")
+        parser.add_argument("--scenario", action="append", default=[], help="Only run this scenario (repeatable)")
+        parser.add_argument("--baseline", default=str(BENCHMARK_BASELINE_PATH))
+        parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+        parser.add_argument("--time-tolerance", type=float, default=BENCHMARK_TIME_TOLERANCE)
+        parser.add_argument("--time-slack-ms", type=float, default=BENCHMARK_TIME_SLACK_MS)
+
+    def handle(self, *args, **options):
+        scale = options["scale"]
+        setup_test_environment()
+        # Built from the models whatever the settings say: replaying the migrations
+        # on an empty database fails (admin.0001 needs core.User, added in core.0005)
+        for connection in connections.all():
+            connection.settings_dict['TEST']['MIGRATE'] = False
+        # A fresh test database: the seeded rows never touch the real one
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            # Keep WhatsApp sends queued instead of calling the gateway mid-benchmark
+            with override_settings(WHATSAPP_INLINE_WORKER=False):
+                started = time.perf_counter()
+                data = seed_benchmark_data(scale, options["seed"])
+                self.stdout.write(f"Seeded '{scale}' dataset {SCALES[scale]} in {time.perf_counter() - started:.1f}s")
+                results = run_benchmarks(data, options["repeats"], options["scenario"])
+            vendor = baseline_key()
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options["update_baseline"]:
+            save_baseline(results, scale, options["baseline"])
+            self._table(results, {}, {})
+            self.stdout.write(self.style.SUCCESS(f"Baseline for {scale}/{vendor} written to {options['baseline']}"))
+            return
+
+        baseline = load_baselines(options["baseline"]).get(scale, {}).get(vendor, {})
+        regressions = compare(results, baseline, options["time_tolerance"], options["time_slack_ms"])
+        self._table(results, baseline, regressions)
+        if not baseline:
+            self.stdout.write(self.style.WARNING(
+                f"No baseline for {scale}/{vendor}; run with --update-baseline to record one"
+            ))
+            return
+        if regressions:
+            for name, problems in regressions.items():
+                self.stderr.write(f"{name}: {'; '.join(problems)}")
+                if results[name]["top_repeat"]:
+                    self.stderr.write(f"  most repeated query: {results[name]['top_repeat']}")
+            raise CommandError(f"{len(regressions)} scenario(s) regressed against the {scale}/{vendor} baseline")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against the {scale}/{vendor} baseline"))
+
+    def _table(self, results, baseline, regressions):
+        self.stdout.write(f"{'scenario':<24} {'queries':>8} {'base':>6} {'median ms':>10} {'base':>8}  flags")
+        for name, result in results.items():
+            expected = baseline.get(name, {})
+            flags = [flag for flag, on in (("N+1", result["n_plus_one"]), ("REGRESSED", name in regressions)) if on]
+            self.stdout.write(
+                f"{name:<24} {result['queries']:>8} {expected.get('queries', '-'):>6} "
+                f"{result['ms']:>10} {expected.get('ms', '-'):>8}  {' '.join(flags)}"
+            )
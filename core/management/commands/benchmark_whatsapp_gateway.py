@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand
+
+from core.gateway import FakeGatewayServer, GatewayClient, LatencyHistogram
+
+
+class Command(BaseCommand):
+    help = "Compare the pooled gateway client with one-off requests.get calls against a local fake gateway"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument("--latency", type=float, default=0.0, help="Simulated gateway latency in seconds")
+        parser.add_argument("--url", help="Benchmark this gateway URL instead of the local fake server")
+
+    def _run(self, label, send, count, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(send, range(count)))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<10} {count} calls in {elapsed:.2f}s ({count / elapsed:.0f}/s)")
+
+    def handle(self, *args, **options):
+        count, concurrency = options["messages"], options["concurrency"]
+        fake = None
+        url = options["url"]
+        if not url:
+            fake = FakeGatewayServer(latency=options["latency"]).start()
+            url = fake.url
+
+        params = {"api_token": "benchmark", "mobile": "910000000000", "message": "benchmark"}
+        try:
+            unpooled = LatencyHistogram()
+
+            def send_unpooled(_):
+                started = time.perf_counter()
+                response = requests.get(url, params=params, timeout=10)
+                unpooled.observe((time.perf_counter() - started) * 1000, status=response.status_code)
+
+            pooled = LatencyHistogram()
+            client = GatewayClient(url, pool_size=concurrency, metrics=pooled)
+
+            self._run("unpooled", send_unpooled, count, concurrency)
+            self._run("pooled", lambda _: client.get(params), count, concurrency)
+            client.close()
+
+            for label, histogram in (("unpooled", unpooled), ("pooled", pooled)):
+                stats = histogram.snapshot()
+                self.stdout.write(
+                    f"{label:<10} avg {stats['avg_ms']}ms  p50 <={stats['p50_ms']}ms  "
+                    f"p95 <={stats['p95_ms']}ms  max {stats['max_ms']}ms  statuses {stats['statuses']}"
+                )
+        finally:
+            if fake:
+                fake.stop()
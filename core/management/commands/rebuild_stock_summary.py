@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.models import StockHolding
+from core.stock_summary import rebuild_stock_summary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-holder SIM/handset stock summary shown on the stock lists"
+
+    def handle(self, *args, **options):
+        rebuild_stock_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stock summary rebuilt: {StockHolding.objects.count()} holder/operator rows"
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.dispatch import rebuild_technician_load
+from core.models import TechnicianLoad, TechnicianPincodeStat
+
+
+class Command(BaseCommand):
+    help = "Rebuild the technician load / pincode familiarity index used by the auto-dispatcher"
+
+    def handle(self, *args, **options):
+        rebuild_technician_load()
+        self.stdout.write(self.style.SUCCESS(
+            f"Technician load rebuilt: {TechnicianLoad.objects.count()} technicians, "
+            f"{TechnicianPincodeStat.objects.count()} pincode stats"
+        ))
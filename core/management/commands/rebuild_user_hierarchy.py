@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from core.hierarchy import rebuild_user_hierarchy
+from core.models import UserHierarchy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the UserHierarchy closure table from User.supervisor, RetailerFosMap and fos_links"
+
+    def handle(self, *args, **options):
+        rebuild_user_hierarchy()
+        self.stdout.write(self.style.SUCCESS(f"User hierarchy rebuilt: {UserHierarchy.objects.count()} rows"))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.gateway import gateway_metrics
+from core.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued WhatsApp messages from the outbox, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Drain what is due now and exit")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds to sleep when nothing is due")
+
+    def handle(self, *args, **options):
+        while True:
+            totals = {"sent": 0, "retrying": 0, "failed": 0}
+            while True:
+                counts = drain_outbox()
+                if not counts["claimed"]:
+                    break
+                for key in totals:
+                    totals[key] += counts[key]
+            if any(totals.values()):
+                self.stdout.write(
+                    f"WhatsApp outbox: {totals['sent']} sent, {totals['retrying']} retrying, {totals['failed']} failed"
+                )
+                if options["verbosity"] > 1:
+                    stats = gateway_metrics.snapshot()
+                    self.stdout.write(
+                        f"Gateway: {stats['requests']} calls, avg {stats['avg_ms']}ms, p95 <={stats['p95_ms']}ms, "
+                        f"statuses {stats['statuses']}, errors {stats['errors']}"
+                    )
+            if options["once"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.otp import sweep_otps
+
+
+class Command(BaseCommand):
+    help = "Mark expired work OTPs and delete OTP history older than the retention period"
+
+    def handle(self, *args, **options):
+        expired, deleted = sweep_otps()
+        self.stdout.write(self.style.SUCCESS(f"OTPs swept: {expired} expired, {deleted} deleted"))
@@ -0,0 +1,106 @@
+"""
+Master-data bundle for the app
+
+Operators, service types, work-from roles, materials and the six Work*Option
+masters change rarely but the app needs all of them on every cold start.
+They are served as one JSON document, ``GET /api/master-data/``, built once
+per process and kept with its gzip encoding and a strong ETag, so a start-up
+is one request that is usually answered 304 without touching the database.
+
+Any write to a master (CRUD views, API viewsets, admin) goes through the
+model signals, which call ``invalidate_master_data`` after commit. Like the
+pincode routing table, invalidation bumps a SharedVersion so other
+processes rebuild within MASTER_DATA_RECHECK_SECONDS.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .caching import SharedVersion
+
+
+MASTER_DATA_VERSION = SharedVersion('master_data')
+MASTER_DATA_RECHECK_SECONDS = 5
+
+_lock = threading.Lock()
+_bundle = None
+_version = None
+_checked_at = 0.0
+
+
+class MasterBundle:
+    """
+    The encoded bundle: JSON body, its gzip form and a strong ETag. The
+    version is a digest of the content, so a rebuild that changes nothing
+    keeps clients' cached copy valid.
+    """
+
+    def __init__(self, data):
+        content = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'), sort_keys=True)
+        self.version = hashlib.sha256(content.encode()).hexdigest()[:20]
+        self.body = json.dumps({'version': self.version, **data}, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+        self.gzipped = gzip.compress(self.body, mtime=0)
+        self.etag = f'"{self.version}"'
+
+
+def master_models():
+    """(bundle key, model, fields) for every master in the bundle"""
+    from .models import (
+        Material, Operator, TypeOfService, WorkCategoryOption, WorkDthTypeOption, WorkFiberTypeOption,
+        WorkFrIssueOption, WorkFromTheRole, WorkJobTypeOption, WorkWarrantyOption,
+    )
+    option_fields = ('id', 'code', 'name', 'ordering')
+    return [
+        ('operators', Operator, ('id', 'name')),
+        ('service_types', TypeOfService, ('id', 'name')),
+        ('work_from_roles', WorkFromTheRole, ('id', 'name')),
+        ('materials', Material, ('id', 'name', 'price', 'in_meter')),
+        ('work_categories', WorkCategoryOption, option_fields),
+        ('warranties', WorkWarrantyOption, option_fields),
+        ('job_types', WorkJobTypeOption, option_fields),
+        ('dth_types', WorkDthTypeOption, option_fields),
+        ('fiber_types', WorkFiberTypeOption, option_fields),
+        ('fr_issues', WorkFrIssueOption, option_fields),
+    ]
+
+
+def _load():
+    data = {}
+    for key, model, fields in master_models():
+        rows = model.objects.all()
+        if any(f.name == 'is_active' for f in model._meta.fields):
+            # Inactive options are hidden from the work forms too
+            rows = rows.filter(is_active=True).order_by('ordering', 'name')
+        else:
+            rows = rows.order_by('name')
+        data[key] = list(rows.values(*fields))
+    return MasterBundle(data)
+
+
+def get_master_bundle():
+    """Return the current MasterBundle, rebuilding it if stale"""
+    global _bundle, _version, _checked_at
+
+    now = time.monotonic()
+    if _bundle is not None and now - _checked_at < MASTER_DATA_RECHECK_SECONDS:
+        return _bundle
+
+    with _lock:
+        version = MASTER_DATA_VERSION.get()
+        if _bundle is None or version != _version:
+            _bundle = _load()
+            _version = version
+        _checked_at = now
+        return _bundle
+
+
+def invalidate_master_data():
+    """Drop this process's bundle and tell other processes to rebuild theirs"""
+    global _bundle
+    with _lock:
+        _bundle = None
+    MASTER_DATA_VERSION.bump()
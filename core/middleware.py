@@ -0,0 +1,48 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .query_budget import QueryRecorder, budget_for, inspector_enabled, report
+from .scope import RequestScope
+
+
+class RequestScopeMiddleware:
+    """Attach a lazily built RequestScope as ``request.scope``. Must come after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.scope = SimpleLazyObject(lambda: RequestScope(request.user))
+        return self.get_response(request)
+
+
+class QueryInspectorMiddleware:
+    """Count, time and fingerprint each request's SQL and log it (see core.query_budget). Place it near the top."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not inspector_enabled():
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._query_view = (None, None)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        view_path, budget = request._query_view
+        report(recorder, request, response, time.perf_counter() - started, view_path, budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', view_func)
+        view_path = f'{view.__module__}.{getattr(view, "__qualname__", view.__name__)}'
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        request._query_view = (view_path, budget_for(view_func, view_path, url_name))
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:01
+
+from collections import defaultdict, deque
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_user_hierarchy(apps, schema_editor):
+    """Backfill (ancestor, descendant, shortest depth) for every user; core.hierarchy keeps it current"""
+    User = apps.get_model('core', 'User')
+    RetailerFosMap = apps.get_model('core', 'RetailerFosMap')
+    UserHierarchy = apps.get_model('core', 'UserHierarchy')
+    FosLink = User._meta.get_field('fos_links').remote_field.through
+
+    parents = defaultdict(set)
+    for user_id, supervisor_id in User.objects.filter(supervisor__isnull=False).values_list('id', 'supervisor_id'):
+        parents[user_id].add(supervisor_id)
+    for retailer_id, fos_id in RetailerFosMap.objects.values_list('retailer_id', 'fos_id'):
+        parents[retailer_id].add(fos_id)
+    for retailer_id, fos_id in FosLink.objects.values_list('from_user_id', 'to_user_id'):
+        parents[retailer_id].add(fos_id)
+
+    rows = []
+    for user_id in User.objects.values_list('id', flat=True):
+        depths = {user_id: 0}
+        queue = deque([user_id])
+        while queue:
+            node = queue.popleft()
+            for parent in parents.get(node, ()):
+                if parent not in depths:
+                    depths[parent] = depths[node] + 1
+                    queue.append(parent)
+        rows.extend(
+            UserHierarchy(ancestor_id=ancestor, descendant_id=user_id, depth=depth)
+            for ancestor, depth in depths.items()
+        )
+    UserHierarchy.objects.bulk_create(rows, batch_size=1000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_work_master_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserHierarchy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField(default=0, help_text='Shortest number of links from ancestor to descendant')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarchy_descendants', to=settings.AUTH_USER_MODEL)),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hierarchy_ancestors', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='core_userhi_descend_f32ec3_idx')],
+                'unique_together': {('ancestor', 'descendant')},
+            },
+        ),
+        migrations.RunPython(build_user_hierarchy, noop_reverse),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:08
+
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+from django.utils import timezone
+
+# core.dispatch's decay at the time of this migration
+THROUGHPUT_HALF_LIFE_DAYS = 7.0
+
+
+def build_technician_load(apps, schema_editor):
+    """Backfill open works, decayed recent closures and per-pincode counts; core.dispatch keeps them current"""
+    User = apps.get_model('core', 'User')
+    WorkStb = apps.get_model('core', 'WorkStb')
+    TechnicianLoad = apps.get_model('core', 'TechnicianLoad')
+    TechnicianPincodeStat = apps.get_model('core', 'TechnicianPincodeStat')
+
+    now = timezone.now()
+    open_counts = dict(
+        WorkStb.objects.filter(status='Pending', assigned_technician__isnull=False)
+        .values_list('assigned_technician').annotate(n=Count('id')).order_by()
+    )
+    closed = defaultdict(float)
+    for technician_id, closed_at in WorkStb.objects.filter(
+        status='Closed', assigned_technician__isnull=False,
+        work_closing_time__gte=now - timedelta(days=THROUGHPUT_HALF_LIFE_DAYS * 4),
+    ).values_list('assigned_technician', 'work_closing_time').iterator():
+        age_days = max((now - closed_at).total_seconds(), 0) / 86400.0
+        closed[technician_id] += math.pow(0.5, age_days / THROUGHPUT_HALF_LIFE_DAYS)
+
+    TechnicianLoad.objects.bulk_create([
+        TechnicianLoad(
+            technician_id=technician_id,
+            open_works=open_counts.get(technician_id, 0),
+            recent_closed=closed.get(technician_id, 0.0),
+            recent_closed_at=now if technician_id in closed else None,
+        )
+        for technician_id in User.objects.filter(role='technician').values_list('id', flat=True)
+    ], batch_size=1000)
+
+    stats = WorkStb.objects.filter(
+        assigned_technician__role='technician'
+    ).values_list('assigned_technician', 'pincode').annotate(n=Count('id')).order_by()
+    TechnicianPincodeStat.objects.bulk_create(
+        [TechnicianPincodeStat(technician_id=t, pincode=p, works_count=n) for t, p, n in stats],
+        batch_size=1000,
+    )
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_user_hierarchy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechnicianLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('open_works', models.PositiveIntegerField(default=0, help_text='Pending works currently assigned')),
+                ('recent_closed', models.FloatField(default=0.0, help_text='Closed works, exponentially decayed (see core.dispatch)')),
+                ('recent_closed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_assigned_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('technician', models.OneToOneField(limit_choices_to={'role': 'technician'}, on_delete=django.db.models.deletion.CASCADE, related_name='load', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TechnicianPincodeStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pincode', models.CharField(max_length=10)),
+                ('works_count', models.PositiveIntegerField(default=0)),
+                ('technician', models.ForeignKey(limit_choices_to={'role': 'technician'}, on_delete=django.db.models.deletion.CASCADE, related_name='pincode_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['pincode'], name='core_techni_pincode_12518e_idx')],
+                'unique_together': {('technician', 'pincode')},
+            },
+        ),
+        migrations.RunPython(build_technician_load, noop_reverse),
+    ]
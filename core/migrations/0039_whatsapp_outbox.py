@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_technician_load_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WhatsAppOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mobile', models.CharField(help_text='Without country code', max_length=15)),
+                ('message', models.TextField()),
+                ('kind', models.CharField(choices=[('general', 'General'), ('work_assigned', 'Work Assigned'), ('work_reassigned', 'Work Reassigned'), ('work_summary', 'New Works Summary'), ('otp', 'OTP')], default='general', max_length=20)),
+                ('coalesce_key', models.CharField(blank=True, help_text='A newer queued message with the same key replaces this one', max_length=100, null=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('superseded', 'Superseded')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claim_token', models.CharField(blank=True, max_length=32, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('response', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_with', models.ForeignKey(blank=True, help_text='Message this one was delivered together with', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='coalesced', to='core.whatsappoutbox')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='core_whatsa_status_797456_idx'), models.Index(fields=['claim_token'], name='core_whatsa_claim_t_e41916_idx'), models.Index(fields=['coalesce_key', 'status'], name='core_whatsa_coalesc_530300_idx')],
+            },
+        ),
+    ]
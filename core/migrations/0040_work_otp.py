@@ -0,0 +1,58 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_pending_otps(apps, schema_editor):
+    # Keep OTPs already sent for pending works usable after the switch
+    from datetime import timedelta
+    from django.utils import timezone
+
+    WorkStb = apps.get_model('core', 'WorkStb')
+    WorkOtp = apps.get_model('core', 'WorkOtp')
+    now = timezone.now()
+    WorkOtp.objects.bulk_create([
+        WorkOtp(
+            work_id=work_id, code=code, status='active',
+            created_at=sent_at or now, expires_at=now + timedelta(days=1),
+        )
+        for work_id, code, sent_at in WorkStb.objects.filter(
+            status='Pending', closing_otp__isnull=False
+        ).exclude(closing_otp='').values_list('id', 'closing_otp', 'otp_sent_at').iterator()
+    ], batch_size=1000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_whatsapp_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkOtp',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=6)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('used', 'Used'), ('superseded', 'Superseded'), ('expired', 'Expired'), ('locked', 'Locked')], default='active', max_length=20)),
+                ('sent_to', models.CharField(blank=True, max_length=15, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+                ('used_at', models.DateTimeField(blank=True, null=True)),
+                ('issued_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='otps_issued', to=settings.AUTH_USER_MODEL)),
+                ('work', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='otps', to='core.workstb')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['work', 'status'], name='core_workot_work_id_6c6130_idx'), models.Index(fields=['work', 'created_at'], name='core_workot_work_id_533bc3_idx'), models.Index(fields=['status', 'expires_at'], name='core_workot_status_299c72_idx')],
+            },
+        ),
+        migrations.RunPython(copy_pending_otps, noop_reverse),
+    ]
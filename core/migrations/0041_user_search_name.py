@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:21
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    batch = []
+    for user in User.objects.only('id', 'name').iterator(chunk_size=2000):
+        user.search_name = ' '.join((user.name or '').split()).lower()[:100]
+        batch.append(user)
+        if len(batch) >= 2000:
+            User.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['search_name'])
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_work_otp'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='search_name',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['role', 'id'], name='user_role_id_idx'),
+        ),
+        migrations.RunPython(fill_search_name, noop_reverse),
+    ]
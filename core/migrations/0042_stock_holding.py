@@ -0,0 +1,88 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def build_stock_summary(apps, schema_editor):
+    """Backfill per (kind, holder, operator) counts; core.stock_summary keeps them current"""
+    StockHolding = apps.get_model('core', 'StockHolding')
+    sources = [
+        ('sim', apps.get_model('core', 'SimStock'), 'operator'),
+        ('handset', apps.get_model('core', 'HandsetStock'), 'handset_type__operator'),
+    ]
+    for kind, model, operator_path in sources:
+        rows = (
+            model.objects.values_list('current_holder', operator_path)
+            .annotate(
+                total=Count('id'),
+                available=Count('id', filter=Q(status='available')),
+                sold=Count('id', filter=Q(status='sold')),
+            )
+            .order_by()
+        )
+        StockHolding.objects.bulk_create([
+            StockHolding(
+                kind=kind, holder_id=holder_id, operator_id=operator_id,
+                total=total, available=available, sold=sold,
+            )
+            for holder_id, operator_id, total, available, sold in rows
+        ], batch_size=1000)
+
+
+def noop_reverse(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_user_search_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockHolding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sim', 'SIM'), ('handset', 'Handset')], max_length=10)),
+                ('total', models.IntegerField(default=0)),
+                ('available', models.IntegerField(default=0)),
+                ('sold', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='handsetstock',
+            index=models.Index(fields=['created_at', 'id'], name='handset_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='handsetstock',
+            index=models.Index(fields=['current_holder', 'created_at', 'id'], name='handset_holder_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='simstock',
+            index=models.Index(fields=['created_at', 'id'], name='sim_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='simstock',
+            index=models.Index(fields=['current_holder', 'created_at', 'id'], name='sim_holder_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockholding',
+            name='holder',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='stock_holdings', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='stockholding',
+            name='operator',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_holdings', to='core.operator'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='stockholding',
+            unique_together={('kind', 'holder', 'operator')},
+        ),
+        migrations.RunPython(build_stock_summary, noop_reverse),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_stock_holding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workstb',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='workstb',
+            index=models.Index(fields=['assigned_technician', 'status', 'id'], name='work_tech_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workstb',
+            index=models.Index(fields=['assigned_technician', 'updated_at'], name='work_tech_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workstb',
+            index=models.Index(fields=['updated_at'], name='work_updated_idx'),
+        ),
+    ]
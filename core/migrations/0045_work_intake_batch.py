@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_sync_watermarks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workstb',
+            name='intake_batch',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=32, null=True),
+        ),
+    ]
@@ -4,6 +4,8 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.conf import settings
 from django.utils import timezone
 
+from .user_search import normalize_name
+
 
 class SupervisorCategory(models.Model):
     name = models.CharField(max_length=50, unique=True)  # e.g., Sales, Services, Both
@@ -50,6 +52,8 @@ class User(AbstractBaseUser):
     )
 
     name = models.CharField(max_length=100)
+    # Lowercased, whitespace-collapsed name for indexed prefix search (kept in sync by save())
+    search_name = models.CharField(max_length=100, db_index=True, editable=False, default='')
     phone = models.CharField(max_length=15, unique=True)
     alternate_no = models.CharField(max_length=15, blank=True, null=True)
     whatsapp_no = models.CharField(max_length=15, blank=True, null=True)
@@ -88,9 +92,21 @@ class User(AbstractBaseUser):
 
     objects = UserManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['role', 'id'], name='user_role_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name} ({self.role})"
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'search_name'}
+        super().save(*args, **kwargs)
+
     @property
     def is_staff(self):
         return self.is_admin
@@ -193,7 +209,7 @@ class CollectionTransfer(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
     remark = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.technician.name} → {self.supervisor.name} ({self.amount})"
@@ -237,6 +253,7 @@ class CollectionTransfer(models.Model):
 
 class Operator(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
@@ -533,6 +550,8 @@ class WorkStb(models.Model):
 
     # Track who added the work
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="works_created", help_text="User who created this work")
+    # Bulk intake that inserted the work (core.work_intake); lets the batch be re-read where bulk_create returns no ids
+    intake_batch = models.CharField(max_length=32, blank=True, null=True, db_index=True, editable=False)
 
     # New fields for web flows
     kind = models.CharField(max_length=20, choices=KIND_CHOICES, default="service")
@@ -549,11 +568,19 @@ class WorkStb(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Sync watermark for the mobile app; queryset .update()/bulk_update callers must set it too
+    updated_at = models.DateTimeField(auto_now=True)
 
     # OTP fields for work closing
     closing_otp = models.CharField(max_length=6, blank=True, null=True, help_text="OTP sent to customer for work closing")
     otp_sent_at = models.DateTimeField(blank=True, null=True, help_text="When OTP was sent")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['assigned_technician', 'status', 'id'], name='work_tech_status_idx'),
+            models.Index(fields=['assigned_technician', 'updated_at'], name='work_tech_updated_idx'),
+            models.Index(fields=['updated_at'], name='work_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.customer_name} - {self.operator}"
@@ -642,6 +669,7 @@ class WorkReport(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     # Freelancer payment
     freelancer_payment_amount = models.DecimalField(
@@ -674,6 +702,129 @@ class WorkReport(models.Model):
         return total
 
 
+# Technician load index used by the auto-dispatcher (core.dispatch)
+class TechnicianLoad(models.Model):
+    """Running counters per technician, kept current by WorkStb signals"""
+    technician = models.OneToOneField(User, on_delete=models.CASCADE, related_name="load", limit_choices_to={'role': 'technician'})
+    open_works = models.PositiveIntegerField(default=0, help_text="Pending works currently assigned")
+    recent_closed = models.FloatField(default=0.0, help_text="Closed works, exponentially decayed (see core.dispatch)")
+    recent_closed_at = models.DateTimeField(null=True, blank=True)
+    last_assigned_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.technician.name}: {self.open_works} open"
+
+
+class TechnicianPincodeStat(models.Model):
+    """How many works a technician has been given in a pincode"""
+    technician = models.ForeignKey(User, on_delete=models.CASCADE, related_name="pincode_stats", limit_choices_to={'role': 'technician'})
+    pincode = models.CharField(max_length=10)
+    works_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('technician', 'pincode')
+        indexes = [
+            models.Index(fields=['pincode']),
+        ]
+
+    def __str__(self):
+        return f"{self.technician.name} @ {self.pincode}: {self.works_count}"
+
+
+class SyncTombstone(models.Model):
+    """Record of a deleted (or no longer visible) row, served by the mobile delta-sync API"""
+    resource = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    # Set when the row only left one user's view (e.g. a work reassigned away from a technician)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="+")
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'deleted_at', 'id'], name='tombstone_resource_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.resource} #{self.object_id} deleted {self.deleted_at:%Y-%m-%d %H:%M}"
+
+
+class WorkOtp(models.Model):
+    """Customer OTP for closing a work (see core.otp)"""
+    STATUS_CHOICES = [
+        ("active", "Active"),
+        ("used", "Used"),
+        ("superseded", "Superseded"),
+        ("expired", "Expired"),
+        ("locked", "Locked"),
+    ]
+
+    work = models.ForeignKey("WorkStb", on_delete=models.CASCADE, related_name="otps")
+    code = models.CharField(max_length=6)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    sent_to = models.CharField(max_length=15, blank=True, null=True)
+    issued_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="otps_issued")
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["work", "status"]),
+            models.Index(fields=["work", "created_at"]),
+            models.Index(fields=["status", "expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"OTP for work #{self.work_id} ({self.status})"
+
+
+class WhatsAppOutbox(models.Model):
+    """Outbound WhatsApp message, delivered by the outbox worker (see core.notifications)"""
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+        ("superseded", "Superseded"),
+    ]
+
+    KIND_CHOICES = [
+        ("general", "General"),
+        ("work_assigned", "Work Assigned"),
+        ("work_reassigned", "Work Reassigned"),
+        ("work_summary", "New Works Summary"),
+        ("otp", "OTP"),
+    ]
+
+    mobile = models.CharField(max_length=15, help_text="Without country code")
+    message = models.TextField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default="general")
+    coalesce_key = models.CharField(max_length=100, blank=True, null=True, help_text="A newer queued message with the same key replaces this one")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, null=True)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    sent_with = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="coalesced", help_text="Message this one was delivered together with")
+    last_error = models.TextField(blank=True, null=True)
+    response = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"]),
+            models.Index(fields=["claim_token"]),
+            models.Index(fields=["coalesce_key", "status"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} → {self.mobile} ({self.status})"
+
+
 # Link FOS ↔ Operators
 class FosOperatorMap(models.Model):
     fos = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'fos'})
@@ -695,6 +846,24 @@ class RetailerFosMap(models.Model):
         return f"{self.retailer.name} ↔ {self.fos.name}"
 
 
+# Closure table over User.supervisor, RetailerFosMap and User.fos_links
+class UserHierarchy(models.Model):
+    """One row per (ancestor, descendant) pair, including each user's own depth-0 row.
+    Maintained by core.hierarchy via signals; do not edit by hand."""
+    ancestor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="hierarchy_descendants")
+    descendant = models.ForeignKey(User, on_delete=models.CASCADE, related_name="hierarchy_ancestors")
+    depth = models.PositiveSmallIntegerField(default=0, help_text="Shortest number of links from ancestor to descendant")
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        indexes = [
+            models.Index(fields=['descendant', 'depth']),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} → {self.descendant_id} ({self.depth})"
+
+
 
 class UserProductStock(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="product_stocks")
@@ -850,6 +1019,12 @@ class SimStock(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='sim_created_id_idx'),
+            models.Index(fields=['current_holder', 'created_at', 'id'], name='sim_holder_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.operator.name} - {self.serial_number} - {self.status}"
 
@@ -1207,11 +1382,37 @@ class HandsetStock(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='handset_created_id_idx'),
+            models.Index(fields=['current_holder', 'created_at', 'id'], name='handset_holder_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.handset_type.name} - {self.serial_number} ({self.status})"
 
 
+class StockHolding(models.Model):
+    """Per-holder, per-operator SIM/handset counts, kept current by core.stock_summary"""
+    KIND_CHOICES = [
+        ('sim', 'SIM'),
+        ('handset', 'Handset'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    holder = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="stock_holdings")
+    operator = models.ForeignKey(Operator, on_delete=models.CASCADE, related_name="stock_holdings")
+    total = models.IntegerField(default=0)
+    available = models.IntegerField(default=0)
+    sold = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'holder', 'operator')
+
+    def __str__(self):
+        return f"{self.kind} {self.operator_id} @ {self.holder_id}: {self.available}/{self.total}"
+
+
 class HandsetTransfer(models.Model):
     """Handset transfer tracking"""
     STATUS_CHOICES = [
@@ -0,0 +1,309 @@
+"""
+Outbound WhatsApp queue
+
+Views never call the WhatsApp gateway themselves. ``queue_whatsapp`` writes a
+WhatsAppOutbox row (in the caller's transaction) and the outbox worker
+delivers it:
+
+* due rows are claimed in batches with a claim token, so several workers can
+  drain the same table without sending a message twice;
+* queued messages to the same recipient are merged into one send (OTPs are
+  always sent on their own), and a newer message with the same
+  ``coalesce_key`` supersedes an older one that has not gone out yet;
+* sends run on a small thread pool; failures are retried with exponential
+  backoff up to WHATSAPP_MAX_ATTEMPTS and then marked failed.
+
+The worker runs in-process (a short-lived thread woken after commit) and as
+``manage.py run_whatsapp_outbox`` for retries and multi-process deployments.
+The transport is chosen by settings.WHATSAPP_BACKEND (read on every drain);
+LocmemWhatsAppBackend keeps messages in memory so the whole flow can be
+exercised offline.
+"""
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .gateway import get_gateway_client
+from .models import WhatsAppOutbox
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = 'core.notifications.WhatsbotBackend'
+# No default: the gateway token comes from settings or the WHATSAPP_API_TOKEN environment variable
+WHATSAPP_API_TOKEN = getattr(settings, 'WHATSAPP_API_TOKEN', os.environ.get('WHATSAPP_API_TOKEN', ''))
+WHATSAPP_COUNTRY_CODE = getattr(settings, 'WHATSAPP_COUNTRY_CODE', '91')
+WHATSAPP_SEND_CONCURRENCY = getattr(settings, 'WHATSAPP_SEND_CONCURRENCY', 4)
+WHATSAPP_MAX_ATTEMPTS = getattr(settings, 'WHATSAPP_MAX_ATTEMPTS', 6)
+WHATSAPP_RETRY_BASE_SECONDS = getattr(settings, 'WHATSAPP_RETRY_BASE_SECONDS', 30)
+WHATSAPP_RETRY_MAX_SECONDS = getattr(settings, 'WHATSAPP_RETRY_MAX_SECONDS', 3600)
+WHATSAPP_COALESCE_SECONDS = getattr(settings, 'WHATSAPP_COALESCE_SECONDS', 2)
+WHATSAPP_BATCH_SIZE = 100
+WHATSAPP_MAX_MESSAGE_CHARS = 3500
+WHATSAPP_SENDING_TIMEOUT = timedelta(minutes=5)
+
+MESSAGE_SEPARATOR = '\n\n' + '-' * 20 + '\n\n'
+
+
+class WhatsAppSendError(Exception):
+    """Raised by a backend when a send fails; ``retryable`` says whether to try again"""
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# ==================== BACKENDS ====================
+
+class WhatsbotBackend:
+    """Sends through the whatsbot.tech HTTP API on the shared pooled client (core.gateway)"""
+
+    def send(self, mobile, message):
+        if not WHATSAPP_API_TOKEN:
+            raise WhatsAppSendError('WHATSAPP_API_TOKEN is not configured', retryable=False)
+        params = {
+            'api_token': WHATSAPP_API_TOKEN,
+            'mobile': f'{WHATSAPP_COUNTRY_CODE}{mobile}',
+            'message': message,
+        }
+        try:
+            response = get_gateway_client().get(params)
+        except requests.RequestException as e:
+            raise WhatsAppSendError(str(e))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise WhatsAppSendError(f'HTTP {response.status_code}: {response.text[:200]}')
+        if response.status_code >= 400:
+            raise WhatsAppSendError(f'HTTP {response.status_code}: {response.text[:200]}', retryable=False)
+        return response.text
+
+
+class LocmemWhatsAppBackend:
+    """
+    Offline stand-in: records (mobile, message) in ``sent`` instead of calling
+    the gateway. Set ``fail_next`` to make that many upcoming sends fail.
+    """
+
+    sent = []
+    fail_next = 0
+    _lock = threading.Lock()
+
+    def send(self, mobile, message):
+        with self._lock:
+            if LocmemWhatsAppBackend.fail_next > 0:
+                LocmemWhatsAppBackend.fail_next -= 1
+                raise WhatsAppSendError('simulated gateway failure')
+            LocmemWhatsAppBackend.sent.append((mobile, message))
+        return 'ok'
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.sent = []
+            cls.fail_next = 0
+
+
+def get_backend():
+    return import_string(getattr(settings, 'WHATSAPP_BACKEND', DEFAULT_BACKEND))()
+
+
+# ==================== QUEUEING ====================
+
+def queue_whatsapp(mobile, message, kind='general', coalesce_key=None):
+    """
+    Queue a WhatsApp message for ``mobile`` (without country code) and return
+    the outbox row, or None if there is no number.
+    """
+    mobile = str(mobile or '').strip()
+    if not mobile:
+        return None
+
+    with transaction.atomic():
+        if coalesce_key:
+            WhatsAppOutbox.objects.filter(coalesce_key=coalesce_key, status='queued').update(status='superseded')
+        outbox = WhatsAppOutbox.objects.create(
+            mobile=mobile, message=message, kind=kind, coalesce_key=coalesce_key,
+        )
+    transaction.on_commit(wake_worker)
+    return outbox
+
+
+# ==================== MESSAGES ====================
+
+def format_assignment_message(work, new=True):
+    """The technician's message for ``work`` being assigned (``new``) or reassigned to them"""
+    title = 'New Work Assigned For You' if new else 'Work Reassigned For You'
+    return f"""
+*{title}*
+
+Customer: {work.customer_name}
+Address: {work.address}
+Pincode: {work.pincode}
+Mobile: {work.mobile_no}
+Alternate: {work.alternate_no or 'N/A'}
+
+Operator: {work.operator.name if work.operator else ''}
+Service: {work.type_of_service.name if work.type_of_service else ''}
+Work From: {work.work_from.name if work.work_from else ''}
+Amount: ₹{work.amount}
+Status: {work.status}
+
+Please attend to this work as soon as possible.
+""".strip()
+
+
+# ==================== DELIVERY ====================
+
+def _retry_delay(attempts):
+    delay = min(WHATSAPP_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), WHATSAPP_RETRY_MAX_SECONDS)
+    return timedelta(seconds=delay + random.uniform(0, delay * 0.1))
+
+
+def _claim(limit):
+    now = timezone.now()
+    # A worker that died mid-send leaves rows in "sending"; put them back
+    WhatsAppOutbox.objects.filter(
+        status='sending', claimed_at__lt=now - WHATSAPP_SENDING_TIMEOUT
+    ).update(status='queued', claim_token=None)
+
+    ids = list(
+        WhatsAppOutbox.objects.filter(status='queued', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'id').values_list('id', flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    WhatsAppOutbox.objects.filter(pk__in=ids, status='queued').update(
+        status='sending', claim_token=token, claimed_at=now
+    )
+    return list(WhatsAppOutbox.objects.filter(claim_token=token).order_by('created_at', 'id'))
+
+
+def _group(rows):
+    """Split claimed rows into sends: one per recipient, OTPs alone, capped in length"""
+    per_mobile = defaultdict(list)
+    for row in rows:
+        per_mobile[row.mobile].append(row)
+
+    groups = []
+    for mobile_rows in per_mobile.values():
+        current, length = [], 0
+        for row in mobile_rows:
+            if row.kind == 'otp':
+                groups.append([row])
+                continue
+            if current and length + len(MESSAGE_SEPARATOR) + len(row.message) > WHATSAPP_MAX_MESSAGE_CHARS:
+                groups.append(current)
+                current, length = [], 0
+            current.append(row)
+            length += len(row.message) + (len(MESSAGE_SEPARATOR) if length else 0)
+        if current:
+            groups.append(current)
+    return groups
+
+
+def _send_group(backend, group):
+    text = MESSAGE_SEPARATOR.join(row.message for row in group)
+    try:
+        return group, backend.send(group[0].mobile, text), None
+    except WhatsAppSendError as e:
+        return group, None, e
+    except Exception as e:
+        return group, None, WhatsAppSendError(str(e))
+
+
+def _record(group, response, error):
+    now = timezone.now()
+    ids = [row.pk for row in group]
+    attempts = max(row.attempts for row in group) + 1
+
+    if error is None:
+        primary = group[0]
+        WhatsAppOutbox.objects.filter(pk__in=ids).update(
+            status='sent', sent_at=now, attempts=attempts, response=(response or '')[:1000],
+            last_error=None, claim_token=None,
+        )
+        WhatsAppOutbox.objects.filter(pk__in=ids[1:]).update(sent_with=primary)
+        return 'sent'
+
+    if not error.retryable or attempts >= WHATSAPP_MAX_ATTEMPTS:
+        WhatsAppOutbox.objects.filter(pk__in=ids).update(
+            status='failed', attempts=attempts, last_error=str(error)[:1000], claim_token=None,
+        )
+        logger.warning('WhatsApp to %s failed after %d attempt(s): %s', group[0].mobile, attempts, error)
+        return 'failed'
+
+    WhatsAppOutbox.objects.filter(pk__in=ids).update(
+        status='queued', attempts=attempts, last_error=str(error)[:1000], claim_token=None,
+        next_attempt_at=now + _retry_delay(attempts),
+    )
+    logger.info('WhatsApp to %s will be retried (attempt %d): %s', group[0].mobile, attempts, error)
+    return 'retrying'
+
+
+def drain_outbox(limit=WHATSAPP_BATCH_SIZE, backend=None):
+    """Deliver one batch of due messages; returns {'claimed', 'sent', 'retrying', 'failed'} counts"""
+    counts = {'claimed': 0, 'sent': 0, 'retrying': 0, 'failed': 0}
+    rows = _claim(limit)
+    if not rows:
+        return counts
+    counts['claimed'] = len(rows)
+
+    backend = backend or get_backend()
+    groups = _group(rows)
+    # Only the HTTP calls run on the pool; results are written from this thread
+    with ThreadPoolExecutor(max_workers=min(WHATSAPP_SEND_CONCURRENCY, len(groups))) as pool:
+        results = list(pool.map(lambda group: _send_group(backend, group), groups))
+    for group, response, error in results:
+        counts[_record(group, response, error)] += len(group)
+    return counts
+
+
+# ==================== IN-PROCESS WORKER ====================
+
+_worker_lock = threading.Lock()
+_worker = {'thread': None, 'again': False}
+
+
+def _run_inline_worker():
+    try:
+        # Give a burst of messages (e.g. auto-dispatch) time to queue up so they coalesce
+        time.sleep(WHATSAPP_COALESCE_SECONDS)
+        while True:
+            with _worker_lock:
+                _worker['again'] = False
+            try:
+                claimed = drain_outbox()['claimed']
+            except Exception:
+                logger.exception('WhatsApp outbox drain failed')
+                claimed = 0
+            if not claimed:
+                with _worker_lock:
+                    if not _worker['again']:
+                        _worker['thread'] = None
+                        return
+    finally:
+        connection.close()
+
+
+def wake_worker():
+    """Make sure an in-process drain runs soon (no-op when WHATSAPP_INLINE_WORKER is off)"""
+    if not getattr(settings, 'WHATSAPP_INLINE_WORKER', True):
+        return
+    with _worker_lock:
+        if _worker['thread'] is not None:
+            _worker['again'] = True
+            return
+        thread = threading.Thread(target=_run_inline_worker, name='whatsapp-outbox', daemon=True)
+        _worker['thread'] = thread
+    thread.start()
@@ -0,0 +1,145 @@
+"""
+Work closing OTPs
+
+Each "Send OTP" creates a WorkOtp row and queues the WhatsApp message on the
+outbox, so the click returns without waiting on the gateway. Only the
+newest OTP of a work is active; issuing supersedes the previous one.
+
+* codes come from ``secrets`` and are compared with ``hmac.compare_digest``;
+* issuing is limited per work (a cooldown between sends and a cap per hour),
+  counted on the (work, created_at) index;
+* wrong codes are counted in the cache rather than the database, because
+  work_close rolls its transaction back on a wrong code; after
+  OTP_MAX_FAILED_ATTEMPTS the OTP is locked and a new one must be sent;
+* expiry is by ``expires_at``; ``sweep_otps`` marks stale rows expired and
+  deletes old history through the (status, expires_at) index.
+
+Codes are stored as issued because admins read them from the OTP list to
+help technicians when a customer is unreachable.
+"""
+import hmac
+import secrets
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import WorkOtp, WorkStb
+from .notifications import queue_whatsapp
+
+OTP_TTL = timedelta(minutes=getattr(settings, 'OTP_TTL_MINUTES', 24 * 60))
+OTP_RESEND_COOLDOWN = timedelta(seconds=getattr(settings, 'OTP_RESEND_COOLDOWN_SECONDS', 60))
+OTP_MAX_PER_HOUR = getattr(settings, 'OTP_MAX_PER_HOUR', 5)
+OTP_MAX_FAILED_ATTEMPTS = getattr(settings, 'OTP_MAX_FAILED_ATTEMPTS', 5)
+OTP_RETENTION = timedelta(days=30)
+
+
+class OtpError(ValueError):
+    """Raised when an OTP cannot be issued or verified; the message is user-facing"""
+
+
+def generate_code():
+    return f'{secrets.randbelow(1000000):06d}'
+
+
+def _failures_key(otp):
+    return f'core:otp_failures:{otp.pk}'
+
+
+def active_otp(work):
+    """The work's current usable OTP, or None"""
+    return (
+        WorkOtp.objects.filter(work=work, status='active', expires_at__gt=timezone.now())
+        .order_by('-created_at').first()
+    )
+
+
+def issue_otp(work, issued_by=None):
+    """
+    Create a new OTP for ``work``, queue it to the customer and return it.
+    Raises OtpError when the per-work rate limit is hit.
+    """
+    now = timezone.now()
+    recent = list(
+        WorkOtp.objects.filter(work=work, created_at__gte=now - timedelta(hours=1))
+        .order_by('-created_at').values_list('created_at', flat=True)[:OTP_MAX_PER_HOUR]
+    )
+    if recent and now - recent[0] < OTP_RESEND_COOLDOWN:
+        wait = int((OTP_RESEND_COOLDOWN - (now - recent[0])).total_seconds()) + 1
+        raise OtpError(f'An OTP was just sent. Please wait {wait} seconds before resending.')
+    if len(recent) >= OTP_MAX_PER_HOUR:
+        raise OtpError(f'OTP limit reached ({OTP_MAX_PER_HOUR} per hour) for this work. Please try again later.')
+
+    mobile = work.wp_no or work.mobile_no
+    with transaction.atomic():
+        WorkOtp.objects.filter(work=work, status='active').update(status='superseded')
+        otp = WorkOtp.objects.create(
+            work=work, code=generate_code(), sent_to=mobile, issued_by=issued_by,
+            created_at=now, expires_at=now + OTP_TTL,
+        )
+        # Mirrored for API clients that read these WorkStb fields
+        WorkStb.objects.filter(pk=work.pk).update(closing_otp=otp.code, otp_sent_at=now, updated_at=now)
+        work.closing_otp, work.otp_sent_at = otp.code, now
+
+        if mobile:
+            message = f"""
+*Work Closing OTP*
+
+Hello {work.customer_name},
+
+Your OTP for closing work order is: *{otp.code}*
+
+Operator: {work.operator.name if work.operator else ''}
+Service: {work.type_of_service.name if work.type_of_service else ''}
+
+Please share this OTP with the technician to complete the work.
+
+Thank you!
+"""
+            queue_whatsapp(mobile, message.strip(), kind='otp', coalesce_key=f'work:{work.pk}:otp')
+    return otp
+
+
+def verify_otp(work, code):
+    """
+    Check ``code`` against the work's active OTP and mark it used.
+    Raises OtpError with the reason when it does not match.
+    """
+    code = (code or '').strip()
+    otp = WorkOtp.objects.filter(work=work, status='active').order_by('-created_at').first()
+    if not otp:
+        raise OtpError('OTP not generated yet. Please click "Send OTP to Customer" first.')
+    if otp.expires_at <= timezone.now():
+        WorkOtp.objects.filter(pk=otp.pk, status='active').update(status='expired')
+        raise OtpError('This OTP has expired. Please send a new OTP to the customer.')
+
+    failures_key = _failures_key(otp)
+    if (cache.get(failures_key) or 0) >= OTP_MAX_FAILED_ATTEMPTS:
+        WorkOtp.objects.filter(pk=otp.pk, status='active').update(status='locked')
+        raise OtpError('Too many wrong attempts. Please send a new OTP to the customer.')
+
+    if not hmac.compare_digest(code.encode(), otp.code.encode()):
+        cache.add(failures_key, 0, int(OTP_TTL.total_seconds()))
+        try:
+            cache.incr(failures_key)
+        except ValueError:
+            cache.set(failures_key, 1, int(OTP_TTL.total_seconds()))
+        raise OtpError('Invalid OTP. Please check and try again.')
+
+    # Only one concurrent close can consume the OTP
+    if not WorkOtp.objects.filter(pk=otp.pk, status='active').update(status='used', used_at=timezone.now()):
+        raise OtpError('This OTP has already been used. Please send a new OTP to the customer.')
+    cache.delete(failures_key)
+    return otp
+
+
+def sweep_otps(now=None):
+    """Expire active OTPs past expires_at and delete old history; returns (expired, deleted)"""
+    now = now or timezone.now()
+    expired = WorkOtp.objects.filter(status='active', expires_at__lte=now).update(status='expired')
+    deleted, _ = WorkOtp.objects.filter(
+        status__in=['used', 'superseded', 'expired', 'locked'], expires_at__lte=now - OTP_RETENTION
+    ).delete()
+    return expired, deleted
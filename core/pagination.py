@@ -0,0 +1,135 @@
+"""
+Keyset (seek) pagination helpers
+
+OFFSET pagination makes the database walk and discard every row before the
+requested page, so deep pages of large tables (EC sales, SIM stock) get slower
+the further you go. Keyset pagination instead remembers the sort key of the
+last row shown and asks for rows "after" it, which an index on the ordering
+columns answers directly regardless of depth.
+
+ApiCursorPagination applies the same idea to DRF list endpoints.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPage:
+    """One page of a keyset-paginated queryset"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _encode_cursor(direction, values):
+    raw = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, fields):
+    """Return (direction, values) or (None, None) if the cursor is unusable"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in ('n', 'p') or len(raw_values) != len(fields):
+            return None, None
+        values = [field.to_python(value) for field, value in zip(fields, raw_values)]
+        return direction, values
+    except (ValueError, TypeError, ValidationError):
+        return None, None
+
+
+def _seek_filter(names, descending, values, forward):
+    """Build the "row comes after (values)" condition for a compound sort key"""
+    condition = Q()
+    for i, name in enumerate(names):
+        # Descending columns move towards smaller values when paging forward
+        go_lower = descending[i] == forward
+        step = Q(**{f'{name}__lt' if go_lower else f'{name}__gt': values[i]})
+        for prev_name, prev_value in zip(names[:i], values[:i]):
+            step &= Q(**{prev_name: prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_paginate(queryset, ordering, cursor=None, per_page=50):
+    """
+    Paginate ``queryset`` by ``ordering`` (e.g. ``('-order_date', '-id')``).
+
+    The last ordering column must be unique and none of the columns may be
+    NULL. ``cursor`` is an opaque token taken from a previous page's
+    ``next_cursor``/``previous_cursor``; an invalid cursor yields the first page.
+    """
+    names = [f.lstrip('-') for f in ordering]
+    descending = [f.startswith('-') for f in ordering]
+    fields = [queryset.model._meta.get_field(name) for name in names]
+
+    direction, values = (None, None)
+    if cursor:
+        direction, values = _decode_cursor(cursor, fields)
+
+    def cursor_for(obj, direction):
+        return _encode_cursor(direction, [field.value_to_string(obj) for field in fields])
+
+    if direction == 'p':
+        reverse_ordering = [name if desc else f'-{name}' for name, desc in zip(names, descending)]
+        rows = list(
+            queryset.filter(_seek_filter(names, descending, values, forward=False))
+            .order_by(*reverse_ordering)[:per_page + 1]
+        )
+        more_before = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        if not rows:
+            # Stepped back past the start; fall back to the first page
+            return keyset_paginate(queryset, ordering, per_page=per_page)
+        return KeysetPage(
+            rows,
+            next_cursor=cursor_for(rows[-1], 'n'),
+            previous_cursor=cursor_for(rows[0], 'p') if more_before else None,
+        )
+
+    if direction == 'n':
+        queryset = queryset.filter(_seek_filter(names, descending, values, forward=True))
+
+    rows = list(queryset.order_by(*ordering)[:per_page + 1])
+    more_after = len(rows) > per_page
+    rows = rows[:per_page]
+    return KeysetPage(
+        rows,
+        next_cursor=cursor_for(rows[-1], 'n') if more_after else None,
+        previous_cursor=cursor_for(rows[0], 'p') if direction == 'n' and rows else None,
+    )
+
+
+class ApiCursorPagination(CursorPagination):
+    """Opaque-cursor pagination for API lists, newest first by primary key"""
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
@@ -0,0 +1,193 @@
+"""
+Bulk pincode master import and set-based supervisor assignment
+
+Onboarding a district means thousands of pincodes. The CSV import reads the
+file once, probes existing pincodes in ``IN`` chunks and inserts/updates
+with ``bulk_create``/``bulk_update``. Assignment resolves the selected
+pincodes, runs one ``pincode_id__in`` probe (chunked) for existing
+assignments and ``bulk_create``s the rest.
+
+Both paths bypass model signals, so they invalidate the pincode routing
+table themselves after commit; the import also drops the cached pages
+tagged ``pincodes``.
+"""
+import csv
+import io
+import re
+from functools import partial
+
+from django.db import transaction
+
+from .models import Pincode, PincodeAssignment
+from .routing import invalidate_routing_table
+from .serials import chunked
+from .view_cache import invalidate_view_tag
+
+PINCODE_CHUNK_SIZE = 1000
+REPORT_SAMPLE_SIZE = 20
+MAX_IMPORT_ROWS = 50000
+
+PINCODE_CSV_COLUMNS = {
+    'pincode': 'pincode',
+    'area name': 'area_name',
+    'area': 'area_name',
+    'city': 'city',
+    'state': 'state',
+    'active': 'is_active',
+    'is active': 'is_active',
+}
+REQUIRED_COLUMNS = ['pincode', 'area_name', 'city', 'state']
+
+_PINCODE_RE = re.compile(r'^\d{3,10}$')
+_FALSE_VALUES = {'0', 'no', 'n', 'false', 'inactive'}
+
+
+class PincodeImportError(ValueError):
+    """Raised when a pincode file cannot be read at all"""
+
+
+class PincodeConflictError(ValueError):
+    """Raised when pincodes are already assigned to another supervisor"""
+
+    def __init__(self, pincodes):
+        self.pincodes = pincodes
+        super().__init__(
+            f"The following pincodes are already assigned to other supervisors: {', '.join(pincodes)}"
+        )
+
+
+class PincodeImportReport:
+    def __init__(self):
+        self.total_rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < REPORT_SAMPLE_SIZE:
+            self.errors.append(f'line {line}: {message}')
+
+
+# ==================== IMPORT ====================
+
+def _read_rows(upload):
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', errors='replace', newline='')
+    reader = csv.DictReader(text)
+    if not reader.fieldnames:
+        raise PincodeImportError('The file is empty.')
+    columns = {}
+    for header in reader.fieldnames:
+        field = PINCODE_CSV_COLUMNS.get(' '.join((header or '').split()).lower())
+        if field and field not in columns.values():
+            columns[header] = field
+    missing = [field for field in REQUIRED_COLUMNS if field not in columns.values()]
+    if missing:
+        raise PincodeImportError(
+            f'Missing columns: {", ".join(m.replace("_", " ").title() for m in missing)}'
+        )
+    for line, row in enumerate(reader, start=2):
+        yield line, {field: (row.get(header) or '').strip() for header, field in columns.items()}
+
+
+def import_pincodes(upload, update_existing=False):
+    """
+    Create Pincode rows from a CSV (Pincode, Area Name, City, State[, Active]).
+    Existing pincodes are skipped, or updated when ``update_existing``.
+    """
+    report = PincodeImportReport()
+    rows = {}
+    for line, row in _read_rows(upload):
+        report.total_rows += 1
+        if report.total_rows > MAX_IMPORT_ROWS:
+            raise PincodeImportError(f'The file has more than {MAX_IMPORT_ROWS} rows.')
+        code = row['pincode']
+        if not _PINCODE_RE.match(code):
+            report.add_error(line, f'invalid pincode "{code}"')
+            continue
+        missing = [field.replace('_', ' ') for field in ('area_name', 'city', 'state') if not row[field]]
+        if missing:
+            report.add_error(line, f'{code}: {", ".join(missing)} required')
+            continue
+        if code in rows:
+            report.add_error(line, f'{code} repeated in the file')
+            continue
+        rows[code] = Pincode(
+            pincode=code,
+            area_name=row['area_name'][:200],
+            city=row['city'][:100],
+            state=row['state'][:100],
+            is_active=row.get('is_active', '').lower() not in _FALSE_VALUES,
+        )
+
+    existing = {}
+    for chunk in chunked(list(rows), PINCODE_CHUNK_SIZE):
+        existing.update((p.pincode, p) for p in Pincode.objects.filter(pincode__in=chunk))
+
+    new = [pincode for code, pincode in rows.items() if code not in existing]
+    changed = []
+    if update_existing:
+        for code, current in existing.items():
+            incoming = rows[code]
+            if (current.area_name, current.city, current.state, current.is_active) != (
+                incoming.area_name, incoming.city, incoming.state, incoming.is_active
+            ):
+                current.area_name, current.city = incoming.area_name, incoming.city
+                current.state, current.is_active = incoming.state, incoming.is_active
+                changed.append(current)
+
+    with transaction.atomic():
+        Pincode.objects.bulk_create(new, batch_size=PINCODE_CHUNK_SIZE)
+        if changed:
+            Pincode.objects.bulk_update(changed, ['area_name', 'city', 'state', 'is_active'], batch_size=PINCODE_CHUNK_SIZE)
+        transaction.on_commit(invalidate_routing_table)
+        transaction.on_commit(partial(invalidate_view_tag, 'pincodes'))
+
+    report.created = len(new)
+    report.updated = len(changed)
+    report.unchanged = len(existing) - len(changed)
+    return report
+
+
+# ==================== ASSIGNMENT ====================
+
+def resolve_pincodes(codes):
+    """Map pincode strings to active Pincode ids; returns (ids, unknown_codes)"""
+    codes = list(dict.fromkeys(code.strip() for code in codes if code and code.strip()))
+    found = {}
+    for chunk in chunked(codes, PINCODE_CHUNK_SIZE):
+        found.update(Pincode.objects.filter(pincode__in=chunk, is_active=True).values_list('pincode', 'id'))
+    return [found[code] for code in codes if code in found], [code for code in codes if code not in found]
+
+
+def assign_pincodes(supervisor, pincode_ids, assigned_by=None):
+    """
+    Assign ``pincode_ids`` to ``supervisor`` in one pass. Raises
+    PincodeConflictError (and assigns nothing) if any of them belongs to
+    another supervisor. Returns (created, already_assigned).
+    """
+    pincode_ids = list(dict.fromkeys(pincode_ids))
+    mine, conflicts = set(), set()
+    for chunk in chunked(pincode_ids, PINCODE_CHUNK_SIZE):
+        for pincode_id, supervisor_id in PincodeAssignment.objects.filter(
+            pincode_id__in=chunk
+        ).values_list('pincode_id', 'supervisor_id'):
+            if supervisor_id == supervisor.pk:
+                mine.add(pincode_id)
+            else:
+                conflicts.add(pincode_id)
+
+    if conflicts:
+        codes = Pincode.objects.filter(pk__in=list(conflicts)[:REPORT_SAMPLE_SIZE]).order_by('pincode')
+        raise PincodeConflictError([p.pincode for p in codes] + (['…'] if len(conflicts) > REPORT_SAMPLE_SIZE else []))
+
+    new = [
+        PincodeAssignment(supervisor=supervisor, pincode_id=pincode_id, assigned_by=assigned_by)
+        for pincode_id in pincode_ids if pincode_id not in mine
+    ]
+    with transaction.atomic():
+        PincodeAssignment.objects.bulk_create(new, batch_size=PINCODE_CHUNK_SIZE)
+        transaction.on_commit(invalidate_routing_table)
+    return len(new), len(mine)
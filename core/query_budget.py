@@ -0,0 +1,123 @@
+"""
+Per-request SQL accounting
+
+QueryInspectorMiddleware (core.middleware) wraps every database connection
+for the length of a request and records each query's time and fingerprint:
+the SQL with literals replaced by ``?`` and IN lists collapsed, so the same
+statement run for every row of a loop shows up as one fingerprint with a
+high count. At the end of the request it writes one JSON line to the
+``core.queries`` logger:
+
+    {"view": "core.views.stock_overview", "method": "GET", "status": 200,
+     "queries": 212, "db_ms": 81.4, "ms": 140.2, "n_plus_one": true,
+     "over_budget": true, "budget": 20, "duplicates": [{"sql": "...", "count": 200}]}
+
+* a fingerprint repeated QUERY_N_PLUS_ONE_THRESHOLD times or more flags an
+  N+1 pattern;
+* budgets come from ``@query_budget(n)`` on the view, QUERY_BUDGETS
+  ({view path or URL name: n}) or QUERY_BUDGET_DEFAULT. With
+  QUERY_BUDGET_RAISE = True (core.tests.CoreTestCase sets it) an overrun raises
+  QueryBudgetExceeded so the test fails; otherwise it is logged as a warning.
+
+The settings are read on every request, so ``override_settings`` works in
+tests. Only queries run before the view returns are counted: a
+StreamingHttpResponse (the CSV exports in core.exports) runs its queries
+while the server iterates the body, after the line has been written, so
+those go uncounted. XLSX exports are built before returning and do count.
+"""
+import json
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger('core.queries')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\?|%s)(?:, *(?:\?|%s))*\)', re.IGNORECASE)
+
+
+def inspector_enabled():
+    return getattr(settings, 'QUERY_INSPECTOR_ENABLED', True)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised (with QUERY_BUDGET_RAISE) when a view runs more queries than its budget"""
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may run per request"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def fingerprint(sql):
+    """``sql`` with literals replaced by ? and IN lists collapsed"""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """Connection execute wrapper that counts and times a request's queries"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self, limit=3):
+        return [(sql, count) for sql, count in self.fingerprints.most_common(limit) if count > 1]
+
+    @property
+    def n_plus_one(self):
+        threshold = getattr(settings, 'QUERY_N_PLUS_ONE_THRESHOLD', 5)
+        return any(count >= threshold for count in self.fingerprints.values())
+
+
+def budget_for(view_func, view_path, url_name):
+    """The query budget of a view: decorator, then QUERY_BUDGETS, then the default"""
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budgets = getattr(settings, 'QUERY_BUDGETS', {})
+        budget = budgets.get(view_path, budgets.get(url_name))
+    return getattr(settings, 'QUERY_BUDGET_DEFAULT', None) if budget is None else budget
+
+
+def report(recorder, request, response, elapsed, view_path=None, budget=None):
+    """Log the request's query line; raises QueryBudgetExceeded in strict mode"""
+    over_budget = budget is not None and recorder.count > budget
+    record = {
+        'view': view_path,
+        'method': request.method,
+        'path': request.path,
+        'status': getattr(response, 'status_code', None),
+        'queries': recorder.count,
+        'db_ms': round(recorder.seconds * 1000, 1),
+        'ms': round(elapsed * 1000, 1),
+        'n_plus_one': recorder.n_plus_one,
+        'over_budget': over_budget,
+        'budget': budget,
+        'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in recorder.duplicates()],
+    }
+    flagged = over_budget or record['n_plus_one']
+    logger.log(logging.WARNING if flagged else logging.INFO, json.dumps(record))
+
+    if over_budget and getattr(settings, 'QUERY_BUDGET_RAISE', False):
+        raise QueryBudgetExceeded(
+            f'{view_path} ran {recorder.count} queries (budget {budget}); top repeats: {record["duplicates"]}'
+        )
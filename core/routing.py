@@ -0,0 +1,77 @@
+"""
+Pincode → supervisor routing table
+
+Every new work is validated and routed by its pincode. Instead of two
+PincodeAssignment joins per work, the whole assignment table (a few thousand
+rows at most) is held in a process-wide dict and rebuilt only when an
+assignment or pincode changes.
+
+Invalidation bumps a SharedVersion in the shared cache so that other worker
+processes notice within ROUTING_RECHECK_SECONDS and rebuild their copy.
+"""
+import threading
+import time
+
+from .caching import SharedVersion
+
+
+ROUTING_VERSION = SharedVersion('pincode_routing')
+ROUTING_RECHECK_SECONDS = 5
+
+_lock = threading.Lock()
+_table = None          # {'560001': [supervisor_id, ...]} in PincodeAssignment order
+_version = None
+_checked_at = 0.0
+
+
+def _load():
+    from .models import PincodeAssignment
+
+    table = {}
+    # Same order as PincodeAssignment.Meta.ordering, so the first entry matches
+    # what PincodeAssignment.objects.filter(...).first() used to return
+    rows = PincodeAssignment.objects.order_by(
+        'supervisor__name', 'pincode__pincode', 'id'
+    ).values_list('pincode__pincode', 'supervisor_id')
+    for pincode, supervisor_id in rows.iterator():
+        table.setdefault(pincode, []).append(supervisor_id)
+    return table
+
+
+def get_routing_table():
+    """Return the current {pincode: [supervisor_id, ...]} table, rebuilding it if stale"""
+    global _table, _version, _checked_at
+
+    now = time.monotonic()
+    if _table is not None and now - _checked_at < ROUTING_RECHECK_SECONDS:
+        return _table
+
+    with _lock:
+        version = ROUTING_VERSION.get()
+        if _table is None or version != _version:
+            _table = _load()
+            _version = version
+        _checked_at = now
+        return _table
+
+
+def invalidate_routing_table():
+    """Drop this process's table and tell other processes to rebuild theirs"""
+    global _table
+    with _lock:
+        _table = None
+    ROUTING_VERSION.bump()
+
+
+def is_routable(pincode):
+    return str(pincode).strip() in get_routing_table()
+
+
+def supervisor_ids_for(pincode):
+    return get_routing_table().get(str(pincode).strip(), [])
+
+
+def route_supervisor_id(pincode):
+    """Supervisor id a new work for ``pincode`` goes to, or None"""
+    supervisor_ids = supervisor_ids_for(pincode)
+    return supervisor_ids[0] if supervisor_ids else None
@@ -0,0 +1,105 @@
+"""
+Per-request role/scope resolver
+
+Views keep asking the same questions about request.user: which FOS and
+retailers sit under me, which operators do I handle, who is the admin.
+RequestScope answers each question lazily and memoizes it for the rest of the
+request; RequestScopeMiddleware attaches one to every request as
+``request.scope``.
+"""
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+from .hierarchy import descendant_ids
+from .models import User, Operator, FosOperatorMap
+
+
+ADMIN_USER_CACHE_KEY = 'core:admin_user_id'
+ADMIN_USER_CACHE_TIMEOUT = 60 * 10
+
+
+def is_admin_account(role, is_admin):
+    return role == 'admin' or bool(is_admin)
+
+
+def get_admin_user():
+    """The admin account that owns stock and receives returns (its pk is cached across requests)"""
+    # Only the pk is shared: the row itself (password included) never goes into the cache
+    admin_id = cache.get(ADMIN_USER_CACHE_KEY)
+    if admin_id is not None:
+        admin_user = User.objects.filter(pk=admin_id).first()
+        if admin_user is not None:
+            return admin_user
+    admin_user = User.objects.filter(role='admin').first() or User.objects.filter(is_admin=True).first()
+    if admin_user is not None:
+        cache.set(ADMIN_USER_CACHE_KEY, admin_user.pk, ADMIN_USER_CACHE_TIMEOUT)
+    return admin_user
+
+
+def invalidate_admin_user():
+    cache.delete(ADMIN_USER_CACHE_KEY)
+
+
+class RequestScope:
+    """Lazily computed, per-request facts about the current user"""
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def role(self):
+        return getattr(self.user, 'role', None)
+
+    @cached_property
+    def is_admin(self):
+        return self.role == 'admin' or getattr(self.user, 'is_admin', False)
+
+    @cached_property
+    def admin_user(self):
+        return get_admin_user()
+
+    @cached_property
+    def subordinate_ids(self):
+        """Everyone below the user in the supervisor → FOS → retailer hierarchy"""
+        if not self.user.is_authenticated:
+            return []
+        return list(descendant_ids(self.user))
+
+    @cached_property
+    def fos_ids(self):
+        """FOS under a supervisor, or the FOS themselves"""
+        if self.role == 'fos':
+            return [self.user.id]
+        if self.role == 'supervisor':
+            return list(descendant_ids(self.user, roles=['fos']))
+        return []
+
+    @cached_property
+    def retailer_ids(self):
+        """Retailers under a supervisor/FOS, or the retailer themselves"""
+        if self.role == 'retailer':
+            return [self.user.id]
+        if self.role in ('supervisor', 'fos'):
+            return list(descendant_ids(self.user, roles=['retailer']))
+        return []
+
+    @cached_property
+    def technician_ids(self):
+        if self.role != 'supervisor':
+            return []
+        return list(descendant_ids(self.user, roles=['technician'], max_depth=1))
+
+    @cached_property
+    def operator_ids(self):
+        """Operators the user deals in; admin sees every operator"""
+        if self.is_admin:
+            return list(Operator.objects.values_list('id', flat=True))
+        if self.role == 'retailer':
+            fos_ids = self.user.hierarchy_ancestors.filter(
+                depth=1, ancestor__role='fos'
+            ).values_list('ancestor_id', flat=True)
+        else:
+            fos_ids = self.fos_ids
+        return list(
+            FosOperatorMap.objects.filter(fos_id__in=fos_ids).values_list('operator_id', flat=True).distinct()
+        )
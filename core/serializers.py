@@ -88,6 +88,23 @@ class WorkStbSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class WorkStbListSerializer(serializers.ModelSerializer):
+    """Compact work row for the technician app list/sync"""
+    operator_name = serializers.CharField(source='operator.name', read_only=True)
+    type_of_service_name = serializers.CharField(source='type_of_service.name', read_only=True)
+    work_from_name = serializers.CharField(source='work_from.name', read_only=True)
+
+    class Meta:
+        model = WorkStb
+        fields = [
+            'id', 'customer_name', 'address', 'pincode', 'mobile_no', 'alternate_no', 'wp_no',
+            'operator', 'operator_name', 'type_of_service', 'type_of_service_name',
+            'work_from', 'work_from_name', 'kind', 'category', 'job_type', 'remark',
+            'assigned_technician', 'supervisor', 'amount', 'status',
+            'work_deadline_time', 'work_closing_time', 'created_at', 'updated_at',
+        ]
+
+
 
 
 class WorkReportSerializer(serializers.ModelSerializer):
@@ -109,7 +126,7 @@ class WorkReportSerializer(serializers.ModelSerializer):
             "work_from": work.work_from.name if work.work_from else None,
             "status": work.status,
             "amount": work.amount,
-            "work_got_time": work.work_got_time,
+            "work_got_time": work.created_at,
         }
 
 
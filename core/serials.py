@@ -0,0 +1,226 @@
+"""
+Serial number ingestion helpers for SIM / handset stock
+
+Large lots (tens of thousands of serials) are read lazily from a textarea or
+an uploaded text/CSV file, de-duplicated in memory, checked against the
+database in fixed-size ``IN`` chunks and inserted with batched
+``bulk_create`` so neither MySQL's max_allowed_packet nor process memory is
+blown by one giant query or object list.
+"""
+import logging
+import re
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+SERIAL_CHUNK_SIZE = 1000
+REPORT_SAMPLE_SIZE = 20
+MAX_RANGE_SIZE = 100000
+# Most serials one transfer/return may read once ranges are expanded, repeats included
+MAX_SERIALS_PER_REQUEST = 200000
+
+_RANGE_RE = re.compile(r'^(?P<start>\S+?)\s*-\s*(?P<end>\S+)$')
+_TRAILING_DIGITS_RE = re.compile(r'^(?P<prefix>.*?)(?P<digits>\d+)$')
+
+
+class SerialRangeError(ValueError):
+    """Raised for a malformed or oversized serial range, or a list over the size limit"""
+
+
+def chunked(iterable, size=SERIAL_CHUNK_SIZE):
+    """Yield lists of up to ``size`` items from ``iterable``"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_text_lines(text):
+    for line in text.splitlines():
+        yield line
+
+
+def _iter_upload_lines(upload):
+    # UploadedFile iterates line by line without reading the whole file
+    for raw in upload:
+        yield raw.decode('utf-8-sig', errors='ignore')
+
+
+def iter_serials(text='', upload=None):
+    """
+    Yield serial numbers from textarea ``text`` and/or an uploaded file.
+    Blank lines are skipped; for CSV files only the first column is used and a
+    header row named like "serial" is ignored.
+    """
+    sources = [_iter_text_lines(text or '')]
+    if upload:
+        sources.append(_iter_upload_lines(upload))
+
+    for lines in sources:
+        first = True
+        for line in lines:
+            value = line.split(',', 1)[0].strip().strip('"')
+            if not value:
+                continue
+            if first and value.lower().startswith('serial'):
+                first = False
+                continue
+            first = False
+            yield value
+
+
+def _split_serial(serial):
+    match = _TRAILING_DIGITS_RE.match(serial)
+    if not match:
+        return None, None
+    return match.group('prefix'), match.group('digits')
+
+
+def expand_serial_ranges(serials, max_range=MAX_RANGE_SIZE):
+    """
+    Lazily expand ``START-END`` tokens into every serial in between.
+
+    Both ends must share the same prefix and digit width, e.g.
+    ``8991000000000000-8991000000000999`` or ``HS0100-HS0199``. Leading zeros are
+    kept. Tokens without a dash pass through unchanged.
+    """
+    for serial in serials:
+        match = _RANGE_RE.match(serial)
+        if not match:
+            yield serial
+            continue
+
+        start, end = match.group('start'), match.group('end')
+        start_prefix, start_digits = _split_serial(start)
+        end_prefix, end_digits = _split_serial(end)
+        if start_digits is None or end_digits is None:
+            # Not a numeric range (e.g. a serial that contains a dash)
+            yield serial
+            continue
+        if start_prefix != end_prefix or len(start_digits) != len(end_digits):
+            raise SerialRangeError(f'Range "{serial}": both ends must have the same prefix and length.')
+
+        low, high = int(start_digits), int(end_digits)
+        if high < low:
+            raise SerialRangeError(f'Range "{serial}": end is before start.')
+        if high - low + 1 > max_range:
+            raise SerialRangeError(f'Range "{serial}" has {high - low + 1} serials; the limit is {max_range}.')
+
+        width = len(start_digits)
+        for number in range(low, high + 1):
+            yield f'{start_prefix}{number:0{width}d}'
+
+
+class SerialIngestReport:
+    """Counts and samples gathered while ingesting a serial list"""
+
+    def __init__(self):
+        self.total_read = 0
+        self.batch_duplicates = []
+        self.batch_duplicate_count = 0
+        self.existing = []
+        self.existing_count = 0
+        self.inserted = 0
+
+    @property
+    def has_duplicates(self):
+        return bool(self.batch_duplicate_count or self.existing_count)
+
+    def duplicate_summary(self):
+        parts = []
+        if self.batch_duplicate_count:
+            parts.append(
+                f'{self.batch_duplicate_count} repeated in the list '
+                f'(e.g. {", ".join(self.batch_duplicates)})'
+            )
+        if self.existing_count:
+            parts.append(
+                f'{self.existing_count} already in stock '
+                f'(e.g. {", ".join(self.existing)})'
+            )
+        return '; '.join(parts)
+
+
+def dedupe_serials(serials, report, limit=None):
+    """
+    Return serials in first-seen order with repeats removed, recording repeats on ``report``.
+    Raises SerialRangeError once more than ``limit`` serials have been read.
+    """
+    seen = {}
+    for serial in serials:
+        report.total_read += 1
+        if limit is not None and report.total_read > limit:
+            raise SerialRangeError(f'The list has more than {limit} serials; split it into smaller lots.')
+        if serial in seen:
+            report.batch_duplicate_count += 1
+            if len(report.batch_duplicates) < REPORT_SAMPLE_SIZE:
+                report.batch_duplicates.append(serial)
+            continue
+        seen[serial] = None
+    return list(seen)
+
+
+def find_existing_serials(model, serials, report, chunk_size=SERIAL_CHUNK_SIZE):
+    """Probe ``model.serial_number`` in chunks; return the set of serials already present"""
+    existing = set()
+    for chunk in chunked(serials, chunk_size):
+        found = model.objects.filter(serial_number__in=chunk).values_list('serial_number', flat=True)
+        existing.update(found)
+    report.existing_count = len(existing)
+    report.existing = sorted(existing)[:REPORT_SAMPLE_SIZE]
+    return existing
+
+
+def bulk_insert_serials(model, serials, build, report, chunk_size=SERIAL_CHUNK_SIZE):
+    """Build and insert ``model`` rows chunk by chunk; ``build(serial)`` returns an unsaved instance"""
+    total = len(serials)
+    for chunk in chunked(serials, chunk_size):
+        model.objects.bulk_create([build(serial) for serial in chunk])
+        report.inserted += len(chunk)
+        logger.info('%s ingest: %d/%d inserted', model.__name__, report.inserted, total)
+    return report
+
+
+def find_holdings(model, serials, holder, chunk_size=SERIAL_CHUNK_SIZE):
+    """
+    Resolve ``serials`` to ids of ``model`` rows held by ``holder`` with status
+    ``available``, probing in chunks. Returns ``(ids, missing_count, missing_sample)``.
+    """
+    ids = []
+    missing_count = 0
+    missing_sample = []
+    for chunk in chunked(serials, chunk_size):
+        found = dict(
+            model.objects.filter(
+                serial_number__in=chunk, current_holder=holder, status='available'
+            ).values_list('serial_number', 'id')
+        )
+        ids.extend(found.values())
+        for serial in chunk:
+            if serial not in found:
+                missing_count += 1
+                if len(missing_sample) < REPORT_SAMPLE_SIZE:
+                    missing_sample.append(serial)
+    return ids, missing_count, missing_sample
+
+
+def bulk_create_chunked(model, objects, chunk_size=SERIAL_CHUNK_SIZE):
+    """bulk_create a (possibly lazy) iterable of unsaved instances chunk by chunk; returns the count"""
+    created = 0
+    for chunk in chunked(objects, chunk_size):
+        model.objects.bulk_create(chunk)
+        created += len(chunk)
+    return created
+
+
+def collect_transfer_serials(text='', upload=None):
+    """
+    Read, range-expand and de-duplicate serials for a transfer/return.
+    Returns ``(serials, report)``; the report counts the repeats that were dropped.
+    Raises SerialRangeError for a bad range or more than MAX_SERIALS_PER_REQUEST serials.
+    """
+    report = SerialIngestReport()
+    serials = dedupe_serials(expand_serial_ranges(iter_serials(text, upload)), report, MAX_SERIALS_PER_REQUEST)
+    return serials, report
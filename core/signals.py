@@ -1,8 +1,280 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_init, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import WorkStb, WorkReport
+from .models import (
+    WorkStb, WorkReport, User, RetailerFosMap, Pincode, PincodeAssignment, SimStock, HandsetStock,
+    CollectionTransfer, Operator,
+)
+from .hierarchy import schedule_refresh
+from .scope import invalidate_admin_user, is_admin_account
+from .routing import invalidate_routing_table
+from .dispatch import adjust_open_works, record_assignment, record_closed
+from .stock_summary import HANDSET, SIM, handset_operator_id, record_stock_change
+from .sync import record_tombstone
+from .master_data import invalidate_master_data, master_models
+from .api_auth import LOGIN_FIELDS, invalidate_login_cache
+from .view_cache import VIEW_CACHE_TAGS, invalidate_view_tag, user_tag
+from django.db import transaction
+from django.utils import timezone
+from django.apps import apps
+from functools import partial
 
 @receiver(post_save, sender=WorkStb)
 def create_work_report(sender, instance, created, **kwargs):
     if created:
         WorkReport.objects.create(work=instance)
+
+
+# ==================== TECHNICIAN LOAD INDEX ====================
+
+def _open_technician(technician_id, status):
+    return technician_id if status == 'Pending' else None
+
+
+@receiver(post_init, sender=WorkStb)
+def remember_work_assignment(sender, instance, **kwargs):
+    instance._load_technician_id = instance.__dict__.get('assigned_technician_id')
+    instance._load_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=WorkStb)
+def update_technician_load(sender, instance, created, **kwargs):
+    old_technician = None if created else instance._load_technician_id
+    old_status = None if created else instance._load_status
+    new_technician = instance.assigned_technician_id
+    new_status = instance.status
+
+    was_open = _open_technician(old_technician, old_status)
+    now_open = _open_technician(new_technician, new_status)
+    if was_open != now_open:
+        deltas = {}
+        if was_open:
+            deltas[was_open] = -1
+        if now_open:
+            deltas[now_open] = 1
+        adjust_open_works(deltas)
+
+    if new_technician and new_technician != old_technician:
+        record_assignment(new_technician, [instance.pincode])
+
+    if new_status == 'Closed' and old_status != 'Closed' and new_technician:
+        record_closed(new_technician, instance.work_closing_time)
+
+    if not created and new_technician != old_technician:
+        record_reassignment_tombstone(instance, old_technician)
+
+    instance._load_technician_id = new_technician
+    instance._load_status = new_status
+
+
+@receiver(post_delete, sender=WorkStb)
+def release_technician_load(sender, instance, **kwargs):
+    technician_id = _open_technician(instance.assigned_technician_id, instance.status)
+    if technician_id:
+        adjust_open_works({technician_id: -1})
+
+
+# ==================== USER HIERARCHY ====================
+
+@receiver(post_init, sender=User)
+def remember_user_supervisor(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads (.only()) don't trigger a query
+    instance._hierarchy_supervisor_id = instance.__dict__.get('supervisor_id')
+
+
+@receiver(post_save, sender=User)
+def refresh_hierarchy_on_user_save(sender, instance, created, **kwargs):
+    if created or instance.supervisor_id != instance._hierarchy_supervisor_id:
+        schedule_refresh([instance.pk])
+    instance._hierarchy_supervisor_id = instance.supervisor_id
+
+
+@receiver(pre_delete, sender=User)
+def remember_user_children(sender, instance, **kwargs):
+    instance._hierarchy_children = list(instance.hierarchy_descendants.filter(depth=1).values_list('descendant_id', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def refresh_hierarchy_on_user_delete(sender, instance, **kwargs):
+    schedule_refresh(getattr(instance, '_hierarchy_children', []))
+
+
+@receiver(post_save, sender=RetailerFosMap)
+@receiver(post_delete, sender=RetailerFosMap)
+def refresh_hierarchy_on_fos_map(sender, instance, **kwargs):
+    schedule_refresh([instance.retailer_id])
+
+
+@receiver(m2m_changed, sender=User.fos_links.through)
+def refresh_hierarchy_on_fos_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        # Clearing from the FOS side: remember which retailers lose the link
+        instance._hierarchy_cleared = list(instance.retailers_under.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            schedule_refresh([instance.pk])
+        elif action == 'post_clear':
+            schedule_refresh(getattr(instance, '_hierarchy_cleared', []))
+        else:
+            schedule_refresh(pk_set or [])
+
+
+# ==================== ADMIN USER CACHE ====================
+
+@receiver(post_init, sender=User)
+def remember_admin_state(sender, instance, **kwargs):
+    instance._was_admin = is_admin_account(instance.__dict__.get('role'), instance.__dict__.get('is_admin'))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_admin_user(sender, instance, **kwargs):
+    # The cached pk is always an admin's, so only saves of (former) admins can make it stale
+    if instance._was_admin or is_admin_account(instance.role, instance.is_admin):
+        invalidate_admin_user()
+    instance._was_admin = is_admin_account(instance.role, instance.is_admin)
+
+
+# ==================== LOGIN CACHE ====================
+
+def _login_state(instance):
+    return tuple(instance.__dict__.get(field) for field in LOGIN_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def remember_login_state(sender, instance, **kwargs):
+    instance._login_state = _login_state(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_login(sender, instance, **kwargs):
+    # Saves that leave the login fields alone (wallet, counters) keep the cache
+    if kwargs.get('created') or kwargs['signal'] is post_delete or _login_state(instance) != instance._login_state:
+        # After commit, so a login racing the save cannot re-cache the old row
+        transaction.on_commit(invalidate_login_cache)
+    instance._login_state = _login_state(instance)
+
+
+# ==================== PINCODE ROUTING ====================
+
+@receiver(post_save, sender=PincodeAssignment)
+@receiver(post_delete, sender=PincodeAssignment)
+@receiver(post_save, sender=Pincode)
+@receiver(post_delete, sender=Pincode)
+def invalidate_pincode_routing(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_routing_table)
+
+
+# ==================== STOCK SUMMARY ====================
+
+@receiver(post_init, sender=SimStock)
+def remember_sim_state(sender, instance, **kwargs):
+    instance._summary_state = (
+        instance.__dict__.get('current_holder_id'), instance.__dict__.get('operator_id'), instance.__dict__.get('status')
+    )
+
+
+@receiver(post_save, sender=SimStock)
+def update_sim_summary(sender, instance, created, **kwargs):
+    new_state = (instance.current_holder_id, instance.operator_id, instance.status)
+    record_stock_change(SIM, None if created else instance._summary_state, new_state)
+    instance._summary_state = new_state
+
+
+@receiver(post_delete, sender=SimStock)
+def release_sim_summary(sender, instance, **kwargs):
+    record_stock_change(SIM, (instance.current_holder_id, instance.operator_id, instance.status), None)
+
+
+@receiver(post_init, sender=HandsetStock)
+def remember_handset_state(sender, instance, **kwargs):
+    # The operator is resolved from handset_type only when something changed
+    instance._summary_state = (
+        instance.__dict__.get('current_holder_id'), instance.__dict__.get('handset_type_id'), instance.__dict__.get('status')
+    )
+
+
+@receiver(post_save, sender=HandsetStock)
+def update_handset_summary(sender, instance, created, **kwargs):
+    new_state = (instance.current_holder_id, instance.handset_type_id, instance.status)
+    old_state = None if created else instance._summary_state
+    if old_state != new_state:
+        new_operator = handset_operator_id(instance.handset_type_id)
+        old_operator = None
+        if old_state:
+            old_operator = new_operator if old_state[1] == instance.handset_type_id else handset_operator_id(old_state[1])
+        record_stock_change(
+            HANDSET,
+            (old_state[0], old_operator, old_state[2]) if old_state else None,
+            (new_state[0], new_operator, new_state[2]),
+        )
+    instance._summary_state = new_state
+
+
+@receiver(post_delete, sender=HandsetStock)
+def release_handset_summary(sender, instance, **kwargs):
+    record_stock_change(
+        HANDSET, (instance.current_holder_id, handset_operator_id(instance.handset_type_id), instance.status), None
+    )
+
+
+# ==================== SYNC TOMBSTONES ====================
+
+@receiver(post_delete, sender=WorkStb)
+@receiver(post_delete, sender=WorkReport)
+@receiver(post_delete, sender=CollectionTransfer)
+@receiver(post_delete, sender=Operator)
+def record_sync_tombstone(sender, instance, **kwargs):
+    resource = {
+        WorkStb: 'works', WorkReport: 'workreports', CollectionTransfer: 'collection-transfers', Operator: 'operators',
+    }[sender]
+    record_tombstone(resource, instance.pk)
+
+
+def record_reassignment_tombstone(instance, old_technician):
+    """A saved work changed technician (called from update_technician_load, which keeps the snapshot)"""
+    # The report moves with the work to the new technician's device
+    WorkReport.objects.filter(work_id=instance.pk).update(updated_at=timezone.now())
+    if old_technician:
+        # ...and both leave the previous technician's device
+        record_tombstone('works', instance.pk, owner_id=old_technician)
+        report_id = WorkReport.objects.filter(work_id=instance.pk).values_list('id', flat=True).first()
+        if report_id:
+            record_tombstone('workreports', report_id, owner_id=old_technician)
+
+
+# ==================== MASTER DATA BUNDLE ====================
+
+def invalidate_master_bundle(sender, instance, **kwargs):
+    transaction.on_commit(invalidate_master_data)
+
+
+for _key, _model, _fields in master_models():
+    post_save.connect(invalidate_master_bundle, sender=_model, dispatch_uid=f'master_data_save_{_key}')
+    post_delete.connect(invalidate_master_bundle, sender=_model, dispatch_uid=f'master_data_delete_{_key}')
+
+
+# ==================== VIEW CACHE ====================
+
+_view_cache_models = {}
+for _tag, _model_names in VIEW_CACHE_TAGS.items():
+    for _model_name in _model_names:
+        _view_cache_models.setdefault(_model_name, []).append(_tag)
+
+
+def invalidate_view_cache(sender, instance, **kwargs):
+    for tag in _view_cache_models[sender.__name__]:
+        transaction.on_commit(partial(invalidate_view_tag, tag))
+
+
+for _model_name in _view_cache_models:
+    _model = apps.get_model('core', _model_name)
+    post_save.connect(invalidate_view_cache, sender=_model, dispatch_uid=f'view_cache_save_{_model_name}')
+    post_delete.connect(invalidate_view_cache, sender=_model, dispatch_uid=f'view_cache_delete_{_model_name}')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_view_cache(sender, instance, **kwargs):
+    # Cached pages show the user's name and wallet in the sidebar
+    transaction.on_commit(partial(invalidate_view_tag, user_tag(instance.pk)))
@@ -0,0 +1,121 @@
+"""
+Per-holder SIM / handset stock summary
+
+The stock list summary card used to run conditional COUNTs over every SIM or
+handset a user could see on each page load. StockHolding keeps those counts
+per (kind, holder, operator) instead:
+
+* purchases insert stock with ``bulk_create`` (no signals), so the purchase
+  views call ``add_purchased_stock`` for the whole lot;
+* transfers, sales and edits go through ``save()``/``delete()`` and are
+  picked up by the SimStock/HandsetStock signals via ``record_stock_change``.
+
+Reading the card is then a lookup of one row per operator. ``manage.py
+rebuild_stock_summary`` recomputes everything if the counters ever drift.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import HandsetStock, HandsetType, SimStock, StockHolding
+
+SIM = 'sim'
+HANDSET = 'handset'
+
+
+def _counts(status, sign):
+    return Counter({
+        'total': sign,
+        'available': sign if status == 'available' else 0,
+        'sold': sign if status == 'sold' else 0,
+    })
+
+
+def adjust_holdings(kind, deltas):
+    """Apply {(holder_id, operator_id): Counter(total=, available=, sold=)} to the summary"""
+    for (holder_id, operator_id), counts in deltas.items():
+        counts = {field: n for field, n in counts.items() if n}
+        if operator_id is None or not counts:
+            continue
+        holdings = StockHolding.objects.filter(kind=kind, holder_id=holder_id, operator_id=operator_id)
+        # Pure decrements never create a row (e.g. cascades while an operator is being deleted)
+        if any(n > 0 for n in counts.values()) and (holder_id is not None or not holdings.exists()):
+            # Insert-if-missing, then F() updates (as in core.dispatch): concurrent first movements cannot collide
+            StockHolding.objects.bulk_create(
+                [StockHolding(kind=kind, holder_id=holder_id, operator_id=operator_id)], ignore_conflicts=True
+            )
+        if holder_id is None:
+            # SIMs of a deleted user have no holder, which the unique key does not cover; update one row only
+            holdings = StockHolding.objects.filter(pk=holdings.order_by('pk').values_list('pk', flat=True).first())
+        holdings.update(
+            **{field: F(field) + n for field, n in counts.items()}
+        )
+
+
+def record_stock_change(kind, old_state, new_state):
+    """Move one unit between (holder_id, operator_id, status) states; None means it did not exist"""
+    if old_state == new_state:
+        return
+    deltas = defaultdict(Counter)
+    if old_state:
+        holder_id, operator_id, status = old_state
+        deltas[(holder_id, operator_id)].update(_counts(status, -1))
+    if new_state:
+        holder_id, operator_id, status = new_state
+        deltas[(holder_id, operator_id)].update(_counts(status, 1))
+    adjust_holdings(kind, deltas)
+
+
+def add_purchased_stock(kind, holder_id, operator_id, quantity):
+    """Count a freshly bulk-inserted lot of available stock"""
+    if quantity:
+        adjust_holdings(kind, {(holder_id, operator_id): Counter(total=quantity, available=quantity)})
+
+
+def handset_operator_id(handset_type_id):
+    if handset_type_id is None:
+        return None
+    return HandsetType.objects.filter(pk=handset_type_id).values_list('operator_id', flat=True).first()
+
+
+def operator_summary(kind, holder=None, operator_id=None):
+    """Total / available / sold per operator, for one holder or (admin) across all holders"""
+    holdings = StockHolding.objects.filter(kind=kind)
+    if holder is not None:
+        holdings = holdings.filter(holder=holder)
+    if operator_id:
+        holdings = holdings.filter(operator_id=operator_id)
+    return (
+        holdings.values('operator__name')
+        .annotate(total=Sum('total'), available=Sum('available'), sold=Sum('sold'))
+        .filter(total__gt=0)
+        .order_by('operator__name')
+    )
+
+
+def rebuild_stock_summary():
+    """Recompute StockHolding from SimStock/HandsetStock (``manage.py rebuild_stock_summary``, for repair)"""
+    sources = [
+        (SIM, SimStock, 'operator'),
+        (HANDSET, HandsetStock, 'handset_type__operator'),
+    ]
+    with transaction.atomic():
+        StockHolding.objects.all().delete()
+        for kind, model, operator_path in sources:
+            rows = (
+                model.objects.values_list('current_holder', operator_path)
+                .annotate(
+                    total=Count('id'),
+                    available=Count('id', filter=Q(status='available')),
+                    sold=Count('id', filter=Q(status='sold')),
+                )
+                .order_by()
+            )
+            StockHolding.objects.bulk_create([
+                StockHolding(
+                    kind=kind, holder_id=holder_id, operator_id=operator_id,
+                    total=total, available=available, sold=sold,
+                )
+                for holder_id, operator_id, total, available, sold in rows
+            ], batch_size=1000)
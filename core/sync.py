@@ -0,0 +1,219 @@
+"""
+Delta sync for the mobile app
+
+Instead of re-downloading /api/works/, /api/workreports/,
+/api/collection-transfers/ and /api/operators/ on every refresh, the app
+calls ``GET /api/sync/?since=<token>`` and gets, per resource, the rows
+changed since its last token plus the ids deleted since then:
+
+* changes are read by the ``updated_at`` watermark with a (updated_at, id)
+  keyset, so a page is an index range scan; rows younger than
+  SYNC_SETTLE_SECONDS are left for the next call so a slow transaction
+  committing an older timestamp is not skipped;
+* deletes come from SyncTombstone rows written by post_delete signals. A
+  work reassigned away from a technician gets a tombstone owned by that
+  technician, so it disappears from their device too;
+* clients apply ``deleted`` before ``changed`` and keep calling while
+  ``has_more`` is true. A token older than SYNC_TOMBSTONE_RETENTION_DAYS is
+  refused (410) and the client must start again without one;
+* a token is bound to the ``assigned_technician`` scope it was issued for, so
+  replaying it with another technician (or none) is refused (400) instead
+  of silently skipping that feed's older rows.
+
+The response carries an ETag; a repeat call with If-None-Match and nothing
+new gets a 304 with no body.
+"""
+import base64
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import CollectionTransfer, Operator, SyncTombstone, WorkReport, WorkStb
+from .serializers import (
+    CollectionTransferSerializer, OperatorSerializer, WorkReportSerializer, WorkStbListSerializer
+)
+
+SYNC_PAGE_SIZE = getattr(settings, 'SYNC_PAGE_SIZE', 500)
+SYNC_MAX_PAGE_SIZE = 2000
+SYNC_SETTLE = timedelta(seconds=getattr(settings, 'SYNC_SETTLE_SECONDS', 2))
+SYNC_TOMBSTONE_RETENTION = timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+SYNC_EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class SyncTokenError(ValueError):
+    """Raised for an unreadable sync token"""
+
+
+class SyncTokenExpired(SyncTokenError):
+    """Raised when a token predates the tombstone retention window"""
+
+
+class SyncResource:
+    def __init__(self, name, queryset, serializer_class, scope=None):
+        self.name = name
+        self.queryset = queryset
+        self.serializer_class = serializer_class
+        # scope(queryset, user_id) narrows the rows to one user's view
+        self.scope = scope
+
+
+SYNC_RESOURCES = {
+    resource.name: resource for resource in [
+        SyncResource(
+            'works',
+            WorkStb.objects.select_related('operator', 'type_of_service', 'work_from'),
+            WorkStbListSerializer,
+            lambda qs, user_id: qs.filter(assigned_technician_id=user_id),
+        ),
+        SyncResource(
+            'workreports',
+            WorkReport.objects.select_related(
+                'work__operator', 'work__type_of_service', 'work__work_from',
+                'work__supervisor', 'work__assigned_technician',
+            ),
+            WorkReportSerializer,
+            lambda qs, user_id: qs.filter(work__assigned_technician_id=user_id),
+        ),
+        SyncResource(
+            'collection-transfers',
+            CollectionTransfer.objects.select_related('technician', 'supervisor'),
+            CollectionTransferSerializer,
+            lambda qs, user_id: qs.filter(Q(technician_id=user_id) | Q(supervisor_id=user_id)),
+        ),
+        SyncResource('operators', Operator.objects.all(), OperatorSerializer),
+    ]
+}
+
+
+# ==================== TOKENS ====================
+
+def encode_token(marks, user_id=None):
+    raw = json.dumps({'u': user_id, 'r': marks}, separators=(',', ':'), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_token(token, user_id=None):
+    """
+    {resource: {'c': [iso, id], 't': [iso, id]}} from a token issued for
+    ``user_id``'s scope; {} for no token
+    """
+    if not token:
+        return {}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode((token + '=' * (-len(token) % 4)).encode()))
+        scope, marks = raw['u'], raw['r']
+        for mark in marks.values():
+            for key in ('c', 't'):
+                when = parse_datetime(mark[key][0])
+                if when is None:
+                    raise ValueError(mark[key][0])
+                mark[key] = (when, int(mark[key][1]))
+    except (ValueError, TypeError, KeyError, AttributeError, IndexError):
+        raise SyncTokenError('Invalid sync token; sync again without one.')
+    if scope != user_id:
+        raise SyncTokenError('This sync token was issued for another assigned_technician; sync again without one.')
+    # Deletions older than the retention window may already be pruned
+    if any(mark['t'][0] < timezone.now() - SYNC_TOMBSTONE_RETENTION for mark in marks.values()):
+        raise SyncTokenExpired('Sync token expired; sync again without one.')
+    return marks
+
+
+def _after(fields, mark):
+    """Rows strictly after ``mark`` on the (time, id) key"""
+    time_field, id_field = fields
+    when, last_id = mark
+    return Q(**{f'{time_field}__gt': when}) | Q(**{time_field: when, f'{id_field}__gt': last_id})
+
+
+# ==================== SYNC ====================
+
+def _changes(resource, user_id, mark, until, limit):
+    rows = resource.queryset.filter(updated_at__lte=until)
+    if user_id and resource.scope:
+        rows = resource.scope(rows, user_id)
+    if mark:
+        rows = rows.filter(_after(('updated_at', 'id'), mark))
+    rows = list(rows.order_by('updated_at', 'id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def _deletions(resource, user_id, mark, until, limit):
+    tombstones = SyncTombstone.objects.filter(resource=resource.name, deleted_at__lte=until)
+    if user_id and resource.scope:
+        tombstones = tombstones.filter(Q(owner__isnull=True) | Q(owner_id=user_id))
+    else:
+        tombstones = tombstones.filter(owner__isnull=True)
+    if mark:
+        tombstones = tombstones.filter(_after(('deleted_at', 'id'), mark))
+    else:
+        # A first sync has nothing to delete yet
+        return [], False
+    rows = list(tombstones.order_by('deleted_at', 'id').values_list('deleted_at', 'id', 'object_id')[:limit + 1])
+    return rows[:limit], len(rows) > limit
+
+
+def build_sync(names, token=None, user_id=None, page_size=SYNC_PAGE_SIZE, context=None):
+    """
+    Changes and deletions for ``names`` since ``token``, optionally narrowed
+    to ``user_id``'s view. Returns the response payload (with the next token).
+    """
+    marks = decode_token(token, user_id)
+    until = timezone.now() - SYNC_SETTLE
+    payload, next_marks, has_more = {}, {}, False
+
+    for name in names:
+        resource = SYNC_RESOURCES[name]
+        mark = marks.get(name, {})
+        changed, more_changed = _changes(resource, user_id, mark.get('c'), until, page_size)
+        deleted, more_deleted = _deletions(resource, user_id, mark.get('t'), until, page_size)
+        has_more = has_more or more_changed or more_deleted
+
+        change_mark = (changed[-1].updated_at, changed[-1].pk) if changed else mark.get('c', (SYNC_EPOCH, 0))
+        if more_deleted:
+            tomb_mark = deleted[-1][:2]
+        else:
+            # Everything up to ``until`` has been seen. Advance in whole hours so
+            # the token (and the ETag) stays the same while nothing changes
+            hour = (until.replace(minute=0, second=0, microsecond=0), 0)
+            tomb_mark = max(deleted[-1][:2] if deleted else mark.get('t', hour), hour)
+        next_marks[name] = {
+            'c': [change_mark[0].isoformat(), change_mark[1]],
+            't': [tomb_mark[0].isoformat(), tomb_mark[1]],
+        }
+        payload[name] = {
+            'changed': resource.serializer_class(changed, many=True, context=context).data,
+            'deleted': [object_id for _, _, object_id in deleted],
+        }
+
+    return {'token': encode_token(next_marks, user_id), 'has_more': has_more, **payload}
+
+
+def payload_etag(payload):
+    body = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.sha1(body.encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+# ==================== TOMBSTONES ====================
+
+def record_tombstone(resource, object_id, owner_id=None):
+    SyncTombstone.objects.create(resource=resource, object_id=object_id, owner_id=owner_id)
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones older than the retention window; returns the count"""
+    now = now or timezone.now()
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=now - SYNC_TOMBSTONE_RETENTION).delete()
+    return deleted
@@ -1,3 +1,1045 @@
-from django.test import TestCase
+import csv
+import gzip
+import itertools
+import json
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import notifications, routing, sync
+from .api_auth import invalidate_login_cache, is_password_hashed
+from .benchmarks import baseline_key, compare, load_baselines, run_benchmarks, seed_benchmark_data
+from .caching import CacheNamespace, SHARED_CACHE, SharedVersion, get_versions
+from .dispatch import adjust_open_works, dispatch_works, rank_technicians
+from .exports import stream_csv
+from .gateway import FakeGatewayServer, GatewayClient, LatencyHistogram
+from .hierarchy import descendant_ids, scope_to_user
+from .master_data import get_master_bundle, invalidate_master_data
+from .middleware import QueryInspectorMiddleware
+from .models import (
+    FosOperatorMap, Operator, Pincode, PincodeAssignment, RetailerFosMap, SimStock, StockHolding, TechnicianLoad,
+    TechnicianPincodeStat, TypeOfService, User, UserHierarchy, WhatsAppOutbox, WorkFromTheRole, WorkOtp, WorkReport,
+    WorkStb,
+)
+from .notifications import (
+    LocmemWhatsAppBackend, MESSAGE_SEPARATOR, WHATSAPP_MAX_ATTEMPTS, WhatsAppSendError, WhatsbotBackend,
+    drain_outbox, queue_whatsapp,
+)
+from .otp import OTP_MAX_FAILED_ATTEMPTS, OTP_MAX_PER_HOUR, OTP_RETENTION, OtpError, issue_otp, sweep_otps, verify_otp
+from .pagination import keyset_paginate
+from .pincodes import PincodeConflictError, assign_pincodes, import_pincodes, resolve_pincodes
+from .query_budget import QueryBudgetExceeded, budget_for, query_budget
+from .scope import RequestScope, get_admin_user
+from .serials import (
+    SerialIngestReport, SerialRangeError, bulk_insert_serials, collect_transfer_serials, dedupe_serials,
+    expand_serial_ranges, find_existing_serials, find_holdings, iter_serials,
+)
+from .stock_summary import SIM, add_purchased_stock, operator_summary, rebuild_stock_summary
+from .sync import SyncTokenError, SyncTokenExpired, build_sync, encode_token
+from .user_search import user_search_filter
+from .view_cache import cache_view
+from .warmup import warm_up
+from .work_intake import SHEET_FIRST_ROW, intake_works
+
+# Every test runs with strict query budgets and an offline WhatsApp transport, whatever the runner
+TEST_SETTINGS = {
+    'QUERY_BUDGET_RAISE': True,
+    'WHATSAPP_BACKEND': 'core.notifications.LocmemWhatsAppBackend',
+    'WHATSAPP_INLINE_WORKER': False,
+}
+
+
+@override_settings(**TEST_SETTINGS)
+class CoreTestCase(TestCase):
+    """Base for the core tests: TEST_SETTINGS applied"""
+
+
+@override_settings(**TEST_SETTINGS)
+class CoreTransactionTestCase(TransactionTestCase):
+    """CoreTestCase for tests that need real commits (on_commit hooks, benchmarks)"""
+
+
+_phones = itertools.count(9000000001)
+
+
+def make_user(role='technician', **fields):
+    """Save a user with a unique phone/email; ``fields`` override the defaults"""
+    phone = str(next(_phones))
+    fields = {'name': f'{role.title()} {phone[-4:]}', 'phone': phone, 'email': f'{phone}@example.com',
+              'password': 'secret', 'role': role, **fields}
+    return User.objects.create(**fields)
+
+
+def make_work(**fields):
+    """Save a Pending work with throwaway lookups; ``fields`` override the defaults"""
+    fields = {
+        'customer_name': 'Customer', 'address': '1 Main Road', 'pincode': '560001', 'mobile_no': '9800000000',
+        'operator': Operator.objects.get_or_create(name='Tata Play')[0],
+        'type_of_service': TypeOfService.objects.get_or_create(name='Installation')[0],
+        'work_from': WorkFromTheRole.objects.get_or_create(name='Operator')[0],
+        'amount': Decimal('250'), **fields,
+    }
+    return WorkStb.objects.create(**fields)
+
+
+# ==================== PAGINATION & EXPORTS ====================
+
+class KeysetPaginationTests(CoreTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for role in ('technician', 'fos', 'technician', 'fos', 'technician', 'retailer', 'fos'):
+            make_user(role)
+        cls.expected = list(User.objects.order_by('role', '-id').values_list('id', flat=True))
+
+    def walk(self, **kwargs):
+        page = keyset_paginate(User.objects.all(), ('role', '-id'), per_page=3, **kwargs)
+        return page, [user.pk for user in page]
+
+    def test_next_cursors_cover_every_row_once_in_order(self):
+        seen, cursor = [], None
+        while True:
+            page, ids = self.walk(cursor=cursor)
+            seen += ids
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.expected)
+
+    def test_previous_cursor_returns_the_earlier_page(self):
+        first, first_ids = self.walk()
+        second, _ = self.walk(cursor=first.next_cursor)
+        back, back_ids = self.walk(cursor=second.previous_cursor)
+        self.assertEqual(back_ids, first_ids)
+        self.assertFalse(back.has_previous)
+
+    def test_invalid_cursor_falls_back_to_the_first_page(self):
+        _, ids = self.walk(cursor='not-a-cursor')
+        self.assertEqual(ids, self.expected[:3])
+
+    def test_stream_csv_writes_the_header_then_each_row(self):
+        response = stream_csv('sales.csv', ['Retailer', 'Amount'], iter([('A, Ltd', 10), ('B', 2.5)]))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="sales.csv"')
+        self.assertEqual(b''.join(response.streaming_content).decode(), 'Retailer,Amount\r\n"A, Ltd",10\r\nB,2.5\r\n')
+
+
+class StockExportTests(CoreTestCase):
+    def test_sim_export_streams_the_holders_filtered_stock(self):
+        operator = Operator.objects.create(name='Airtel')
+        fos, other = make_user('fos', name='Fos One'), make_user('fos')
+        for serial, holder, status in (('S2', fos, 'available'), ('S1', fos, 'available'),
+                                       ('S3', fos, 'sold'), ('S4', other, 'available')):
+            SimStock.objects.create(serial_number=serial, operator=operator, current_holder=holder, status=status,
+                                    purchase_price=Decimal('10'), selling_price=Decimal('12'))
+        self.client.force_login(fos)
+        response = self.client.get(reverse('sim_stock_list'), {'export': 'csv', 'status': 'available'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['Operator', 'Serial', 'Status', 'Holder', 'Sold To', 'Sold Date', 'Created At'])
+        self.assertEqual([row[:4] for row in rows[1:]], [['Airtel', 'S1', 'available', 'Fos One'],
+                                                         ['Airtel', 'S2', 'available', 'Fos One']])
+
+
+# ==================== HIERARCHY ====================
+
+class UserHierarchyTests(CoreTestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supervisor = make_user('supervisor')
+            self.fos = make_user('fos', supervisor=self.supervisor)
+            self.retailer = make_user('retailer')
+            RetailerFosMap.objects.create(retailer=self.retailer, fos=self.fos)
+
+    def below(self, user):
+        return set(descendant_ids(user))
+
+    def test_retailers_sit_below_their_fos_and_its_supervisor(self):
+        self.assertEqual(self.below(self.supervisor), {self.fos.pk, self.retailer.pk})
+        self.assertEqual(self.below(self.fos), {self.retailer.pk})
+        self.assertEqual(UserHierarchy.objects.get(ancestor=self.supervisor, descendant=self.retailer).depth, 2)
+
+    def test_moving_a_fos_moves_its_retailers(self):
+        other = make_user('supervisor')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fos.supervisor = other
+            self.fos.save()
+        self.assertEqual(self.below(self.supervisor), set())
+        self.assertEqual(self.below(other), {self.fos.pk, self.retailer.pk})
+
+    def test_fos_links_and_removed_maps_are_followed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RetailerFosMap.objects.filter(retailer=self.retailer).delete()
+        self.assertEqual(self.below(self.fos), set())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.retailer.fos_links.add(self.fos)
+        self.assertEqual(self.below(self.supervisor), {self.fos.pk, self.retailer.pk})
+
+    def test_scope_to_user_limits_everyone_but_admins(self):
+        users = User.objects.all()
+        self.assertEqual(
+            set(scope_to_user(users, self.fos, 'id').values_list('id', flat=True)), {self.fos.pk, self.retailer.pk}
+        )
+        self.assertEqual(scope_to_user(users, make_user('admin'), 'id').count(), User.objects.count())
+
+
+# ==================== REQUEST SCOPE ====================
+
+class RequestScopeTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.supervisor = make_user('supervisor')
+            self.fos = make_user('fos', supervisor=self.supervisor)
+            self.technician = make_user('technician', supervisor=self.supervisor)
+            self.retailer = make_user('retailer')
+            RetailerFosMap.objects.create(retailer=self.retailer, fos=self.fos)
+        self.operator = Operator.objects.create(name='Jio')
+        FosOperatorMap.objects.create(fos=self.fos, operator=self.operator)
+
+    def test_supervisor_scope_follows_the_hierarchy(self):
+        scope = RequestScope(self.supervisor)
+        self.assertEqual(scope.fos_ids, [self.fos.pk])
+        self.assertEqual(scope.retailer_ids, [self.retailer.pk])
+        self.assertEqual(scope.technician_ids, [self.technician.pk])
+        self.assertEqual(scope.operator_ids, [self.operator.pk])
+
+    def test_answers_are_memoized_for_the_request(self):
+        scope = RequestScope(self.supervisor)
+        scope.retailer_ids, scope.operator_ids
+        with self.assertNumQueries(0):
+            scope.retailer_ids, scope.operator_ids
+
+    def test_retailers_deal_in_their_fos_operators(self):
+        self.assertEqual(RequestScope(self.retailer).operator_ids, [self.operator.pk])
+
+    def test_admin_lookup_is_cached_until_an_admin_changes(self):
+        admin = make_user('admin')
+        self.assertEqual(get_admin_user(), admin)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_admin_user(), admin)
+        admin.role = 'supervisor'
+        admin.save()
+        replacement = make_user('admin')
+        self.assertEqual(get_admin_user(), replacement)
+
+
+# ==================== SERIAL INGESTION ====================
+
+class SerialIngestTests(CoreTestCase):
+    def test_reads_the_first_csv_column_and_skips_headers_and_blanks(self):
+        upload = SimpleUploadedFile('lot.csv', b'\xef\xbb\xbfSerial Number,Note\nS001,new\n\n"S002",\n')
+        self.assertEqual(list(iter_serials('S000\n\n', upload)), ['S000', 'S001', 'S002'])
+
+    def test_repeats_in_the_list_are_dropped_and_reported(self):
+        report = SerialIngestReport()
+        self.assertEqual(dedupe_serials(['A', 'B', 'A', 'C', 'B'], report), ['A', 'B', 'C'])
+        self.assertEqual((report.total_read, report.batch_duplicate_count, report.batch_duplicates), (5, 2, ['A', 'B']))
+
+    def test_serials_already_in_stock_are_found_chunk_by_chunk(self):
+        operator = Operator.objects.create(name='Airtel')
+        report = SerialIngestReport()
+
+        def build(serial):
+            return SimStock(serial_number=serial, operator=operator, purchase_price=Decimal('10'), selling_price=Decimal('12'))
+
+        bulk_insert_serials(SimStock, ['S1', 'S2', 'S3'], build, report, chunk_size=2)
+        self.assertEqual(report.inserted, 3)
+        with self.assertNumQueries(3):
+            existing = find_existing_serials(SimStock, ['S0', 'S1', 'S3', 'S4', 'S5'], report, chunk_size=2)
+        self.assertEqual(existing, {'S1', 'S3'})
+        self.assertIn('2 already in stock (e.g. S1, S3)', report.duplicate_summary())
+
+
+class SerialRangeTests(CoreTestCase):
+    def test_ranges_expand_keeping_prefix_and_leading_zeros(self):
+        self.assertEqual(
+            list(expand_serial_ranges(['HS0098 - HS0101', 'AB-CD', 'X7'])),
+            ['HS0098', 'HS0099', 'HS0100', 'HS0101', 'AB-CD', 'X7'],
+        )
+
+    def test_mismatched_reversed_and_oversized_ranges_are_rejected(self):
+        for token, message in (('HS01-HX02', 'same prefix and length'), ('HS01-HS002', 'same prefix and length'),
+                               ('HS09-HS01', 'end is before start'), ('HS00-HS10', 'has 11 serials; the limit is 10')):
+            with self.subTest(token), self.assertRaisesMessage(SerialRangeError, message):
+                list(expand_serial_ranges([token], max_range=10))
+
+    def test_transfer_lists_are_deduped_and_capped(self):
+        serials, report = collect_transfer_serials('S1-S3\nS2\nS4')
+        self.assertEqual((serials, report.batch_duplicate_count), (['S1', 'S2', 'S3', 'S4'], 1))
+        with self.assertRaisesMessage(SerialRangeError, 'more than 200000 serials'):
+            collect_transfer_serials('S000000-S099999\nS100000-S199999\nS200000')
+
+    def test_find_holdings_only_matches_available_stock_of_the_holder(self):
+        operator = Operator.objects.create(name='Vi')
+        fos, other = make_user('fos'), make_user('fos')
+        stock = {}
+        for serial, holder, status in (('S1', fos, 'available'), ('S2', fos, 'sold'), ('S3', other, 'available')):
+            stock[serial] = SimStock.objects.create(serial_number=serial, operator=operator, current_holder=holder,
+                                                    status=status, purchase_price=Decimal('10'), selling_price=Decimal('12'))
+        ids, missing_count, missing = find_holdings(SimStock, ['S1', 'S2', 'S3', 'S4'], fos, chunk_size=2)
+        self.assertEqual((ids, missing_count, missing), ([stock['S1'].pk], 3, ['S2', 'S3', 'S4']))
+
+
+# ==================== PINCODE ROUTING ====================
+
+class PincodeRoutingTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        routing.invalidate_routing_table()
+        self.pincode = Pincode.objects.create(pincode='560001', area_name='MG Road', city='Bengaluru', state='KA')
+        self.zara = make_user('supervisor', name='Zara')
+
+    def assign(self, supervisor):
+        with self.captureOnCommitCallbacks(execute=True):
+            PincodeAssignment.objects.create(supervisor=supervisor, pincode=self.pincode)
+
+    def test_assignments_are_routed_in_supervisor_name_order(self):
+        self.assertIsNone(routing.route_supervisor_id('560001'))
+        self.assign(self.zara)
+        self.assertEqual(routing.route_supervisor_id(' 560001 '), self.zara.pk)
+        anil = make_user('supervisor', name='Anil')
+        self.assign(anil)
+        self.assertEqual(routing.supervisor_ids_for('560001'), [anil.pk, self.zara.pk])
+
+    def test_the_table_is_served_from_memory_between_changes(self):
+        self.assign(self.zara)
+        routing.get_routing_table()
+        with self.assertNumQueries(0):
+            self.assertTrue(routing.is_routable(560001))
+
+    @mock.patch.object(routing, 'ROUTING_RECHECK_SECONDS', 0)
+    def test_a_version_bump_from_another_process_triggers_a_rebuild(self):
+        routing.get_routing_table()
+        with self.captureOnCommitCallbacks(execute=False):
+            PincodeAssignment.objects.create(supervisor=self.zara, pincode=self.pincode)
+        self.assertFalse(routing.is_routable('560001'))
+        routing.ROUTING_VERSION.bump()
+        self.assertTrue(routing.is_routable('560001'))
+
+
+class PincodeImportTests(CoreTestCase):
+    def upload(self, text):
+        return SimpleUploadedFile('pincodes.csv', text.encode('utf-8-sig'))
+
+    def test_import_creates_new_rows_and_reports_bad_lines(self):
+        Pincode.objects.create(pincode='560001', area_name='MG Road', city='Bengaluru', state='KA')
+        report = import_pincodes(self.upload(
+            'PINCODE,Area  Name,City,State,Active\n'
+            '560001,Old Area,Bengaluru,KA,yes\n'
+            '560002,Shivajinagar,Bengaluru,KA,no\n'
+            '56A,Nowhere,Bengaluru,KA,\n'
+            '560003,,Bengaluru,KA,\n'
+            '560002,Again,Bengaluru,KA,\n'
+        ))
+        self.assertEqual((report.total_rows, report.created, report.unchanged), (5, 1, 1))
+        self.assertEqual(report.errors, [
+            'line 4: invalid pincode "56A"', 'line 5: 560003: area name required', 'line 6: 560002 repeated in the file',
+        ])
+        self.assertFalse(Pincode.objects.get(pincode='560002').is_active)
+        self.assertEqual(Pincode.objects.get(pincode='560001').area_name, 'MG Road')
+
+    def test_update_existing_only_touches_changed_rows(self):
+        Pincode.objects.create(pincode='560001', area_name='MG Road', city='Bengaluru', state='KA')
+        Pincode.objects.create(pincode='560002', area_name='Shivajinagar', city='Bengaluru', state='KA')
+        csv_text = 'Pincode,Area,City,State\n560001,MG Road,Bengaluru,KA\n560002,Shivaji Nagar,Bengaluru,KA\n'
+        report = import_pincodes(self.upload(csv_text), update_existing=True)
+        self.assertEqual((report.created, report.updated, report.unchanged), (0, 1, 1))
+        self.assertEqual(Pincode.objects.get(pincode='560002').area_name, 'Shivaji Nagar')
+
+    def test_assignment_is_all_or_nothing_on_conflicts(self):
+        first, second = make_user('supervisor'), make_user('supervisor')
+        for code in ('560001', '560002', '560003'):
+            Pincode.objects.create(pincode=code, area_name='Area', city='Bengaluru', state='KA')
+        ids, unknown = resolve_pincodes(['560001', ' 560002', '560001', '999999', ''])
+        self.assertEqual(unknown, ['999999'])
+        self.assertEqual(assign_pincodes(first, ids), (2, 0))
+        self.assertEqual(assign_pincodes(first, ids), (0, 2))
+        third = Pincode.objects.get(pincode='560003').pk
+        with self.assertRaises(PincodeConflictError) as caught:
+            assign_pincodes(second, ids + [third])
+        self.assertEqual(caught.exception.pincodes, ['560001', '560002'])
+        self.assertFalse(PincodeAssignment.objects.filter(supervisor=second).exists())
+
+
+# ==================== DISPATCH ====================
+
+class DispatchTests(CoreTestCase):
+    def setUp(self):
+        self.supervisor = make_user('supervisor')
+        self.asha = make_user('technician', name='Asha', supervisor=self.supervisor)
+        self.ravi = make_user('technician', name='Ravi', supervisor=self.supervisor)
+
+    def open_works(self):
+        return dict(TechnicianLoad.objects.values_list('technician__name', 'open_works'))
+
+    def test_busier_technicians_rank_lower(self):
+        make_work(supervisor=self.supervisor, assigned_technician=self.asha)
+        self.assertEqual(rank_technicians(make_work(supervisor=self.supervisor)), [self.ravi, self.asha])
+
+    def test_pincode_familiarity_breaks_an_even_load(self):
+        TechnicianPincodeStat.objects.create(technician=self.ravi, pincode='560002', works_count=4)
+        work = make_work(supervisor=self.supervisor, pincode='560002')
+        self.assertEqual(rank_technicians(work), [self.ravi, self.asha])
+        self.assertEqual(rank_technicians(make_work(supervisor=self.supervisor)), [self.asha, self.ravi])
+
+    def test_a_burst_is_spread_and_the_index_kept_current(self):
+        works = [make_work(supervisor=self.supervisor) for _ in range(3)]
+        taken = make_work(supervisor=self.supervisor, assigned_technician=self.ravi)
+        assignments = dispatch_works(WorkStb.objects.all())
+        self.assertEqual([work.pk for work, _ in assignments], [work.pk for work in works])
+        self.assertEqual(self.open_works(), {'Asha': 2, 'Ravi': 2})
+        self.assertEqual(WorkStb.objects.get(pk=taken.pk).assigned_technician, self.ravi)
+        self.assertEqual(dispatch_works(WorkStb.objects.all()), [])
+
+    def test_open_work_counts_never_go_negative(self):
+        adjust_open_works({self.asha.pk: 1})
+        adjust_open_works({self.asha.pk: -3, self.ravi.pk: 0})
+        self.assertEqual(self.open_works(), {'Asha': 0})
+
+
+# ==================== WORK INTAKE ====================
+
+class WorkIntakeTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        self.supervisor = make_user('supervisor')
+        pincode = Pincode.objects.create(pincode='560001', area_name='MG Road', city='Bengaluru', state='KA')
+        with self.captureOnCommitCallbacks(execute=True):
+            PincodeAssignment.objects.create(supervisor=self.supervisor, pincode=pincode)
+        routing.invalidate_routing_table()
+        Operator.objects.create(name='Tata Play')
+        TypeOfService.objects.create(name='New Installation')
+        WorkFromTheRole.objects.create(name='Operator')
+
+    def row(self, **fields):
+        return {'customer_name': 'Customer', 'address': '1 Main Road', 'pincode': '560001', 'mobile_no': '9800000000',
+                'operator': 'tata play', 'type_of_service': 'New Installation', 'work_from': 'Operator',
+                'amount': '250', **fields}
+
+    def test_valid_rows_are_routed_and_the_supervisor_told_once(self):
+        report = intake_works([self.row(amount='99.995'), self.row(work_deadline_time='31/12/2030')])
+        first, second = report.created
+        self.assertEqual((first.supervisor_id, first.kind, first.amount), (self.supervisor.pk, 'installation', Decimal('100.00')))
+        self.assertEqual(second.work_deadline_time.strftime('%Y-%m-%d %H:%M'), '2030-12-31 23:59')
+        self.assertEqual(WorkReport.objects.filter(work__in=report.created).count(), 2)
+        message = WhatsAppOutbox.objects.get(kind='work_summary')
+        self.assertEqual(message.mobile, self.supervisor.phone)
+        self.assertIn('2 new work(s)', message.message)
+
+    def test_bad_rows_are_reported_by_sheet_row(self):
+        rows = [self.row(), self.row(amount='100000000'), self.row(pincode='999999', operator='Nobody'), 'x']
+        report = intake_works(rows, first_row=SHEET_FIRST_ROW)
+        self.assertEqual((len(report.created), report.error_count), (1, 3))
+        self.assertEqual(report.errors, [
+            (3, 'amount must be below 100000000'),
+            (4, 'pincode 999999 is not assigned to a supervisor, unknown operator "Nobody"'),
+            (5, 'not an object'),
+        ])
+
+    def test_bulk_api_is_limited_to_admins_and_supervisors(self):
+        client = APIClient()
+        self.assertEqual(client.post('/api/works/bulk/', [self.row()], format='json').status_code, 401)
+        client.force_authenticate(make_user('technician'))
+        self.assertEqual(client.post('/api/works/bulk/', [self.row()], format='json').status_code, 403)
+        client.force_authenticate(self.supervisor)
+        response = client.post('/api/works/bulk/', {'works': [self.row(), self.row(mobile_no='')]}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['errors']), (1, [{'row': 2, 'error': 'mobile no is required'}]))
+        self.assertEqual(WorkStb.objects.get().created_by, self.supervisor)
+
+
+# ==================== WHATSAPP OUTBOX ====================
+
+class WhatsAppOutboxTests(CoreTestCase):
+    def setUp(self):
+        LocmemWhatsAppBackend.reset()
+
+    def statuses(self):
+        return list(WhatsAppOutbox.objects.order_by('id').values_list('status', flat=True))
+
+    def test_messages_to_one_number_go_out_together_but_otps_alone(self):
+        queue_whatsapp('9800000001', 'first')
+        queue_whatsapp('9800000001', 'second')
+        queue_whatsapp('9800000001', 'Your OTP is 1234', kind='otp')
+        queue_whatsapp('9800000002', 'other')
+        self.assertEqual(drain_outbox(), {'claimed': 4, 'sent': 4, 'retrying': 0, 'failed': 0})
+        self.assertCountEqual(LocmemWhatsAppBackend.sent, [
+            ('9800000001', f'first{MESSAGE_SEPARATOR}second'),
+            ('9800000001', 'Your OTP is 1234'),
+            ('9800000002', 'other'),
+        ])
+        first, second = WhatsAppOutbox.objects.filter(kind='general', mobile='9800000001').order_by('id')
+        self.assertEqual(second.sent_with, first)
+
+    def test_a_newer_message_with_the_same_key_supersedes_the_queued_one(self):
+        queue_whatsapp('9800000001', 'Work 7 assigned', coalesce_key='work:7')
+        queue_whatsapp('9800000001', 'Work 7 reassigned', coalesce_key='work:7')
+        drain_outbox()
+        self.assertEqual(self.statuses(), ['superseded', 'sent'])
+        self.assertEqual(LocmemWhatsAppBackend.sent, [('9800000001', 'Work 7 reassigned')])
+
+    def test_failed_sends_back_off_then_give_up(self):
+        queue_whatsapp('9800000001', 'hello')
+        LocmemWhatsAppBackend.fail_next = 1
+        self.assertEqual(drain_outbox()['retrying'], 1)
+        outbox = WhatsAppOutbox.objects.get()
+        self.assertEqual((outbox.status, outbox.attempts), ('queued', 1))
+        self.assertGreater(outbox.next_attempt_at, timezone.now())
+        self.assertEqual(drain_outbox()['claimed'], 0)
+
+        WhatsAppOutbox.objects.update(next_attempt_at=timezone.now(), attempts=WHATSAPP_MAX_ATTEMPTS - 1)
+        LocmemWhatsAppBackend.fail_next = 1
+        with self.assertLogs('core.notifications', 'WARNING'):
+            self.assertEqual(drain_outbox()['failed'], 1)
+        self.assertEqual(WhatsAppOutbox.objects.get().last_error, 'simulated gateway failure')
+
+    def test_claimed_rows_are_left_alone_until_the_claim_goes_stale(self):
+        queue_whatsapp('9800000001', 'hello')
+        WhatsAppOutbox.objects.update(status='sending', claim_token='other-worker', claimed_at=timezone.now())
+        self.assertEqual(drain_outbox()['claimed'], 0)
+        WhatsAppOutbox.objects.update(claimed_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(drain_outbox()['sent'], 1)
+
+
+# ==================== WHATSAPP GATEWAY ====================
+
+class GatewayClientTests(CoreTestCase):
+    def setUp(self):
+        self.fake = FakeGatewayServer().start()
+        self.addCleanup(self.fake.stop)
+
+    def test_calls_are_sent_and_timed(self):
+        metrics = LatencyHistogram()
+        client = GatewayClient(self.fake.url, metrics=metrics)
+        self.addCleanup(client.close)
+        self.fake.fail_next = 1
+        self.assertEqual([client.get({'n': n}).status_code for n in '12'], [503, 200])
+        self.assertEqual(self.fake.requests, [{'n': '1'}, {'n': '2'}])
+        snapshot = metrics.snapshot()
+        self.assertEqual((snapshot['requests'], snapshot['statuses']), (2, {503: 1, 200: 1}))
+
+    @mock.patch.object(notifications, 'WHATSAPP_API_TOKEN', 'token')
+    def test_the_backend_sorts_gateway_failures_into_retryable_or_not(self):
+        with override_settings(WHATSAPP_API_URL=self.fake.url):
+            backend = WhatsbotBackend()
+            backend.send('9800000001', 'hello')
+            self.assertEqual(self.fake.requests[0], {'api_token': 'token', 'mobile': '919800000001', 'message': 'hello'})
+            self.fake.fail_next = 1
+            with self.assertRaises(WhatsAppSendError) as caught:
+                backend.send('9800000001', 'hello')
+            self.assertTrue(caught.exception.retryable)
+        fake = FakeGatewayServer(fail_status=400).start()
+        self.addCleanup(fake.stop)
+        fake.fail_next = 1
+        with override_settings(WHATSAPP_API_URL=fake.url), self.assertRaises(WhatsAppSendError) as caught:
+            WhatsbotBackend().send('9800000001', 'hello')
+        self.assertFalse(caught.exception.retryable)
+
+    def test_histogram_percentiles_are_bucket_upper_bounds(self):
+        histogram = LatencyHistogram(buckets=(10, 100))
+        for elapsed_ms in (3, 4, 50, 400):
+            histogram.observe(elapsed_ms)
+        self.assertEqual((histogram.percentile(0.5), histogram.percentile(0.75), histogram.percentile(1)), (10.0, 100.0, 400))
+
+
+# ==================== CLOSING OTPS ====================
+
+class WorkOtpTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        self.work = make_work(wp_no='9811111111')
+
+    def age_otps(self, **delta):
+        WorkOtp.objects.update(created_at=timezone.now() - timedelta(**delta))
+
+    @mock.patch('core.otp.generate_code', side_effect=['111111', '222222'])
+    def test_issuing_queues_the_code_and_supersedes_the_previous_one(self, generate_code):
+        first = issue_otp(self.work)
+        self.age_otps(minutes=2)
+        second = issue_otp(self.work)
+        self.assertEqual(WorkOtp.objects.get(pk=first.pk).status, 'superseded')
+        self.assertEqual(WorkStb.objects.get(pk=self.work.pk).closing_otp, second.code)
+        outbox = WhatsAppOutbox.objects.get(status='queued')
+        self.assertEqual((outbox.mobile, outbox.kind), ('9811111111', 'otp'))
+        self.assertIn(second.code, outbox.message)
+        with self.assertRaisesMessage(OtpError, 'Invalid OTP'):
+            verify_otp(self.work, first.code)
+
+    def test_resends_wait_for_the_cooldown_and_the_hourly_cap(self):
+        issue_otp(self.work)
+        with self.assertRaisesMessage(OtpError, 'Please wait'):
+            issue_otp(self.work)
+        for _ in range(OTP_MAX_PER_HOUR - 1):
+            self.age_otps(minutes=2)
+            issue_otp(self.work)
+        self.age_otps(minutes=2)
+        with self.assertRaisesMessage(OtpError, f'OTP limit reached ({OTP_MAX_PER_HOUR} per hour)'):
+            issue_otp(self.work)
+
+    def test_a_code_is_used_once(self):
+        otp = issue_otp(self.work)
+        self.assertEqual(verify_otp(self.work, f' {otp.code} '), otp)
+        self.assertEqual(WorkOtp.objects.get().status, 'used')
+        with self.assertRaisesMessage(OtpError, 'OTP not generated yet'):
+            verify_otp(self.work, otp.code)
+
+    def test_too_many_wrong_codes_lock_the_otp(self):
+        otp = issue_otp(self.work)
+        for _ in range(OTP_MAX_FAILED_ATTEMPTS):
+            with self.assertRaisesMessage(OtpError, 'Invalid OTP'):
+                verify_otp(self.work, 'wrong')
+        with self.assertRaisesMessage(OtpError, 'Too many wrong attempts'):
+            verify_otp(self.work, otp.code)
+        self.assertEqual(WorkOtp.objects.get().status, 'locked')
+
+    def test_sweep_expires_stale_codes_and_drops_old_history(self):
+        issue_otp(self.work)
+        self.assertEqual(sweep_otps(), (0, 0))
+        later = timezone.now() + timedelta(days=2)
+        self.assertEqual(sweep_otps(later), (1, 0))
+        self.assertEqual(sweep_otps(later + OTP_RETENTION), (0, 1))
+
+
+# ==================== USER SEARCH ====================
+
+class UserSearchTests(CoreTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.anita = make_user('fos', name='  Anita   Rao ', phone='9876543210', email='anita@shop.in')
+        cls.anil = make_user('technician', name='Anil Kumar', phone='9123456789', email='kumar@shop.in')
+
+    def search(self, query):
+        return set(User.objects.filter(user_search_filter(query)).values_list('name', flat=True))
+
+    def test_phone_queries_match_the_number_prefix_with_or_without_the_country_code(self):
+        self.assertEqual(self.search('98765'), {'  Anita   Rao '})
+        self.assertEqual(self.search('+91 98765-43'), {'  Anita   Rao '})
+        self.assertEqual(self.search('91234'), {'Anil Kumar'})
+
+    def test_text_queries_match_name_or_email_prefixes(self):
+        self.assertEqual(self.search('anita  r'), {'  Anita   Rao '})
+        self.assertEqual(self.search('KUMAR'), {'Anil Kumar'})
+        self.assertEqual(self.search('an'), {'  Anita   Rao ', 'Anil Kumar'})
+        self.assertEqual(self.search('rao'), set())
+        self.assertIsNone(user_search_filter('  '))
+
+    def test_the_user_list_pages_search_results_by_cursor(self):
+        for _ in range(30):
+            make_user('technician', name='Anil')
+        self.client.force_login(make_user('admin'))
+        response = self.client.get(reverse('user_list'), {'search': 'anil'})
+        page = response.context['page_obj']
+        self.assertEqual(len(page), 25)
+        response = self.client.get(reverse('user_list'), {'search': 'anil', 'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 6)
+        self.assertFalse(response.context['page_obj'].has_next)
+
+
+# ==================== STOCK SUMMARY ====================
+
+class StockHoldingTests(CoreTestCase):
+    def setUp(self):
+        self.operator = Operator.objects.create(name='Jio')
+        self.fos, self.retailer = make_user('fos'), make_user('retailer')
+
+    def sim(self, serial, holder):
+        return SimStock.objects.create(serial_number=serial, operator=self.operator, current_holder=holder,
+                                       purchase_price=Decimal('10'), selling_price=Decimal('12'))
+
+    def summary(self, holder=None):
+        return [(row['total'], row['available'], row['sold']) for row in operator_summary(SIM, holder)]
+
+    def holdings(self):
+        return sorted(StockHolding.objects.values_list('holder_id', 'total', 'available', 'sold'), key=str)
+
+    def test_saves_and_deletes_move_the_counters(self):
+        sims = [self.sim(f'S{n}', self.fos) for n in range(3)]
+        sims[0].current_holder = self.retailer
+        sims[0].save()
+        sims[0].status = 'sold'
+        sims[0].save()
+        sims[1].delete()
+        self.assertEqual(self.summary(self.fos), [(1, 1, 0)])
+        self.assertEqual(self.summary(self.retailer), [(1, 0, 1)])
+        self.assertEqual(self.summary(), [(2, 1, 1)])
+
+        counted = self.holdings()
+        rebuild_stock_summary()
+        self.assertEqual(self.holdings(), counted)
+
+    def test_unheld_stock_is_counted_on_a_single_row(self):
+        add_purchased_stock(SIM, None, self.operator.pk, 5)
+        add_purchased_stock(SIM, None, self.operator.pk, 2)
+        add_purchased_stock(SIM, self.fos.pk, self.operator.pk, 0)
+        self.assertEqual(self.holdings(), [(None, 7, 7, 0)])
+
+
+# ==================== WORKS API ====================
+
+class WorkApiListTests(CoreTestCase):
+    def setUp(self):
+        self.technician = make_user('technician')
+        self.client = APIClient()
+        self.client.force_authenticate(self.technician)
+
+    def ids(self, **params):
+        response = self.client.get('/api/works/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [row['id'] for row in response.data['results']]
+
+    def test_filters_combine(self):
+        pending = make_work(assigned_technician=self.technician)
+        closed = make_work(assigned_technician=self.technician, status='Closed')
+        make_work(status='Closed')
+        self.assertEqual(self.ids(assigned_technician=self.technician.pk), [closed.pk, pending.pk])
+        self.assertEqual(self.ids(assigned_technician=self.technician.pk, status='Pending, Expired'), [pending.pk])
+
+        WorkStb.objects.filter(pk=pending.pk).update(updated_at=timezone.now() - timedelta(days=2))
+        since = (timezone.now() - timedelta(days=1)).replace(tzinfo=None).isoformat()
+        self.assertEqual(self.ids(assigned_technician=self.technician.pk, updated_since=since), [closed.pk])
+
+    def test_bad_filters_are_rejected(self):
+        for params in ({'updated_since': 'yesterday'}, {'updated_since': '2024-02-30T00:00:00'},
+                       {'assigned_technician': 'me'}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get('/api/works/', params).status_code, 400)
+
+    def test_a_page_is_one_query_and_cursors_continue_it(self):
+        works = [make_work() for _ in range(3)]
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/works/', {'page_size': 2})
+        self.assertEqual([row['id'] for row in response.data['results']], [works[2].pk, works[1].pk])
+        self.assertEqual([row['id'] for row in self.client.get(response.data['next']).data['results']], [works[0].pk])
+
+
+class WorkReportApiListTests(CoreTestCase):
+    def setUp(self):
+        self.supervisor, self.technician = make_user('supervisor'), make_user('technician')
+        self.client = APIClient()
+        self.client.force_authenticate(self.technician)
+
+    def work_ids(self, **params):
+        response = self.client.get('/api/workreports/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [WorkReport.objects.get(pk=row['id']).work_id for row in response.data['results']]
+
+    def test_filters_and_search_match_ids_on_the_work(self):
+        mine = make_work(assigned_technician=self.technician)
+        supervised = make_work(supervisor=self.supervisor)
+        walk_in = make_work(work_from=WorkFromTheRole.objects.create(pk=900, name='Walk-in'))
+        self.assertEqual(self.work_ids(assigned_technician=self.technician.pk), [mine.pk])
+        self.assertEqual(self.work_ids(supervisor=self.supervisor.pk, operator=supervised.operator_id), [supervised.pk])
+        self.assertEqual(self.work_ids(search=900), [walk_in.pk])
+        self.assertEqual(self.client.get('/api/workreports/', {'search': 'Ravi'}).status_code, 400)
+
+    def test_a_page_costs_the_same_queries_for_more_reports(self):
+        def page_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/workreports/')
+            return len(queries)
+
+        make_work(assigned_technician=self.technician, supervisor=self.supervisor)
+        few = page_queries()
+        for _ in range(4):
+            make_work(assigned_technician=self.technician, supervisor=self.supervisor)
+        self.assertEqual(page_queries(), few)
+
+
+# ==================== DELTA SYNC ====================
+
+@mock.patch.object(sync, 'SYNC_SETTLE', timedelta(0))
+class DeltaSyncTests(CoreTestCase):
+    def setUp(self):
+        self.technician = make_user('technician')
+
+    def sync(self, token=None, user_id=None, **kwargs):
+        payload = build_sync(['works'], token=token, user_id=user_id or self.technician.pk, **kwargs)
+        works = payload['works']
+        return payload['token'], [row['id'] for row in works['changed']], works['deleted'], payload['has_more']
+
+    def test_only_changes_since_the_token_are_sent(self):
+        work = make_work(assigned_technician=self.technician)
+        make_work()
+        token, changed, _, _ = self.sync()
+        self.assertEqual(changed, [work.pk])
+        self.assertEqual(self.sync(token)[1], [])
+        work.remark = 'Customer asked for evening visit'
+        work.save()
+        self.assertEqual(self.sync(token)[1], [work.pk])
+
+    def test_deleted_and_reassigned_works_leave_the_device(self):
+        kept, moved, gone = (make_work(assigned_technician=self.technician) for _ in range(3))
+        token = self.sync()[0]
+        moved.assigned_technician = make_user('technician')
+        moved.save()
+        gone_pk = gone.pk
+        gone.delete()
+        token, changed, deleted, _ = self.sync(token)
+        self.assertEqual((changed, sorted(deleted)), ([], sorted([moved.pk, gone_pk])))
+        self.assertEqual(self.sync(user_id=moved.assigned_technician_id)[1], [moved.pk])
+
+    def test_pages_continue_from_the_token(self):
+        works = [make_work(assigned_technician=self.technician) for _ in range(3)]
+        token, changed, _, has_more = self.sync(page_size=2)
+        self.assertEqual((changed, has_more), ([works[0].pk, works[1].pk], True))
+        self.assertEqual(self.sync(token, page_size=2)[1:], ([works[2].pk], [], False))
+
+    def test_tokens_are_bound_to_their_scope_and_expire(self):
+        token = self.sync()[0]
+        with self.assertRaisesMessage(SyncTokenError, 'issued for another assigned_technician'):
+            build_sync(['works'], token=token, user_id=None)
+        with self.assertRaisesMessage(SyncTokenError, 'Invalid sync token'):
+            build_sync(['works'], token='garbage', user_id=self.technician.pk)
+        old = (timezone.now() - timedelta(days=31)).isoformat()
+        expired = encode_token({'works': {'c': [old, 0], 't': [old, 0]}}, self.technician.pk)
+        with self.assertRaises(SyncTokenExpired):
+            build_sync(['works'], token=expired, user_id=self.technician.pk)
+
+    def test_the_endpoint_answers_304_while_nothing_changes(self):
+        make_work(assigned_technician=self.technician)
+        client = APIClient()
+        client.force_authenticate(self.technician)
+        params = {'resources': 'works', 'assigned_technician': self.technician.pk}
+        response = client.get('/api/sync/', params)
+        again = client.get('/api/sync/', {**params, 'since': response.data['token']})
+        repeat = client.get('/api/sync/', {**params, 'since': response.data['token']}, HTTP_IF_NONE_MATCH=again['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(client.get('/api/sync/', {**params, 'since': 'garbage'}).status_code, 400)
+
+
+# ==================== MASTER DATA ====================
+
+class MasterDataTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_master_data()
+        Operator.objects.create(name='Airtel')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('technician'))
+
+    def test_a_matching_etag_gets_a_304_without_queries(self):
+        response = self.client.get('/api/master-data/')
+        self.assertEqual([row['name'] for row in response.json()['operators']], ['Airtel'])
+        with self.assertNumQueries(0):
+            again = self.client.get('/api/master-data/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual((again.status_code, again.content, again['ETag']), (304, b'', response['ETag']))
+
+    def test_the_body_is_served_gzipped_when_accepted(self):
+        response = self.client.get('/api/master-data/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content))['operators'][0]['name'], 'Airtel')
+
+    def test_a_master_write_changes_the_etag(self):
+        etag = self.client.get('/api/master-data/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Operator.objects.create(name='Jio')
+        response = self.client.get('/api/master-data/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.json()['operators']], ['Airtel', 'Jio'])
+
+
+# ==================== API LOGIN ====================
+
+class ApiLoginTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_login_cache()
+        self.user = make_user('technician', phone='98765 43210', email='tech@example.com')
+        self.client = APIClient()
+
+    def login(self, identifier, password='secret'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/login/', {'identifier': identifier, 'password': password}, format='json')
+
+    def test_plaintext_passwords_are_upgraded_on_login(self):
+        response = self.login(' 98765 43210 ')
+        self.assertEqual((response.status_code, response.data['id'], response.data['role']), (200, self.user.pk, 'technician'))
+        self.assertNotIn('password', response.data)
+        self.user.refresh_from_db()
+        self.assertTrue(is_password_hashed(self.user.password))
+        self.assertEqual(self.login('tech@example.com').status_code, 200)
+
+    def test_bad_credentials_and_inactive_accounts_are_refused(self):
+        self.assertEqual(self.login('98765 43210', 'wrong').status_code, 401)
+        self.assertEqual(self.login('9876543210').status_code, 401)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_login_cache()
+        self.assertEqual(self.login('98765 43210').status_code, 401)
+
+    def test_repeat_logins_are_answered_from_the_cache(self):
+        self.login('98765 43210')
+        self.login('98765 43210')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.login('98765 43210').status_code, 200)
+
+    def test_the_access_token_carries_the_role(self):
+        access = self.login('98765 43210').data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/works/').status_code, 200)
+        self.assertEqual(self.client.post('/api/works/bulk/', [{}], format='json').status_code, 403)
+
+
+# ==================== CACHING ====================
+
+class CacheNamespaceTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_clearing_a_versioned_namespace_hides_all_its_keys(self):
+        namespace = CacheNamespace('test_ns', versioned=True)
+        other = CacheNamespace('test_other', versioned=True)
+        namespace.set('a', 1)
+        other.set('a', 2)
+        self.assertEqual(namespace.get_many(['a', 'b']), {'a': 1})
+        namespace.clear()
+        self.assertIsNone(namespace.get('a'))
+        self.assertEqual(other.get('a'), 2)
+
+    def test_counters_start_at_one(self):
+        namespace = CacheNamespace('test_counters')
+        self.assertEqual([namespace.incr('hits') for _ in range(3)], [1, 2, 3])
+        with self.assertRaisesMessage(TypeError, 'not versioned'):
+            namespace.clear()
+
+    def test_an_evicted_version_never_comes_back_as_an_old_value(self):
+        first, second = SharedVersion('test_a'), SharedVersion('test_b')
+        before = first.get()
+        first.bump()
+        self.assertEqual(get_versions([first, second]), [before + 1, second.get()])
+        caches[SHARED_CACHE].delete(first.key)
+        self.assertGreater(first.get(), before + 1)
+
+
+# ==================== VIEW CACHE ====================
+
+class ViewCacheTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = make_user('admin')
+        self.client.force_login(self.admin)
+
+    def get(self):
+        response = self.client.get(reverse('operator_list'))
+        return response['X-View-Cache'], response
+
+    def test_pages_are_served_again_until_a_tagged_model_changes(self):
+        self.assertEqual(self.get()[0], 'miss')
+        self.assertEqual(self.get()[0], 'hit')
+        with self.captureOnCommitCallbacks(execute=True):
+            Operator.objects.create(name='BSNL')
+        outcome, response = self.get()
+        self.assertEqual(outcome, 'miss')
+        self.assertContains(response, 'BSNL')
+
+    def test_saving_the_user_drops_their_pages(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.name = 'Renamed Admin'
+            self.admin.save()
+        self.assertEqual(self.get()[0], 'miss')
+
+    def test_each_session_gets_its_own_entry(self):
+        self.get()
+        self.client.logout()
+        self.client.force_login(self.admin)
+        self.assertEqual(self.get()[0], 'miss')
+
+    def test_unknown_tags_are_refused(self):
+        with self.assertRaisesMessage(ValueError, 'Unknown view cache tags: nope'):
+            cache_view('nope')
+
+
+# ==================== WARMUP ====================
+
+class WarmupTests(CoreTestCase):
+    def setUp(self):
+        cache.clear()
+        routing.invalidate_routing_table()
+        invalidate_master_data()
+
+    def test_warmup_builds_the_process_tables(self):
+        with self.assertLogs('core.warmup', 'INFO'):
+            self.assertTrue(warm_up())
+        with self.assertNumQueries(0):
+            routing.get_routing_table()
+            get_master_bundle()
+
+    @mock.patch('core.routing.get_routing_table', side_effect=OperationalError('gone away'))
+    def test_a_database_error_is_logged_not_raised(self, get_routing_table):
+        with self.assertLogs('core.warmup', 'ERROR') as logs:
+            self.assertFalse(warm_up())
+        self.assertIn('Warmup failed', logs.output[0])
+
+
+# ==================== QUERY BUDGETS ====================
+
+@query_budget(1)
+def three_query_view(request):
+    for _ in range(3):
+        User.objects.exists()
+    return HttpResponse('ok')
+
+
+class QueryBudgetTests(CoreTestCase):
+    def get(self, view):
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            return view(request)
+
+        middleware = QueryInspectorMiddleware(get_response)
+        return middleware(RequestFactory().get('/budget/'))
+
+    def test_over_budget_fails_in_strict_mode(self):
+        with self.assertLogs('core.queries', 'WARNING'), \
+                self.assertRaisesMessage(QueryBudgetExceeded, 'ran 3 queries (budget 1)'):
+            self.get(three_query_view)
+
+    @override_settings(QUERY_BUDGET_RAISE=False)
+    def test_over_budget_is_logged_otherwise(self):
+        with self.assertLogs('core.queries', 'WARNING') as logs:
+            response = self.get(three_query_view)
+        self.assertEqual(response.status_code, 200)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['queries'], record['budget'], record['over_budget']), (3, 1, True))
+
+    def test_settings_budgets_are_read_per_call(self):
+        with override_settings(QUERY_BUDGETS={'work_list': 30}, QUERY_BUDGET_DEFAULT=50):
+            self.assertEqual(budget_for(HttpResponse, 'core.views.work_list', 'work_list'), 30)
+            self.assertEqual(budget_for(HttpResponse, 'core.views.dashboard', 'dashboard'), 50)
+        self.assertIsNone(budget_for(HttpResponse, 'core.views.dashboard', 'dashboard'))
+
+
+# ==================== BENCHMARKS ====================
+
+class BenchmarkBaselineTests(CoreTransactionTestCase):
+    def test_query_counts_match_the_stored_baseline(self):
+        baseline = load_baselines().get('small', {}).get(baseline_key())
+        if not baseline:
+            self.skipTest(f'no small/{baseline_key()} baseline stored')
+        # The benchmark reports over-budget pages in its table instead of failing on them
+        with override_settings(QUERY_BUDGET_RAISE=False):
+            results = run_benchmarks(seed_benchmark_data('small'), repeats=1)
+        # Timings on a test runner are noise; only the query counts are held to the baseline
+        self.assertEqual(compare(results, baseline, slack_ms=float('inf')), {})
+
+    def test_compare_flags_more_queries_and_slower_pages(self):
+        baseline = {'dashboard': {'queries': 23, 'ms': 10.0}, 'work_close': {'queries': 17, 'ms': 20.0}}
+        results = {
+            'dashboard': {'queries': 24, 'ms': 10.0},
+            'work_close': {'queries': 17, 'ms': 60.0},
+            'stock_overview': {'queries': 39, 'ms': 30.0},
+        }
+        regressions = compare(results, baseline, tolerance=1.5, slack_ms=25)
+        self.assertEqual(regressions, {
+            'dashboard': ['24 queries, baseline 23'],
+            'work_close': ['60.0ms, limit 55.0ms (baseline 20.0ms)'],
+        })
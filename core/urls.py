@@ -39,6 +39,8 @@ urlpatterns = [
     path("works/<int:pk>/cancel/", views.work_cancel, name="work_cancel"),
 
     # Work Assignment & OTP URLs
+    path("works/import/", views.work_import, name="work_import"),
+    path("works/auto-dispatch/", views.work_auto_dispatch, name="work_auto_dispatch"),
     path("works/<int:pk>/assign/", views.work_assign, name="work_assign"),
     path("works/<int:pk>/reassign/", views.work_reassign, name="work_reassign"),
     path("works/<int:pk>/send-otp/", views.work_send_otp, name="work_send_otp"),
@@ -77,6 +79,7 @@ urlpatterns = [
     # Pincode Master pages
     path("pincodes/", views.pincode_list, name="pincode_list"),
     path("pincodes/add/", views.pincode_add, name="pincode_add"),
+    path("pincodes/import/", views.pincode_import, name="pincode_import"),
     path("pincodes/<int:pk>/edit/", views.pincode_edit, name="pincode_edit"),
     path("pincodes/<int:pk>/delete/", views.pincode_delete, name="pincode_delete"),
     
@@ -3,8 +3,10 @@ from .views_api import (
     CollectionTransferActionView,
     CollectionTransferListCreateView,
     LoginView,
+    MasterDataView,
     OperatorViewSet,
     RegisterView,
+    SyncView,
     TypeOfServiceViewSet,
     UserListCreateView,
     UserRetrieveUpdateDestroyView,
@@ -19,6 +21,7 @@ from .views_api import (
 )
 
 from django.urls import path
+from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
 
@@ -30,6 +33,7 @@ urlpatterns = [
 
     path("users/register/", RegisterView.as_view(), name="register"),
     path("users/login/", LoginView.as_view(), name="login"),
+    path("token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
     path("users/", UserListCreateView.as_view(), name="user-list"),
     path("users/<int:pk>/", UserRetrieveUpdateDestroyView.as_view(), name="user-detail"),
 
@@ -37,6 +41,9 @@ urlpatterns = [
     path("collection-transfers/<int:pk>/action/", CollectionTransferActionView.as_view(), name="transfer-action"),
 
 
+    path("sync/", SyncView.as_view(), name="sync"),
+    path("master-data/", MasterDataView.as_view(), name="master-data"),
+
     path("workreports/", WorkReportListCreateView.as_view(), name="workreport-list"),
     path("workreports/<int:pk>/", WorkReportRetrieveUpdateDestroyView.as_view(), name="workreport-detail"),
 
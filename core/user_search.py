@@ -0,0 +1,43 @@
+"""
+Index-backed user search
+
+``icontains`` compiles to ``LIKE '%term%'``, which no index can answer, so
+every keystroke in the user list scanned the whole users table. Search here
+is by prefix only, which the database answers with a range scan:
+
+* digits (spaces, dashes and a leading ``+`` ignored) match the start of the
+  phone number, with or without the country code;
+* anything containing ``@`` matches the start of the email;
+* other text matches the start of the name (through the normalised,
+  indexed ``User.search_name``) or of the email.
+"""
+import re
+
+from django.db.models import Q
+
+COUNTRY_CODE = '91'
+_PHONE_QUERY_RE = re.compile(r'^\+?[\d\s-]+$')
+
+
+def normalize_name(name):
+    """Lowercase ``name`` and collapse runs of whitespace, as stored in User.search_name"""
+    return ' '.join((name or '').split()).lower()[:100]
+
+
+def user_search_filter(query):
+    """Q object matching users whose phone, email or name starts with ``query`` (None if blank)"""
+    query = (query or '').strip()
+    if not query:
+        return None
+
+    if _PHONE_QUERY_RE.match(query):
+        digits = re.sub(r'\D', '', query)
+        condition = Q(phone__startswith=digits)
+        if digits.startswith(COUNTRY_CODE) and (query.startswith('+') or len(digits) > 10):
+            condition |= Q(phone__startswith=digits[len(COUNTRY_CODE):])
+        return condition
+
+    if '@' in query:
+        return Q(email__istartswith=query)
+
+    return Q(search_name__startswith=normalize_name(query)) | Q(email__istartswith=query)
@@ -0,0 +1,114 @@
+"""
+Server-side cache for near-static GET pages
+
+``@cache_view('products')`` stores the rendered response of a list page and
+serves it again until one of its tags is invalidated or VIEW_CACHE_TIMEOUT
+passes. Each tag names the models the page shows (VIEW_CACHE_TAGS); the
+model signals bump the tag's version after commit, and since the versions
+are part of the cache key, stale pages are simply never looked up again.
+
+Pages extending admin_dashboard.html carry the user's name, wallet and CSRF
+token, so the default ``scope='user'`` keys entries by session and adds a
+per-user tag that changes whenever that user is saved. ``scope='role'``
+shares one entry per role and is only for pages with no per-user content.
+
+Pages are kept in the per-process ``local`` tier by default; tag versions
+and counters live in the shared tier so every worker sees them.
+
+Only successful GET/HEAD responses are cached, and never while flash
+messages are pending. Hits and misses are counted per view
+(``view_cache_stats()``) and reported in the X-View-Cache header.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+
+from .caching import LOCAL_CACHE, CacheNamespace, SharedVersion, get_versions
+
+VIEW_CACHE_ALIAS = getattr(settings, 'VIEW_CACHE_ALIAS', LOCAL_CACHE)
+VIEW_CACHE_TIMEOUT = getattr(settings, 'VIEW_CACHE_TIMEOUT', 60 * 5)
+
+# tag -> core models whose writes invalidate it
+VIEW_CACHE_TAGS = {
+    'products': ('Product', 'Operator'),
+    'operators': ('Operator',),
+    'handset_types': ('HandsetType', 'Operator'),
+    'sim_prices': ('SimOperatorPrice', 'Operator'),
+    'pincodes': ('Pincode',),
+}
+
+page_cache = CacheNamespace('view_cache:page', alias=VIEW_CACHE_ALIAS, timeout=VIEW_CACHE_TIMEOUT)
+stats_cache = CacheNamespace('view_cache:stats', timeout=None)
+
+_cached_views = set()
+
+
+def _tag_version(tag):
+    return SharedVersion(f'view_cache:tag:{tag}')
+
+
+def user_tag(user_id):
+    return f'user:{user_id}'
+
+
+def invalidate_view_tag(tag):
+    """Make every cached page carrying ``tag`` unreachable"""
+    _tag_version(tag).bump()
+
+
+def view_cache_stats():
+    """{view name: {'hit': n, 'miss': n}} for the cached views loaded in this process"""
+    counts = stats_cache.get_many([f'{name}:{outcome}' for name in _cached_views for outcome in ('hit', 'miss')])
+    return {
+        name: {outcome: counts.get(f'{name}:{outcome}', 0) for outcome in ('hit', 'miss')}
+        for name in _cached_views
+    }
+
+
+def cache_view(*tags, scope='user', timeout=None):
+    """Cache a GET view's response under ``tags`` (keys of VIEW_CACHE_TAGS)"""
+    unknown = [tag for tag in tags if tag not in VIEW_CACHE_TAGS]
+    if unknown:
+        raise ValueError(f'Unknown view cache tags: {", ".join(unknown)}')
+    if scope not in ('user', 'role'):
+        raise ValueError(f'Unknown view cache scope: {scope}')
+
+    def decorator(view):
+        view_name = f'{view.__module__}.{view.__name__}'
+        _cached_views.add(view_name)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            if scope == 'user':
+                if not request.session.session_key:
+                    return view(request, *args, **kwargs)
+                owner = request.session.session_key
+                key_tags = [*tags, user_tag(request.user.pk)]
+            else:
+                owner = getattr(request.user, 'role', '') or ''
+                key_tags = list(tags)
+            versions = get_versions([_tag_version(tag) for tag in key_tags])
+            raw_key = '|'.join([view_name, owner, request.get_full_path(), *map(str, versions)])
+            key = hashlib.sha1(raw_key.encode()).hexdigest()
+
+            response = page_cache.get(key)
+            if response is not None:
+                stats_cache.incr(f'{view_name}:hit')
+                response['X-View-Cache'] = 'hit'
+                return response
+
+            stats_cache.incr(f'{view_name}:miss')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                page_cache.set(key, response, VIEW_CACHE_TIMEOUT if timeout is None else timeout)
+            response['X-View-Cache'] = 'miss'
+            return response
+
+        return wrapper
+
+    return decorator
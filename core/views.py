@@ -34,10 +34,20 @@ from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from django.db.models import Sum, ExpressionWrapper, F, FloatField, Q
 from django.forms import modelform_factory
 from .forms import StockTransferToSupervisorForm, StockTransferToTechnicianForm, WorkForm, WorkCloseForm
-from .models import WorkStb, WorkReport, TypeOfService, WorkFromTheRole
+from .models import WorkStb, WorkReport, WorkOtp, TypeOfService, WorkFromTheRole
+from .dispatch import dispatch_works, rank_technicians, release_expiring
+from .notifications import format_assignment_message, queue_whatsapp
+from .api_auth import verify_password
+from .otp import OtpError, active_otp, issue_otp, verify_otp
+from .pagination import keyset_paginate
+from .pincodes import PincodeConflictError, PincodeImportError, assign_pincodes, import_pincodes
+from .query_budget import query_budget
+from .user_search import user_search_filter
+from .view_cache import cache_view
+from .work_intake import (
+    MAX_INTAKE_ROWS, REQUIRED_FIELDS, SHEET_FIRST_ROW, WORK_SHEET_COLUMNS, WorkIntakeError, intake_works, read_work_sheet,
+)
 from django.views.decorators.csrf import ensure_csrf_cookie
-import requests
-import random
 from django.utils import timezone
 from django.shortcuts import get_object_or_404
 
@@ -51,8 +61,8 @@ def login_view(request):
         try:
             # First, get the user by email
             user = User.objects.get(email=email)
-            # Check if password is correct using Django's check_password
-            if user.password == password:
+            # Accepts hashed passwords as well as legacy plaintext ones
+            if verify_password(user.password, password):
                 login(request, user)
                 return redirect('dashboard')
             else:
@@ -301,6 +311,7 @@ from django.contrib.auth.decorators import login_required
 from django.db import transaction
 
 @login_required
+@cache_view('products')
 def product_list(request):
     products = Product.objects.select_related("operator").all().order_by("operator__name","name")
     return render(request, "products/product_list.html", {"products": products})
@@ -319,7 +330,7 @@ def product_add(request):
             product = form.save()
             ProductStock.objects.get_or_create(product=product, defaults={"qty": 0})
             # Assign 0 initial stock to admin for new product
-            admin_user = User.objects.filter(role="admin").first() or User.objects.filter(is_admin=True).first()
+            admin_user = request.scope.admin_user
             if admin_user:
                 UserProductStock.objects.get_or_create(user=admin_user, product=product, defaults={"qty": 0})
             messages.success(request, "Product added.")
@@ -531,6 +542,7 @@ def work_master_delete(request, slug, pk):
 
  
 @login_required
+@cache_view('operators')
 def operator_list(request):
     if request.user.role != 'admin':
         messages.error(request, "Access denied.")
@@ -632,7 +644,7 @@ def purchase_add(request):
 
         total_lines = 0
         # credit stock to admin ownership
-        admin_user = User.objects.filter(role="admin").first() or User.objects.filter(is_admin=True).first()
+        admin_user = request.scope.admin_user
         for i, pid in enumerate(product_ids):
             if not pid:
                 continue
@@ -704,7 +716,7 @@ def transfer_stock_to_supervisor(request):
             supervisor = form.cleaned_data['supervisor']
             product = form.cleaned_data['product']
             qty = float(form.cleaned_data['qty'])
-            admin_user = User.objects.filter(role='admin').first() or User.objects.filter(is_admin=True).first()
+            admin_user = request.scope.admin_user
             try:
                 with transaction.atomic():
                     apstock, _ = UserProductStock.objects.get_or_create(user=admin_user, product=product)
@@ -904,13 +916,14 @@ def admin_take_back_from_supervisor(request):
     })
 
 
+@query_budget(10)
 @login_required
 def stock_overview(request):
     # Admin global view; supervisors see their area; technicians see own
     if request.user.role == 'admin' or getattr(request.user, 'is_admin', False):
         admin_user = request.user
         if request.user.role != 'admin':
-            admin_user = User.objects.filter(role='admin').first() or request.user
+            admin_user = request.scope.admin_user or request.user
         products = Product.objects.all().order_by('name')
         rows = []
         for p in products:
@@ -934,6 +947,7 @@ def stock_overview(request):
     stocks = UserProductStock.objects.filter(user=request.user).select_related('product').order_by('product__name')
     return render(request, 'products/stock_overview.html', {"stocks": stocks, "scope": "technician"})
 
+@query_budget(8)
 @login_required
 def stock_role_detail(request, role, product_id):
     if request.user.role != 'admin' and not getattr(request.user, 'is_admin', False):
@@ -1129,6 +1143,7 @@ def add_fos(request):
 
     return render(request, 'add_fos.html', {'supervisors': supervisors, 'operators': operators})
 
+@query_budget(10)
 def add_retailer(request):
     supervisors = User.objects.filter(role="supervisor", supervisor_category__name__in=["Sales", "Both"])
 
@@ -1563,6 +1578,7 @@ def admin_dashboard(request):
 
 # Pincode CRUD Views
 @login_required
+@cache_view('pincodes')
 def pincode_list(request):
     pincodes = Pincode.objects.all().order_by('pincode')
     
@@ -1591,6 +1607,32 @@ def pincode_add(request):
         'title': 'Add Pincode'
     })
 
+@login_required
+def pincode_import(request):
+    """Bulk-create pincodes from a CSV (Pincode, Area Name, City, State[, Active])"""
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Please choose a CSV file.')
+            return redirect('pincode_import')
+        try:
+            report = import_pincodes(upload, update_existing=bool(request.POST.get('update_existing')))
+        except PincodeImportError as e:
+            messages.error(request, str(e))
+            return redirect('pincode_import')
+
+        messages.success(
+            request,
+            f'{report.created} pincode(s) added, {report.updated} updated, {report.unchanged} already present.'
+        )
+        if report.error_count:
+            messages.warning(request, f'{report.error_count} row(s) skipped: {"; ".join(report.errors)}')
+        return redirect('pincode_list')
+
+    return render(request, 'pincodes/pincode_import.html', {
+        'title': 'Import Pincodes'
+    })
+
 @login_required
 def pincode_edit(request, pk):
     pincode = get_object_or_404(Pincode, pk=pk)
@@ -1644,27 +1686,25 @@ def pincode_assignment_list(request):
 @login_required
 def pincode_assignment_add(request):
     if request.method == 'POST':
-        form = PincodeAssignmentForm(request.POST)
+        form = PincodeAssignmentForm(request.POST, request.FILES)
         if form.is_valid():
             supervisor = form.cleaned_data['supervisor']
-            pincodes = form.cleaned_data['pincodes']
-            
-            # Create assignments
-            created_count = 0
-            for pincode in pincodes:
-                assignment, created = PincodeAssignment.objects.get_or_create(
-                    supervisor=supervisor,
-                    pincode=pincode,
-                    defaults={'assigned_by': request.user}
+            try:
+                created_count, existing_count = assign_pincodes(
+                    supervisor, form.cleaned_data['pincode_ids'], assigned_by=request.user
                 )
-                if created:
-                    created_count += 1
-            
+            except PincodeConflictError as e:
+                form.add_error(None, str(e))
+                return render(request, 'pincodes/pincode_assignment_form.html', {
+                    'form': form,
+                    'title': 'Assign Pincodes to Supervisor'
+                })
+
             if created_count > 0:
                 messages.success(request, f'{created_count} pincode(s) assigned successfully!')
             else:
                 messages.warning(request, 'No new assignments were made. All selected pincodes were already assigned.')
-            
+
             return redirect('pincode_assignment_list')
     else:
         form = PincodeAssignmentForm()
@@ -1727,6 +1767,40 @@ def work_add(request):
         form = WorkForm()
     return render(request, 'works/work_form.html', { 'form': form, 'title': 'Add Work' })
 
+@login_required
+def work_import(request):
+    """Create works in bulk from an operator's Excel/CSV job sheet"""
+    if request.user.role not in ['admin', 'supervisor']:
+        messages.error(request, 'Only admin and supervisor can add works.')
+        return redirect('work_list')
+
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if not upload:
+            messages.error(request, 'Please choose an Excel or CSV file.')
+            return redirect('work_import')
+        try:
+            rows = read_work_sheet(upload)
+        except WorkIntakeError as e:
+            messages.error(request, str(e))
+            return redirect('work_import')
+
+        report = intake_works(rows, created_by=request.user, first_row=SHEET_FIRST_ROW)
+        if report.created:
+            messages.success(request, f'{len(report.created)} of {report.total_rows} works created. Supervisors will be notified.')
+        if report.error_count:
+            messages.error(request, f'{report.error_count} row(s) skipped: {report.error_summary()}')
+        if not report.created and not report.error_count:
+            messages.warning(request, 'The sheet has no rows.')
+        return redirect('work_list' if report.created and not report.error_count else 'work_import')
+
+    return render(request, 'works/work_import.html', {
+        'columns': WORK_SHEET_COLUMNS,
+        'required_fields': REQUIRED_FIELDS,
+        'max_rows': MAX_INTAKE_ROWS,
+        'title': 'Import Works',
+    })
+
 @ensure_csrf_cookie
 @login_required
 def work_edit(request, pk):
@@ -1776,28 +1850,18 @@ def work_close(request, pk):
             # ===== OTP VALIDATION =====
             entered_otp = request.POST.get('closing_otp', '').strip()
 
-            # Admin can bypass OTP or use stored OTP
-            if user.role != 'admin':
-                # For non-admin users, OTP is mandatory
-                if not entered_otp:
-                    transaction.set_rollback(True)
-                    messages.error(request, 'Please enter the OTP sent to customer.')
-                    return redirect('work_close', pk=pk)
+            # Admin can bypass OTP by leaving it empty; anyone else must enter it
+            if user.role != 'admin' and not entered_otp:
+                transaction.set_rollback(True)
+                messages.error(request, 'Please enter the OTP sent to customer.')
+                return redirect('work_close', pk=pk)
 
-                if not work.closing_otp:
-                    transaction.set_rollback(True)
-                    messages.error(request, 'OTP not generated yet. Please click "Send OTP to Customer" first.')
-                    return redirect('work_close', pk=pk)
-
-                if entered_otp != work.closing_otp:
-                    transaction.set_rollback(True)
-                    messages.error(request, 'Invalid OTP. Please check and try again.')
-                    return redirect('work_close', pk=pk)
-            else:
-                # Admin can close with or without OTP
-                if entered_otp and work.closing_otp and entered_otp != work.closing_otp:
+            if entered_otp:
+                try:
+                    verify_otp(work, entered_otp)
+                except OtpError as e:
                     transaction.set_rollback(True)
-                    messages.error(request, 'Invalid OTP. Please check and try again.')
+                    messages.error(request, str(e))
                     return redirect('work_close', pk=pk)
 
             # Check if this is a repair work
@@ -1988,6 +2052,7 @@ def work_close(request, pk):
     return render(request, 'works/work_close.html', {
         'form': form,
         'work': work,
+        'active_otp': active_otp(work),
         'tech_stocks': tech_stocks,
         'user_is_supervisor': user_is_supervisor,
         'is_repair_work': is_repair_work,
@@ -2211,7 +2276,7 @@ def supervisor_transfer_to_admin(request):
         return redirect('dashboard')
 
     # Get an admin user
-    admin_user = User.objects.filter(role='admin').first() or User.objects.filter(is_admin=True).first()
+    admin_user = request.scope.admin_user
 
     if not admin_user:
         messages.error(request, 'No admin user found in the system.')
@@ -2276,46 +2341,12 @@ def transfer_history_view(request):
 
 # ==================== WORK ASSIGNMENT & OTP VIEWS ====================
 
-def send_whatsapp_message(mobile, message):
+def send_whatsapp_message(mobile, message, kind='general', coalesce_key=None):
     """
-    Send WhatsApp message via whatsbot.tech API.
-    mobile should be without country code (we'll prepend '91')
+    Queue a WhatsApp message (see core.notifications); delivery happens in the
+    background. mobile should be without country code.
     """
-    api_token = "02d22c19-69a0-4082-a1fc-46b0e45f6340"
-    full_mobile = f"91{mobile}"
-    url = f"https://whatsbot.tech/api/send_sms"
-    params = {
-        "api_token": api_token,
-        "mobile": full_mobile,
-        "message": message,
-    }
-
-    try:
-        print(f"\n{'='*60}")
-        print(f"📱 SENDING WHATSAPP MESSAGE")
-        print(f"{'='*60}")
-        print(f"To: {full_mobile}")
-        print(f"Message Preview: {message[:100]}...")
-        print(f"API URL: {url}")
-        print(f"{'='*60}\n")
-
-        response = requests.get(url, params=params, timeout=10)
-
-        print(f"\n{'='*60}")
-        print(f"✅ WHATSAPP API RESPONSE")
-        print(f"{'='*60}")
-        print(f"Status Code: {response.status_code}")
-        print(f"Response Text: {response.text}")
-        print(f"{'='*60}\n")
-
-        return response.json()
-    except Exception as e:
-        print(f"\n{'='*60}")
-        print(f"❌ WHATSAPP SENDING FAILED")
-        print(f"{'='*60}")
-        print(f"Error: {e}")
-        print(f"{'='*60}\n")
-        return None
+    return queue_whatsapp(mobile, message, kind=kind, coalesce_key=coalesce_key)
 
 
 @login_required
@@ -2337,11 +2368,12 @@ def work_assign(request, pk):
         messages.error(request, 'Only pending works can be assigned.')
         return redirect('work_list')
 
-    # Get available technicians
+    # Get available technicians, best fit first (see core.dispatch)
     if user.role == 'admin':
         technicians = User.objects.filter(role='technician').order_by('name')
     else:  # supervisor
         technicians = User.objects.filter(role='technician', supervisor=user).order_by('name')
+    technicians = rank_technicians(work, technicians)
 
     if request.method == 'POST':
         technician_id = request.POST.get('technician_id')
@@ -2356,35 +2388,48 @@ def work_assign(request, pk):
         # Send WhatsApp notification to technician
         if technician.phone or technician.whatsapp_no:
             mobile = technician.whatsapp_no or technician.phone
-            msg = f"""
-*New Work Assigned For You*
-
-Customer: {work.customer_name}
-Address: {work.address}
-Pincode: {work.pincode}
-Mobile: {work.mobile_no}
-Alternate: {work.alternate_no or 'N/A'}
-
-Operator: {work.operator.name if work.operator else ''}
-Service: {work.type_of_service.name if work.type_of_service else ''}
-Work From: {work.work_from.name if work.work_from else ''}
-Amount: ₹{work.amount}
-Status: {work.status}
-
-Please attend to this work as soon as possible.
-"""
-            send_whatsapp_message(mobile, msg.strip())
-
-        messages.success(request, f'Work assigned to {technician.name} successfully! WhatsApp notification sent.')
+            send_whatsapp_message(mobile, format_assignment_message(work), kind='work_assigned', coalesce_key=f'work:{work.pk}:technician')
+
+        messages.success(request, f'Work assigned to {technician.name} successfully! WhatsApp notification queued.')
         return redirect('work_list')
 
     return render(request, 'works/work_assign.html', {
         'work': work,
         'technicians': technicians,
+        'suggested_technician': technicians[0] if technicians else None,
         'title': 'Assign Work'
     })
 
 
+@login_required
+def work_auto_dispatch(request):
+    """Assign all unassigned pending works to technicians in one pass"""
+    user = request.user
+    if user.role not in ['admin', 'supervisor']:
+        messages.error(request, 'Only admin or supervisor can assign work.')
+        return redirect('work_list')
+
+    if request.method != 'POST':
+        return redirect('work_list')
+
+    check_expired_works()
+    works = WorkStb.objects.all()
+    if user.role == 'supervisor':
+        works = works.filter(supervisor=user)
+
+    assignments = dispatch_works(works)
+    for work, technician in assignments:
+        mobile = technician.whatsapp_no or technician.phone
+        if mobile:
+            send_whatsapp_message(mobile, format_assignment_message(work), kind='work_assigned', coalesce_key=f'work:{work.pk}:technician')
+
+    if assignments:
+        messages.success(request, f'{len(assignments)} work(s) auto-assigned to technicians.')
+    else:
+        messages.warning(request, 'No unassigned pending works with an available technician.')
+    return redirect('work_list')
+
+
 @login_required
 def work_reassign(request, pk):
     """Reassign work to a different technician"""
@@ -2433,26 +2478,9 @@ def work_reassign(request, pk):
         # Send WhatsApp notification to new technician
         if new_technician.phone or new_technician.whatsapp_no:
             mobile = new_technician.whatsapp_no or new_technician.phone
-            msg = f"""
-*Work Reassigned For You*
-
-Customer: {work.customer_name}
-Address: {work.address}
-Pincode: {work.pincode}
-Mobile: {work.mobile_no}
-Alternate: {work.alternate_no or 'N/A'}
-
-Operator: {work.operator.name if work.operator else ''}
-Service: {work.type_of_service.name if work.type_of_service else ''}
-Work From: {work.work_from.name if work.work_from else ''}
-Amount: ₹{work.amount}
-Status: {work.status}
-
-Please attend to this work as soon as possible.
-"""
-            send_whatsapp_message(mobile, msg.strip())
-
-        messages.success(request, f'Work reassigned from {old_technician.name} to {new_technician.name}! WhatsApp notification sent.')
+            send_whatsapp_message(mobile, format_assignment_message(work, new=False), kind='work_reassigned', coalesce_key=f'work:{work.pk}:technician')
+
+        messages.success(request, f'Work reassigned from {old_technician.name} to {new_technician.name}! WhatsApp notification queued.')
         return redirect('work_list')
 
     return render(request, 'works/work_reassign.html', {
@@ -2482,33 +2510,16 @@ def work_send_otp(request, pk):
         messages.error(request, 'OTP can only be sent for pending works.')
         return redirect('work_list')
 
-    # Generate 6-digit OTP
-    otp = str(random.randint(100000, 999999))
-    work.closing_otp = otp
-    work.otp_sent_at = timezone.now()
-    work.save()
-
-    # Send OTP to customer via WhatsApp
-    customer_mobile = work.wp_no or work.mobile_no
-    if customer_mobile:
-        msg = f"""
-*Work Closing OTP*
-
-Hello {work.customer_name},
-
-Your OTP for closing work order is: *{otp}*
-
-Operator: {work.operator.name if work.operator else ''}
-Service: {work.type_of_service.name if work.type_of_service else ''}
-
-Please share this OTP with the technician to complete the work.
+    try:
+        otp = issue_otp(work, issued_by=user)
+    except OtpError as e:
+        messages.error(request, str(e))
+        return redirect('work_close', pk=pk)
 
-Thank you!
-"""
-        send_whatsapp_message(customer_mobile, msg.strip())
-        messages.success(request, f'OTP sent to customer {work.customer_name} at {customer_mobile}')
+    if otp.sent_to:
+        messages.success(request, f'OTP is being sent to customer {work.customer_name} at {otp.sent_to}')
     else:
-        messages.warning(request, f'OTP generated: {otp} (No WhatsApp number available to send)')
+        messages.warning(request, f'OTP generated: {otp.code} (No WhatsApp number available to send)')
 
     return redirect('work_close', pk=pk)
 
@@ -2520,14 +2531,17 @@ def admin_otp_list(request):
         messages.error(request, 'Only admin can view OTP list.')
         return redirect('dashboard')
 
-    # Get all pending works with OTP
-    works_with_otp = WorkStb.objects.filter(
-        status='Pending',
-        closing_otp__isnull=False
-    ).select_related('operator', 'supervisor', 'assigned_technician', 'type_of_service').order_by('-otp_sent_at')
+    # Current OTPs of pending works, straight from the (status, expires_at) index
+    otps = WorkOtp.objects.filter(
+        status='active',
+        expires_at__gt=timezone.now(),
+        work__status='Pending',
+    ).select_related(
+        'work', 'work__operator', 'work__supervisor', 'work__assigned_technician', 'work__type_of_service'
+    ).order_by('-created_at')
 
     return render(request, 'works/admin_otp_list.html', {
-        'works': works_with_otp,
+        'otps': otps,
         'title': 'OTP Listing '
     })
 
@@ -2705,6 +2719,11 @@ def payment_history(request):
 
 # ==================== USER MANAGEMENT VIEWS ====================
 
+USER_PAGE_SIZE = 25
+# Both columns in the same direction, so MySQL walks user_role_id_idx backwards instead of sorting
+USER_LIST_ORDERING = ('-role', '-id')
+
+
 @login_required
 def user_list(request):
     """Admin view for all users with filtering and search"""
@@ -2712,12 +2731,12 @@ def user_list(request):
         messages.error(request, 'Only admin can access user list.')
         return redirect('dashboard')
 
-    # Order by role first, then by id - use select_related for supervisor_category and prefetch FOS operators, retailer FOS, and EC wallets
+    # Order by role, newest first - use select_related for supervisor_category and prefetch FOS operators, retailer FOS, and EC wallets
     users = User.objects.select_related('supervisor_category').prefetch_related(
         'fosoperatormap_set__operator',
         'retailer_fos_maps__fos',
         'retailer_wallet__operator'  # Prefetch EC recharge wallets for retailers
-    ).all().order_by('role', '-id')
+    ).all().order_by(*USER_LIST_ORDERING)
 
     # Apply filters
     role_filter = request.GET.get('role', '')
@@ -2735,22 +2754,18 @@ def user_list(request):
     if supervisor_category_filter:
         users = users.filter(supervisor_category__name=supervisor_category_filter)
 
-    if search_query:
-        users = users.filter(
-            Q(name__icontains=search_query) |
-            Q(email__icontains=search_query) |
-            Q(phone__icontains=search_query)
-        )
+    # Prefix search on phone / email / normalised name (index range scans, see core.user_search)
+    search_filter = user_search_filter(search_query)
+    if search_filter is not None:
+        users = users.filter(search_filter)
 
     if status_filter == 'active':
         users = users.filter(is_active=True)
     elif status_filter == 'inactive':
         users = users.filter(is_active=False)
 
-    # Pagination
-    paginator = Paginator(users, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination on the (role, id) index - no COUNT(*) or OFFSET scans
+    page_obj = keyset_paginate(users, USER_LIST_ORDERING, request.GET.get('cursor'), per_page=USER_PAGE_SIZE)
 
     return render(request, 'users/user_list.html', {
         'page_obj': page_obj,
@@ -2935,7 +2950,8 @@ def check_expired_works():
         work_deadline_time__lt=timezone.now()
     )
 
-    count = expired_works.update(status='Expired')
+    release_expiring(expired_works)
+    count = expired_works.update(status='Expired', updated_at=timezone.now())
     return count
 
 
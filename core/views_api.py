@@ -1,12 +1,11 @@
 from warnings import filters
-import requests
 from rest_framework import generics, filters
 from rest_framework import viewsets
 from rest_framework.views import APIView
 from .models import CollectionTransfer, Operator, TypeOfService, WorkFromTheRole, Material, WorkReport, WorkStb
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from django.contrib.auth.hashers import check_password
+from rest_framework.decorators import action, api_view, authentication_classes
+from .api_auth import authenticate_login, issue_tokens
 from django.contrib.auth import authenticate
 from .models import User
 from django.conf import settings
@@ -14,12 +13,27 @@ from rest_framework import generics, status
 from .serializers import CollectionTransferSerializer, UserSerializer, RegisterSerializer, WorkReportSerializer
 from rest_framework import status
 from django.db.models import Q
+from .notifications import format_assignment_message, queue_whatsapp
+from .work_intake import MAX_INTAKE_ROWS, intake_works
 from .serializers import (
     OperatorSerializer,
     TypeOfServiceSerializer,
     WorkFromTheRoleSerializer,
     MaterialSerializer,
-    WorkStbSerializer
+    WorkStbSerializer,
+    WorkStbListSerializer,
+)
+from .pagination import ApiCursorPagination
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated
+from .master_data import get_master_bundle
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from .sync import (
+    SYNC_MAX_PAGE_SIZE, SYNC_PAGE_SIZE, SYNC_RESOURCES, SyncTokenError, SyncTokenExpired,
+    build_sync, etag_matches, payload_etag,
 )
 
 
@@ -29,40 +43,27 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 # Login User
+def _login_response(identifier, password):
+    record = authenticate_login(identifier, password)
+    if record is None:
+        return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+    return Response({
+        **issue_tokens(record),
+        "id": record["id"],
+        "name": record["name"],
+        "email": record["email"],
+        "phone": record["phone"],
+        "role": record["role"],
+    }, status=status.HTTP_200_OK)
+
+
 class LoginView(APIView):
-    def post(self, request):
-        identifier = request.data.get("identifier")  # email or phone or name
-        password = request.data.get("password")
+    """Phone/email + password login returning a JWT pair (see core.api_auth)"""
+    authentication_classes = []
 
-        try:
-            user = User.objects.filter(
-                Q(email=identifier) | Q(phone=identifier) | Q(name__iexact=identifier)
-            ).first()
-
-            if user and user.password == password:
-
-                return Response({
-                    "id": user.id,
-                    "name": user.name,
-                    "email": user.email,
-                    "phone": user.phone,
-                    "alternate_no": user.alternate_no,
-                    "whatsapp_no": user.whatsapp_no, 
-                    "password": user.password, 
-                    "address": user.address,
-                    "pincode": user.pincode,
-                    "remark": user.remark,
-                    "role": user.role,
-                    "collection_amount": user.collection_amount,
-                    "paid_to_company": user.paid_to_company,
-                    "pending_work": user.pending_work,
-                    "assigned_work": user.assigned_work,
-                    "completed_work": user.completed_work,
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
-        except Exception as e:
-            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    def post(self, request):
+        identifier = request.data.get("identifier") or request.data.get("phone")
+        return _login_response(identifier, request.data.get("password"))
 
 # CRUD for Users
 class UserListCreateView(generics.ListCreateAPIView):
@@ -84,21 +85,9 @@ def register_user(request):
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['POST'])
+@authentication_classes([])
 def login_user(request):
-    phone = request.data.get('phone')
-    password = request.data.get('password')
-
-    try:
-        user = User.objects.get(phone=phone)
-        if check_password(password, user.password):
-            return Response({
-                "message": "Login successful",
-                "user": UserSerializer(user).data
-            }, status=status.HTTP_200_OK)
-        else:
-            return Response({"error": "Invalid password"}, status=status.HTTP_400_BAD_REQUEST)
-    except User.DoesNotExist:
-        return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+    return _login_response(request.data.get('phone'), request.data.get('password'))
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -149,8 +138,56 @@ class CollectionTransferActionView(APIView):
 
 
 class WorkStbViewSet(viewsets.ModelViewSet):
-    queryset = WorkStb.objects.all().order_by("-id")
+    """
+    Works for the technician app. The list takes ``assigned_technician``,
+    ``status`` (comma-separated) and ``updated_since`` (ISO datetime) filters
+    and is cursor-paginated.
+    """
+    queryset = WorkStb.objects.select_related("operator", "type_of_service", "work_from").order_by("-id")
     serializer_class = WorkStbSerializer
+    pagination_class = ApiCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            # The list serializer only sends the supervisor/technician ids
+            return queryset
+        return queryset.select_related("supervisor", "assigned_technician")
+
+    def get_serializer_class(self):
+        if self.action == "list":
+            return WorkStbListSerializer
+        return WorkStbSerializer
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action != "list":
+            return queryset
+        params = self.request.query_params
+
+        technician = params.get("assigned_technician")
+        if technician:
+            if not technician.isdigit():
+                raise ValidationError({"assigned_technician": "Must be a user id."})
+            queryset = queryset.filter(assigned_technician_id=int(technician))
+
+        statuses = [value.strip() for value in params.get("status", "").split(",") if value.strip()]
+        if statuses:
+            queryset = queryset.filter(status__in=statuses)
+
+        updated_since = params.get("updated_since")
+        if updated_since:
+            try:
+                since = parse_datetime(updated_since)
+            except ValueError:
+                # Well-formed but impossible, e.g. 2024-02-30T00:00:00
+                since = None
+            if since is None:
+                raise ValidationError({"updated_since": "Use an ISO 8601 datetime."})
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            queryset = queryset.filter(updated_at__gte=since)
+        return queryset
 
     def perform_create(self, serializer):
         # Save the new work
@@ -165,59 +202,136 @@ class WorkStbViewSet(viewsets.ModelViewSet):
         if old_work.assigned_technician != work.assigned_technician:
             self.send_whatsapp_message(work, new=False)
 
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """Create many works at once: a JSON list, or {"works": [...]}"""
+        # Same rule as the web import (work_import); the JWT carries the role claim
+        if request.user.role not in ('admin', 'supervisor'):
+            return Response({"error": "Only admin and supervisor can add works."}, status=status.HTTP_403_FORBIDDEN)
+        rows = request.data.get("works") if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "Send a non-empty list of works."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(rows) > MAX_INTAKE_ROWS:
+            return Response({"error": f"At most {MAX_INTAKE_ROWS} works per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = intake_works(rows, created_by=request.user)
+        return Response({
+            "created": len(report.created),
+            "ids": [work.pk for work in report.created],
+            "rejected": report.error_count,
+            "errors": [{"row": row, "error": message} for row, message in report.errors],
+        }, status=status.HTTP_201_CREATED if report.created else status.HTTP_400_BAD_REQUEST)
+
     def send_whatsapp_message(self, work, new=True):
         technician = work.assigned_technician
         if technician and technician.phone:
-            # Build the message
-            message_type = "New Work Assigned For You" if new else "Work Reassigned For You"
-            msg = f"""
-*{message_type}*
-
-Customer: {work.customer_name}
-Address: {work.address}
-Pincode: {work.pincode}
-Mobile: {work.mobile_no}
-Alternate: {work.alternate_no or 'N/A'}
-
-Operator: {work.operator.name if work.operator else ''}
-Service: {work.type_of_service.name if work.type_of_service else ''}
-Work From: {work.work_from.name if work.work_from else ''}
-Amount: ₹{work.amount}
-Status: {work.status}
-
-Please attend to this work as soon as possible.
-"""
-            api_token = "02d22c19-69a0-4082-a1fc-46b0e45f6340"
-            mobile = f"91{technician.whatsapp_no or technician.phone}"
-            url = f"https://whatsbot.tech/api/send_sms"
-            params = {
-                "api_token": api_token,
-                "mobile": mobile,
-                "message": msg.strip(),
-            }
+            queue_whatsapp(
+                technician.whatsapp_no or technician.phone,
+                format_assignment_message(work, new=new),
+                kind="work_assigned" if new else "work_reassigned",
+                coalesce_key=f"work:{work.pk}:technician",
+            )
+
 
-            try:
-                response = requests.get(url, params=params, timeout=10)
-                print("WhatsApp message sent:", response.text)
-            except Exception as e:
-                print("Failed to send WhatsApp message:", e)
 
+class SyncView(APIView):
+    """
+    Delta sync for the mobile app (see core.sync). Query params: ``since``
+    (token from the previous response), ``resources`` (comma-separated,
+    default all), ``assigned_technician`` and ``page_size``.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        names = [name.strip() for name in params.get("resources", "").split(",") if name.strip()] or list(SYNC_RESOURCES)
+        unknown = [name for name in names if name not in SYNC_RESOURCES]
+        if unknown:
+            return Response({"error": f"Unknown resources: {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        technician = params.get("assigned_technician", "")
+        if technician and not technician.isdigit():
+            return Response({"error": "assigned_technician must be a user id."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            page_size = min(max(int(params.get("page_size", SYNC_PAGE_SIZE)), 1), SYNC_MAX_PAGE_SIZE)
+        except ValueError:
+            page_size = SYNC_PAGE_SIZE
+
+        try:
+            payload = build_sync(
+                names, token=params.get("since"), user_id=int(technician) if technician else None,
+                page_size=page_size, context={"request": request},
+            )
+        except SyncTokenExpired as e:
+            return Response({"error": str(e), "full_resync": True}, status=status.HTTP_410_GONE)
+        except SyncTokenError as e:
+            return Response({"error": str(e), "full_resync": True}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = payload_etag(payload)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(payload, headers=headers)
+
+
+class MasterDataView(APIView):
+    """All master lists in one cached, gzip-ready document (see core.master_data)"""
+
+    def get(self, request):
+        bundle = get_master_bundle()
+        if etag_matches(request.headers.get("If-None-Match"), bundle.etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif "gzip" in request.headers.get("Accept-Encoding", ""):
+            response = HttpResponse(bundle.gzipped, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(bundle.body, content_type="application/json")
+        response["ETag"] = bundle.etag
+        response["Cache-Control"] = "no-cache"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+
+WORK_REPORT_QUERYSET = WorkReport.objects.select_related(
+    "work__operator", "work__type_of_service", "work__work_from",
+    "work__supervisor", "work__assigned_technician",
+)
 
 
 class WorkReportListCreateView(generics.ListCreateAPIView):
-    queryset = WorkReport.objects.all().order_by("-id")
+    """
+    Work reports, newest first and cursor-paginated. Filters match exact ids
+    on the work: ``assigned_technician``, ``supervisor``, ``operator``,
+    ``type_of_service`` and ``work_from``; ``search`` matches an id in any of them.
+    """
+    queryset = WORK_REPORT_QUERYSET.order_by("-id")
     serializer_class = WorkReportSerializer
-    filter_backends = [filters.SearchFilter]
-    search_fields = [
-        "work__assigned_technician__id",
-        "work__supervisor__id",
-        "work__operator__id",
-        "work__type_of_service__id",
-        "work__work_from__id",
-    ]
+    pagination_class = ApiCursorPagination
+    work_filters = ["assigned_technician", "supervisor", "operator", "type_of_service", "work_from"]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        params = self.request.query_params
+
+        for name in self.work_filters:
+            value = params.get(name)
+            if value:
+                if not value.isdigit():
+                    raise ValidationError({name: "Must be an id."})
+                queryset = queryset.filter(**{f"work__{name}_id": int(value)})
+
+        search = params.get("search", "").strip()
+        if search:
+            # Kept for older clients: an exact id in any of the filter fields
+            if not search.isdigit():
+                raise ValidationError({"search": "Must be an id."})
+            condition = Q()
+            for name in self.work_filters:
+                condition |= Q(**{f"work__{name}_id": int(search)})
+            queryset = queryset.filter(condition)
+        return queryset
 
 class WorkReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = WorkReport.objects.all()
+    queryset = WORK_REPORT_QUERYSET
     serializer_class = WorkReportSerializer
 
 
@@ -228,7 +342,6 @@ class WorkReportRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView)
 
 
 
-
 class OperatorViewSet(viewsets.ModelViewSet):
     queryset = Operator.objects.all()
     serializer_class = OperatorSerializer
@@ -252,24 +365,10 @@ class MaterialViewSet(viewsets.ModelViewSet):
 
 def send_whatsapp_message(mobile, message):
     """
-    Send WhatsApp message via whatsbot.tech API.
-    mobile should be without country code (we'll prepend '91')
+    Queue a WhatsApp message (see core.notifications).
+    mobile should be without country code (the backend prepends '91')
     """
-    api_token = "02d22c19-69a0-4082-a1fc-46b0e45f6340"
-    full_mobile = f"91{mobile}"
-    url = f"https://whatsbot.tech/api/send_sms"
-    params = {
-        "api_token": api_token,
-        "mobile": full_mobile,
-        "message": message,
-    }
-
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        return response.json()
-    except Exception as e:
-        print("WhatsApp sending failed:", e)
-        return None
+    return queue_whatsapp(mobile, message)
 
 
 
@@ -21,6 +21,10 @@ from .forms_ec import (
     EcUploadSelectForm, EcManualEntryForm, EcExcelUploadForm,
     EcCollectionForm, EcSalesReportFilterForm, EcCollectionReportFilterForm
 )
+from .hierarchy import descendant_ids
+from .pagination import keyset_paginate
+from .query_budget import query_budget
+from .exports import stream_export
 
 
 # ==================== EC UPLOAD VIEWS ====================
@@ -92,13 +96,8 @@ def get_operators_by_supervisor(request):
     if not supervisor_id:
         return JsonResponse({'operators': []})
 
-    fos_ids = User.objects.filter(
-        role='fos',
-        supervisor_id=supervisor_id
-    ).values_list('id', flat=True)
-
     operator_ids = FosOperatorMap.objects.filter(
-        fos_id__in=fos_ids
+        fos_id__in=descendant_ids(supervisor_id, roles=['fos'])
     ).values_list('operator_id', flat=True).distinct()
 
     operators = Operator.objects.filter(
@@ -460,7 +459,7 @@ def ec_collect_from_retailer(request):
             return redirect('ec_collect_from_retailer')
 
     # Get retailers under this FOS with their total pending
-    retailer_ids = RetailerFosMap.objects.filter(fos=request.user).values_list('retailer_id', flat=True)
+    retailer_ids = request.scope.retailer_ids
 
     # Get pending summary by operator
     pending_summary = RetailerWallet.objects.filter(
@@ -498,6 +497,7 @@ def ec_collect_from_retailer(request):
     return render(request, 'ec_recharge/collect_from_retailer.html', context)
 
 
+@query_budget(12)
 @login_required
 def ec_pending_collections(request):
     """View pending collections at all levels"""
@@ -509,7 +509,7 @@ def ec_pending_collections(request):
 
     if user.role == 'fos':
         # Show retailers pending to pay FOS - get retailers from RetailerFosMap
-        retailer_ids = RetailerFosMap.objects.filter(fos=user).values_list('retailer_id', flat=True)
+        retailer_ids = request.scope.retailer_ids
         retailer_wallets = RetailerWallet.objects.filter(
             retailer_id__in=retailer_ids,
             pending_amount__gt=0
@@ -584,30 +584,59 @@ def ec_pending_collections(request):
 
 # ==================== EC REPORTS ====================
 
-@login_required
-def ec_sales_report(request):
-    """EC Sales Report with Role-based Filters"""
-    user = request.user
-
-    # Base queryset filtered by role
-    sales = EcSale.objects.select_related('operator', 'supervisor', 'fos', 'retailer')
-
-    # Role-based base filtering
+EC_PAGE_SIZE = 50
+
+EC_SALES_EXPORT_COLUMNS = [
+    ('order_date', 'Order Date'),
+    ('order_id', 'Order ID'),
+    ('operator__name', 'Operator'),
+    ('supervisor__name', 'Supervisor'),
+    ('fos__name', 'FOS'),
+    ('retailer__name', 'Retailer'),
+    ('partner_id', 'Partner ID'),
+    ('partner_name', 'Partner Name'),
+    ('transfer_amount', 'Transfer Amount'),
+    ('commission', 'Commission'),
+    ('amount_without_commission', 'Amount W/O Commission'),
+    ('upload_type', 'Upload Type'),
+    ('uploaded_at', 'Uploaded At'),
+]
+
+EC_COLLECTION_EXPORT_COLUMNS = [
+    ('collection_date', 'Collection Date'),
+    ('collection_level', 'Collection Level'),
+    ('operator__name', 'Operator'),
+    ('from_user__name', 'Collected From'),
+    ('to_user__name', 'Collected To'),
+    ('collected_by__name', 'Collected By'),
+    ('pending_before', 'Pending Before'),
+    ('collection_amount', 'Collection Amount'),
+    ('pending_after', 'Pending After'),
+    ('remarks', 'Remarks'),
+    ('created_at', 'Recorded At'),
+]
+
+
+def _scope_ec_sales(user):
+    """EcSale rows visible to this user's role (admin sees all)"""
+    sales = EcSale.objects.all()
     if user.role == 'supervisor':
         sales = sales.filter(supervisor=user)
     elif user.role == 'fos':
         sales = sales.filter(fos=user)
     elif user.role == 'retailer':
         sales = sales.filter(retailer=user)
-    # Admin sees all
+    return sales
 
-    # Get filter parameters
+
+def _filter_ec_sales(request, sales):
+    """Apply the report filters from GET (operator, dates, user) to a sales queryset"""
+    user = request.user
     operator_id = request.GET.get('operator')
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
     user_filter = request.GET.get('user')
 
-    # Apply filters
     if operator_id:
         sales = sales.filter(operator_id=operator_id)
 
@@ -629,81 +658,30 @@ def ec_sales_report(request):
             # FOS can filter by retailers under them
             sales = sales.filter(retailer_id=user_filter)
 
-    # Calculate totals
-    totals_by_operator = sales.values('operator__name').annotate(
-        total=Sum('amount_without_commission'),
-        count=Count('id')
-    ).order_by('operator__name')
-
-    overall_total = sales.aggregate(
-        total=Sum('amount_without_commission'),
-        count=Count('id')
-    )
-
-    # Order by date descending
-    sales = sales.order_by('-order_date', '-uploaded_at')
-
-    # Get user list based on role
-    user_choices = []
-    if user.role == 'admin':
-        # Admin can filter by supervisors, FOS, or retailers
-        user_choices = User.objects.filter(
-            role__in=['supervisor', 'fos', 'retailer']
-        ).order_by('role', 'name')
-    elif user.role == 'supervisor':
-        # Supervisor can filter by their FOS and retailers under those FOS
-        fos_users = User.objects.filter(role='fos', supervisor=user)
-        retailer_ids = RetailerFosMap.objects.filter(fos__in=fos_users).values_list('retailer_id', flat=True)
-        retailers = User.objects.filter(id__in=retailer_ids)
-        from itertools import chain
-        user_choices = list(chain(fos_users, retailers))
-    elif user.role == 'fos':
-        # FOS can filter by retailers under them
-        retailer_ids = RetailerFosMap.objects.filter(fos=user).values_list('retailer_id', flat=True)
-        user_choices = User.objects.filter(id__in=retailer_ids).order_by('name')
-
-    context = {
-        'sales': sales[:200],
-        'totals_by_operator': totals_by_operator,
-        'overall_total': overall_total,
-        'operators': Operator.objects.all().order_by('name'),
-        'user_choices': user_choices,
-        'selected_operator': operator_id,
-        'selected_user': user_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-    }
-    return render(request, 'ec_recharge/sales_report.html', context)
-
-
-@login_required
-def ec_collection_report(request):
-    """EC Collection Report with Role-based Filters"""
-    user = request.user
+    return sales
 
-    # Base queryset filtered by role
-    collections = EcCollection.objects.select_related('operator', 'from_user', 'to_user', 'collected_by')
 
-    # Role-based base filtering
-    if user.role == 'supervisor':
-        # Supervisor sees collections they made or received
-        collections = collections.filter(Q(collected_by=user) | Q(to_user=user) | Q(from_user=user))
-    elif user.role == 'fos':
-        # FOS sees collections they made or received
+def _scope_ec_collections(user):
+    """EcCollection rows visible to this user's role (admin sees all)"""
+    collections = EcCollection.objects.all()
+    if user.role in ('supervisor', 'fos'):
+        # Supervisor/FOS see collections they made or received
         collections = collections.filter(Q(collected_by=user) | Q(to_user=user) | Q(from_user=user))
     elif user.role == 'retailer':
         # Retailer sees collections where they paid
         collections = collections.filter(from_user=user)
-    # Admin sees all
+    return collections
+
 
-    # Get filter parameters
+def _filter_ec_collections(request, collections):
+    """Apply the report filters from GET (operator, dates, level, user) to a collections queryset"""
+    user = request.user
     operator_id = request.GET.get('operator')
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
     collection_level = request.GET.get('collection_level')
     user_filter = request.GET.get('user')
 
-    # Apply filters
     if operator_id:
         collections = collections.filter(operator_id=operator_id)
 
@@ -732,6 +710,88 @@ def ec_collection_report(request):
             # FOS can filter by retailers under them
             collections = collections.filter(from_user_id=user_filter)
 
+    return collections
+
+
+def _export_ec_rows(request, queryset, columns, ordering, filename_stem, sheet_title):
+    """Stream the whole filtered queryset as CSV/XLSX without loading model instances"""
+    fields = [field for field, _ in columns]
+    header = [label for _, label in columns]
+    rows = queryset.order_by(*ordering).values_list(*fields).iterator(chunk_size=2000)
+    filename = f"{filename_stem}_{timezone.localdate().strftime('%Y%m%d')}"
+    return stream_export(request.GET.get('export'), filename, header, rows, sheet_title=sheet_title)
+
+
+def _ec_user_choices(user):
+    """Users this role may pick in the report 'user' filter"""
+    if user.role == 'admin':
+        # Admin can filter by supervisors, FOS, or retailers
+        return User.objects.filter(
+            role__in=['supervisor', 'fos', 'retailer']
+        ).order_by('role', 'name')
+    if user.role == 'supervisor':
+        # Supervisor can filter by their FOS and retailers under those FOS
+        return User.objects.filter(
+            id__in=descendant_ids(user, roles=['fos', 'retailer'])
+        ).order_by('role', 'name')
+    if user.role == 'fos':
+        # FOS can filter by retailers under them
+        return User.objects.filter(id__in=descendant_ids(user, roles=['retailer'])).order_by('name')
+    return []
+
+
+@login_required
+def ec_sales_report(request):
+    """EC Sales Report with Role-based Filters"""
+    user = request.user
+    sales = _filter_ec_sales(request, _scope_ec_sales(user))
+    ordering = ('-order_date', '-id')
+
+    if request.GET.get('export') in ('csv', 'xlsx'):
+        return _export_ec_rows(request, sales, EC_SALES_EXPORT_COLUMNS, ordering, 'ec_sales_report', 'EC Sales')
+
+    # Calculate totals
+    totals_by_operator = sales.values('operator__name').annotate(
+        total=Sum('amount_without_commission'),
+        count=Count('id')
+    ).order_by('operator__name')
+
+    overall_total = sales.aggregate(
+        total=Sum('amount_without_commission'),
+        count=Count('id')
+    )
+
+    page = keyset_paginate(
+        sales.select_related('operator', 'supervisor', 'fos', 'retailer'),
+        ordering, request.GET.get('cursor'), per_page=EC_PAGE_SIZE
+    )
+
+    context = {
+        'sales': page,
+        'totals_by_operator': totals_by_operator,
+        'overall_total': overall_total,
+        'operators': Operator.objects.all().order_by('name'),
+        'user_choices': _ec_user_choices(user),
+        'selected_operator': request.GET.get('operator'),
+        'selected_user': request.GET.get('user'),
+        'date_from': request.GET.get('date_from'),
+        'date_to': request.GET.get('date_to'),
+    }
+    return render(request, 'ec_recharge/sales_report.html', context)
+
+
+@login_required
+def ec_collection_report(request):
+    """EC Collection Report with Role-based Filters"""
+    user = request.user
+    collections = _filter_ec_collections(request, _scope_ec_collections(user))
+    ordering = ('-collection_date', '-id')
+
+    if request.GET.get('export') in ('csv', 'xlsx'):
+        return _export_ec_rows(
+            request, collections, EC_COLLECTION_EXPORT_COLUMNS, ordering, 'ec_collection_report', 'EC Collections'
+        )
+
     # Calculate totals
     totals_by_level = collections.values('collection_level').annotate(
         total=Sum('collection_amount'),
@@ -743,27 +803,10 @@ def ec_collection_report(request):
         count=Count('id')
     )
 
-    # Order by date descending
-    collections = collections.order_by('-collection_date', '-created_at')
-
-    # Get user list based on role
-    user_choices = []
-    if user.role == 'admin':
-        # Admin can filter by supervisors, FOS, or retailers
-        user_choices = User.objects.filter(
-            role__in=['supervisor', 'fos', 'retailer']
-        ).order_by('role', 'name')
-    elif user.role == 'supervisor':
-        # Supervisor can filter by their FOS and retailers
-        fos_users = User.objects.filter(role='fos', supervisor=user)
-        retailer_ids = RetailerFosMap.objects.filter(fos__in=fos_users).values_list('retailer_id', flat=True)
-        retailers = User.objects.filter(id__in=retailer_ids)
-        from itertools import chain
-        user_choices = list(chain(fos_users, retailers))
-    elif user.role == 'fos':
-        # FOS can filter by retailers under them
-        retailer_ids = RetailerFosMap.objects.filter(fos=user).values_list('retailer_id', flat=True)
-        user_choices = User.objects.filter(id__in=retailer_ids).order_by('name')
+    page = keyset_paginate(
+        collections.select_related('operator', 'from_user', 'to_user', 'collected_by'),
+        ordering, request.GET.get('cursor'), per_page=EC_PAGE_SIZE
+    )
 
     # Collection level choices
     level_choices = [
@@ -773,17 +816,17 @@ def ec_collection_report(request):
     ]
 
     context = {
-        'collections': collections[:200],
+        'collections': page,
         'totals_by_level': totals_by_level,
         'overall_total': overall_total,
         'operators': Operator.objects.all().order_by('name'),
-        'user_choices': user_choices,
+        'user_choices': _ec_user_choices(user),
         'level_choices': level_choices,
-        'selected_operator': operator_id,
-        'selected_user': user_filter,
-        'selected_level': collection_level,
-        'date_from': date_from,
-        'date_to': date_to,
+        'selected_operator': request.GET.get('operator'),
+        'selected_user': request.GET.get('user'),
+        'selected_level': request.GET.get('collection_level'),
+        'date_from': request.GET.get('date_from'),
+        'date_to': request.GET.get('date_to'),
     }
     return render(request, 'ec_recharge/collection_report.html', context)
 
@@ -792,16 +835,31 @@ def ec_collection_report(request):
 def ec_sales_history(request):
     """Sales History - My Uploads"""
     user = request.user
+    sales = _filter_ec_sales(request, EcSale.objects.filter(uploaded_by=user))
+    ordering = ('-uploaded_at', '-id')
 
-    sales = EcSale.objects.filter(uploaded_by=user).select_related(
-        'operator', 'supervisor', 'fos', 'retailer'
-    ).order_by('-uploaded_at')[:50]
+    if request.GET.get('export') in ('csv', 'xlsx'):
+        return _export_ec_rows(request, sales, EC_SALES_EXPORT_COLUMNS, ordering, 'ec_sales_history', 'EC Sales')
 
-    total = sales.aggregate(total=Sum('amount_without_commission'))['total'] or 0
+    summary = sales.aggregate(
+        total_uploads=Count('id'),
+        excel_uploads=Count('id', filter=Q(upload_type='excel')),
+        manual_uploads=Count('id', filter=Q(upload_type='manual')),
+        total_amount=Sum('amount_without_commission'),
+    )
+
+    page = keyset_paginate(
+        sales.select_related('operator', 'supervisor', 'fos', 'retailer'),
+        ordering, request.GET.get('cursor'), per_page=EC_PAGE_SIZE
+    )
 
     context = {
-        'sales': sales,
-        'total': total,
+        'sales': page,
+        'summary': summary,
+        'total': summary['total_amount'] or 0,
+        'page_total_transfer': sum(s.transfer_amount for s in page),
+        'page_total_commission': sum(s.commission for s in page),
+        'page_total_amount': sum(s.amount_without_commission for s in page),
     }
     return render(request, 'ec_recharge/sales_history.html', context)
 
@@ -810,23 +868,32 @@ def ec_sales_history(request):
 def ec_collection_history(request):
     """Collection History - My Collections"""
     user = request.user
+    collections = _filter_ec_collections(
+        request,
+        EcCollection.objects.filter(Q(collected_by=user) | Q(from_user=user) | Q(to_user=user))
+    )
+    ordering = ('-collection_date', '-id')
 
-    collections = EcCollection.objects.filter(
-        Q(collected_by=user) | Q(from_user=user) | Q(to_user=user)
-    ).select_related('operator', 'from_user', 'to_user').order_by('-collection_date')[:50]
+    if request.GET.get('export') in ('csv', 'xlsx'):
+        return _export_ec_rows(
+            request, collections, EC_COLLECTION_EXPORT_COLUMNS, ordering, 'ec_collection_history', 'EC Collections'
+        )
 
-    total_collected = EcCollection.objects.filter(collected_by=user).aggregate(
-        total=Sum('collection_amount')
-    )['total'] or 0
+    totals = EcCollection.objects.filter(Q(collected_by=user) | Q(from_user=user)).aggregate(
+        total_collected=Sum('collection_amount', filter=Q(collected_by=user)),
+        total_given=Sum('collection_amount', filter=Q(from_user=user)),
+    )
 
-    total_given = EcCollection.objects.filter(from_user=user).aggregate(
-        total=Sum('collection_amount')
-    )['total'] or 0
+    page = keyset_paginate(
+        collections.select_related('operator', 'from_user', 'to_user'),
+        ordering, request.GET.get('cursor'), per_page=EC_PAGE_SIZE
+    )
 
     context = {
-        'collections': collections,
-        'total_collected': total_collected,
-        'total_given': total_given,
+        'collections': page,
+        'total_collected': totals['total_collected'] or 0,
+        'total_given': totals['total_given'] or 0,
+        'page_total': sum(c.collection_amount for c in page),
     }
     return render(request, 'ec_recharge/collection_history.html', context)
 
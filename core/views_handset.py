@@ -18,11 +18,40 @@ from .models import (
     HandsetCollection
 )
 from .forms import HandsetTransferForm
+from .serials import SerialRangeError, collect_transfer_serials, find_holdings, bulk_create_chunked
+from .exports import stream_csv
+from .pagination import keyset_paginate
+from .stock_summary import HANDSET, add_purchased_stock, operator_summary
+from .view_cache import cache_view
+
+
+STOCK_PAGE_SIZE = 50
+
+HANDSET_EXPORT_COLUMNS = [
+    ('handset_type__operator__name', 'Operator'),
+    ('handset_type__name', 'Type'),
+    ('serial_number', 'Serial'),
+    ('imei_number', 'IMEI'),
+    ('status', 'Status'),
+    ('current_holder__name', 'Holder'),
+    ('sold_to_customer', 'Sold To'),
+    ('created_at', 'Created At'),
+]
+
+
+def _export_handset_stock(handsets):
+    """Stream the filtered handset stock as CSV from value tuples, not model instances"""
+    rows = handsets.order_by(
+        'handset_type__operator__name', 'handset_type__name', 'serial_number'
+    ).values_list(*[field for field, _ in HANDSET_EXPORT_COLUMNS]).iterator(chunk_size=2000)
+    filename = f"handset_stock_{timezone.localdate().strftime('%Y%m%d')}.csv"
+    return stream_csv(filename, [label for _, label in HANDSET_EXPORT_COLUMNS], rows)
 
 
 # ==================== HANDSET TYPE (per operator) ====================
 
 @login_required
+@cache_view('handset_types')
 def handset_type_list(request):
     if request.user.role != 'admin':
         messages.error(request, 'Only admin can access handset types.')
@@ -117,6 +146,7 @@ def handset_purchase_add(request):
                         status='available'
                     ))
                 HandsetStock.objects.bulk_create(stocks)
+                add_purchased_stock(HANDSET, request.user.pk, htype.operator_id, len(stocks))
                 messages.success(request, f'Purchase created with {len(stocks)} handsets.')
                 return redirect('handset_purchase_list')
     types_ = HandsetType.objects.select_related('operator').all()
@@ -170,14 +200,7 @@ def handset_stock_list(request):
     )
     # CSV export
     if request.GET.get('export') == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="handset_stock.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Operator','Type','Serial','Status','Holder'])
-        for s in qs.order_by('handset_type__operator__name','handset_type__name','serial_number'):
-            holder = getattr(s.current_holder, 'name', '') if s.current_holder_id else ''
-            writer.writerow([s.handset_type.operator.name, s.handset_type.name, s.serial_number, s.status, holder])
-        return response
+        return _export_handset_stock(qs)
     return render(request, 'handset/stock_list.html', {
         'items': qs.order_by('-created_at'),
         'operators': operators,
@@ -191,6 +214,7 @@ def handset_stock_list(request):
 # ==================== HANDSET TYPE MANAGEMENT ====================
 
 @login_required
+@cache_view('handset_types')
 def handset_type_list(request):
     """List all handset types (Admin only)"""
     if request.user.role != 'admin':
@@ -307,6 +331,7 @@ def handset_purchase_add(request):
                     ))
 
                 HandsetStock.objects.bulk_create(handset_stocks)
+                add_purchased_stock(HANDSET, request.user.pk, handset_type.operator_id, len(handset_stocks))
                 messages.success(request, f'Purchase created successfully with {len(serial_numbers)} handsets!')
                 return redirect('handset_purchase_list')
     else:
@@ -385,21 +410,20 @@ def handset_stock_list(request):
             Q(sold_to_customer__icontains=search)
         )
 
-    # Operator-wise summary
-    operator_summary = handsets.values('handset_type__operator__name').annotate(
-        total=Count('id'),
-        available=Count('id', filter=Q(status='available')),
-        sold=Count('id', filter=Q(status='sold'))
-    )
+    if request.GET.get('export') == 'csv':
+        return _export_handset_stock(handsets)
 
     operators = Operator.objects.all()
     handset_types = HandsetType.objects.filter(is_active=True).select_related('operator')
 
     return render(request, 'handset/stock_list.html', {
-        'handsets': handsets.order_by('-created_at'),
+        'handsets': keyset_paginate(handsets, ('-created_at', '-id'), request.GET.get('cursor'), per_page=STOCK_PAGE_SIZE),
         'operators': operators,
         'handset_types': handset_types,
-        'operator_summary': operator_summary
+        # Maintained per holder/operator on purchase, transfer and sale (core.stock_summary)
+        'operator_summary': operator_summary(
+            HANDSET, holder=None if user.role == 'admin' else user, operator_id=operator_id
+        ),
     })
 
 
@@ -427,44 +451,51 @@ def handset_transfer_create(request):
         return redirect('dashboard')
 
     if request.method == 'POST':
-        form = HandsetTransferForm(request.POST, from_user=user)
+        form = HandsetTransferForm(request.POST, request.FILES, from_user=user)
         if form.is_valid():
-            serial_numbers_text = form.cleaned_data['serial_numbers']
             to_user = form.cleaned_data['to_user']
             remark = form.cleaned_data['remark']
 
-            # Parse serial numbers
-            serial_numbers = [sn.strip() for sn in serial_numbers_text.split('\n') if sn.strip()]
+            # Parse serial numbers (ranges expanded lazily)
+            try:
+                serial_numbers, serial_report = collect_transfer_serials(
+                    form.cleaned_data['serial_numbers'], form.cleaned_data['serial_file']
+                )
+            except SerialRangeError as e:
+                messages.error(request, str(e))
+                return redirect('handset_transfer_create')
 
-            # Get handset stocks
-            handsets = HandsetStock.objects.filter(
-                serial_number__in=serial_numbers,
-                current_holder=user,
-                status='available'
-            )
+            if not serial_numbers:
+                messages.error(request, 'No serial numbers found.')
+                return redirect('handset_transfer_create')
 
-            if handsets.count() != len(serial_numbers):
-                messages.error(request, 'Some serial numbers are invalid or not in your stock.')
+            # Resolve handset stocks in chunks
+            handset_ids, missing_count, missing_sample = find_holdings(HandsetStock, serial_numbers, user)
+            if missing_count:
+                messages.error(request, f'{missing_count} serial numbers are invalid or not in your stock (e.g. {", ".join(missing_sample)}).')
                 return redirect('handset_transfer_create')
 
             # Create transfer records with batch ID
             import uuid
             batch_id = str(uuid.uuid4())  # Unique batch identifier
 
-            transfers = []
-            for handset in handsets:
-                transfers.append(HandsetTransfer(
-                    handset=handset,
-                    from_user=user,
-                    to_user=to_user,
-                    transfer_type='transfer',
-                    status='pending',
-                    batch_id=batch_id,
-                    remark=remark
+            with transaction.atomic():
+                transferred = bulk_create_chunked(HandsetTransfer, (
+                    HandsetTransfer(
+                        handset_id=handset_id,
+                        from_user=user,
+                        to_user=to_user,
+                        transfer_type='transfer',
+                        status='pending',
+                        batch_id=batch_id,
+                        remark=remark
+                    )
+                    for handset_id in handset_ids
                 ))
 
-            HandsetTransfer.objects.bulk_create(transfers)
-            messages.success(request, f'{len(transfers)} handsets transferred to {to_user.name}. Pending acceptance.')
+            messages.success(request, f'{transferred} handsets transferred to {to_user.name}. Pending acceptance.')
+            if serial_report.batch_duplicate_count:
+                messages.warning(request, f'Ignored {serial_report.duplicate_summary()}.')
             return redirect('handset_transfer_history')
     else:
         form = HandsetTransferForm(from_user=user)
@@ -686,8 +717,7 @@ def handset_collect_from_retailer(request):
             return redirect('handset_collect_from_retailer')
 
     # Get retailers under this FOS with their total pending
-    from .models import RetailerFosMap
-    retailer_ids = RetailerFosMap.objects.filter(fos=request.user).values_list('retailer_id', flat=True)
+    retailer_ids = request.scope.retailer_ids
 
     # Get retailers with their total pending grouped by retailer
     retailers_with_pending = User.objects.filter(
@@ -16,11 +16,43 @@ from decimal import Decimal
 from .forms import (
     SimOperatorPriceForm, SimPurchaseForm, SimStockForm, SimTransferForm
 )
+from .serials import (
+    SerialIngestReport, SerialRangeError, iter_serials, dedupe_serials, find_existing_serials,
+    bulk_insert_serials, collect_transfer_serials, find_holdings, bulk_create_chunked
+)
+from .exports import stream_csv
+from .pagination import keyset_paginate
+from .query_budget import query_budget
+from .stock_summary import SIM, add_purchased_stock, operator_summary
+from .view_cache import cache_view
+
+
+STOCK_PAGE_SIZE = 50
+
+SIM_EXPORT_COLUMNS = [
+    ('operator__name', 'Operator'),
+    ('serial_number', 'Serial'),
+    ('status', 'Status'),
+    ('current_holder__name', 'Holder'),
+    ('sold_to_customer', 'Sold To'),
+    ('sold_date', 'Sold Date'),
+    ('created_at', 'Created At'),
+]
+
+
+def _export_sim_stock(sims):
+    """Stream the filtered SIM stock as CSV from value tuples, not model instances"""
+    rows = sims.order_by('operator__name', 'serial_number').values_list(
+        *[field for field, _ in SIM_EXPORT_COLUMNS]
+    ).iterator(chunk_size=2000)
+    filename = f"sim_stock_{timezone.localdate().strftime('%Y%m%d')}.csv"
+    return stream_csv(filename, [label for _, label in SIM_EXPORT_COLUMNS], rows)
 
 
 # ==================== SIM OPERATOR PRICING ====================
 
 @login_required
+@cache_view('sim_prices')
 def sim_operator_price_list(request):
     """List all SIM operator prices (Admin only)"""
     if request.user.role != 'admin':
@@ -83,42 +115,42 @@ def sim_purchase_add(request):
     if request.method == 'POST':
         form = SimPurchaseForm(request.POST)
         serial_numbers_text = request.POST.get('serial_numbers', '')
+        serial_file = request.FILES.get('serial_file')
+
+        if form.is_valid() and (serial_numbers_text.strip() or serial_file):
+            operator = form.cleaned_data['operator']
+
+            # Get operator pricing
+            try:
+                operator_price = SimOperatorPrice.objects.get(operator=operator)
+            except SimOperatorPrice.DoesNotExist:
+                messages.error(request, f'Please set pricing for {operator.name} first.')
+                return redirect('sim_operator_price_add')
+
+            # Stream serials, drop repeats within the lot, then probe the DB in chunks
+            report = SerialIngestReport()
+            serial_numbers = dedupe_serials(iter_serials(serial_numbers_text, serial_file), report)
+            find_existing_serials(SimStock, serial_numbers, report)
+
+            if report.has_duplicates:
+                messages.error(request, f'Duplicate serial numbers found: {report.duplicate_summary()}')
+                return redirect('sim_purchase_add')
+
+            # Validate quantity matches
+            if len(serial_numbers) != form.cleaned_data['total_quantity']:
+                messages.error(request, f'Serial numbers count ({len(serial_numbers)}) does not match total quantity ({form.cleaned_data["total_quantity"]}).')
+                return redirect('sim_purchase_add')
 
-        if form.is_valid() and serial_numbers_text:
             with transaction.atomic():
                 # Create purchase record
                 purchase = form.save(commit=False)
                 purchase.created_by = request.user
                 purchase.save()
 
-                # Get operator pricing
-                try:
-                    operator_price = SimOperatorPrice.objects.get(operator=purchase.operator)
-                except SimOperatorPrice.DoesNotExist:
-                    messages.error(request, f'Please set pricing for {purchase.operator.name} first.')
-                    purchase.delete()
-                    return redirect('sim_operator_price_add')
-
-                # Parse serial numbers
-                serial_numbers = [sn.strip() for sn in serial_numbers_text.split('\n') if sn.strip()]
-
-                # Validate quantity matches
-                if len(serial_numbers) != purchase.total_quantity:
-                    messages.error(request, f'Serial numbers count ({len(serial_numbers)}) does not match total quantity ({purchase.total_quantity}).')
-                    purchase.delete()
-                    return redirect('sim_purchase_add')
-
-                # Check for duplicates
-                existing_serials = SimStock.objects.filter(serial_number__in=serial_numbers).values_list('serial_number', flat=True)
-                if existing_serials:
-                    messages.error(request, f'Duplicate serial numbers found: {", ".join(existing_serials)}')
-                    purchase.delete()
-                    return redirect('sim_purchase_add')
-
-                # Create SIM stock entries
-                sim_stocks = []
-                for serial_number in serial_numbers:
-                    sim_stocks.append(SimStock(
+                # Create SIM stock entries in batches
+                bulk_insert_serials(
+                    SimStock, serial_numbers,
+                    lambda serial_number: SimStock(
                         serial_number=serial_number,
                         operator=purchase.operator,
                         purchase=purchase,
@@ -126,11 +158,15 @@ def sim_purchase_add(request):
                         purchase_price=operator_price.purchase_price,
                         selling_price=operator_price.selling_price,
                         status='available'
-                    ))
-
-                SimStock.objects.bulk_create(sim_stocks)
-                messages.success(request, f'Purchase created successfully with {len(serial_numbers)} SIM cards!')
-                return redirect('sim_purchase_list')
+                    ),
+                    report,
+                )
+                add_purchased_stock(SIM, request.user.pk, purchase.operator_id, report.inserted)
+
+            messages.success(request, f'Purchase created successfully with {report.inserted} SIM cards!')
+            return redirect('sim_purchase_list')
+        elif form.is_valid():
+            messages.error(request, 'Enter serial numbers or upload a serial file.')
     else:
         form = SimPurchaseForm()
 
@@ -203,19 +239,18 @@ def sim_stock_list(request):
             Q(sold_to_customer__icontains=search)
         )
 
-    # Operator-wise summary
-    operator_summary = sims.values('operator__name').annotate(
-        total=Count('id'),
-        available=Count('id', filter=Q(status='available')),
-        sold=Count('id', filter=Q(status='sold'))
-    )
+    if request.GET.get('export') == 'csv':
+        return _export_sim_stock(sims)
 
     operators = Operator.objects.all()
 
     return render(request, 'sim/stock_list.html', {
-        'sims': sims.order_by('-created_at'),
+        'sims': keyset_paginate(sims, ('-created_at', '-id'), request.GET.get('cursor'), per_page=STOCK_PAGE_SIZE),
         'operators': operators,
-        'operator_summary': operator_summary
+        # Maintained per holder/operator on purchase, transfer and sale (core.stock_summary)
+        'operator_summary': operator_summary(
+            SIM, holder=None if user.role == 'admin' else user, operator_id=operator_id
+        ),
     })
 
 
@@ -243,44 +278,51 @@ def sim_transfer_create(request):
         return redirect('dashboard')
 
     if request.method == 'POST':
-        form = SimTransferForm(request.POST, from_user=user)
+        form = SimTransferForm(request.POST, request.FILES, from_user=user)
         if form.is_valid():
-            serial_numbers_text = form.cleaned_data['serial_numbers']
             to_user = form.cleaned_data['to_user']
             remark = form.cleaned_data['remark']
 
-            # Parse serial numbers
-            serial_numbers = [sn.strip() for sn in serial_numbers_text.split('\n') if sn.strip()]
+            # Parse serial numbers (ranges expanded lazily)
+            try:
+                serial_numbers, serial_report = collect_transfer_serials(
+                    form.cleaned_data['serial_numbers'], form.cleaned_data['serial_file']
+                )
+            except SerialRangeError as e:
+                messages.error(request, str(e))
+                return redirect('sim_transfer_create')
 
-            # Get SIM stocks
-            sims = SimStock.objects.filter(
-                serial_number__in=serial_numbers,
-                current_holder=user,
-                status='available'
-            )
+            if not serial_numbers:
+                messages.error(request, 'No serial numbers found.')
+                return redirect('sim_transfer_create')
 
-            if sims.count() != len(serial_numbers):
-                messages.error(request, 'Some serial numbers are invalid or not in your stock.')
+            # Resolve SIM stocks in chunks
+            sim_ids, missing_count, missing_sample = find_holdings(SimStock, serial_numbers, user)
+            if missing_count:
+                messages.error(request, f'{missing_count} serial numbers are invalid or not in your stock (e.g. {", ".join(missing_sample)}).')
                 return redirect('sim_transfer_create')
 
             # Create transfer records with batch ID
             import uuid
             batch_id = str(uuid.uuid4())  # Unique batch identifier
 
-            transfers = []
-            for sim in sims:
-                transfers.append(SimTransfer(
-                    sim=sim,
-                    from_user=user,
-                    to_user=to_user,
-                    transfer_type='transfer',
-                    status='pending',
-                    batch_id=batch_id,
-                    remark=remark
+            with transaction.atomic():
+                transferred = bulk_create_chunked(SimTransfer, (
+                    SimTransfer(
+                        sim_id=sim_id,
+                        from_user=user,
+                        to_user=to_user,
+                        transfer_type='transfer',
+                        status='pending',
+                        batch_id=batch_id,
+                        remark=remark
+                    )
+                    for sim_id in sim_ids
                 ))
 
-            SimTransfer.objects.bulk_create(transfers)
-            messages.success(request, f'{len(transfers)} SIM cards transferred to {to_user.name}. Pending acceptance.')
+            messages.success(request, f'{transferred} SIM cards transferred to {to_user.name}. Pending acceptance.')
+            if serial_report.batch_duplicate_count:
+                messages.warning(request, f'Ignored {serial_report.duplicate_summary()}.')
             return redirect('sim_transfer_history')
     else:
         form = SimTransferForm(from_user=user)
@@ -288,6 +330,7 @@ def sim_transfer_create(request):
     return render(request, 'sim/transfer_create.html', {'form': form})
 
 
+@query_budget(10)
 @login_required
 def sim_transfer_pending(request):
     """View pending SIM transfers (receiver) - grouped by batch"""
@@ -418,7 +461,7 @@ def sim_return_create(request):
             to_user = user.supervisor
         elif user.role == 'supervisor':
             # Return to admin
-            to_user = User.objects.filter(role='admin').first()
+            to_user = request.scope.admin_user
         else:
             messages.error(request, 'Cannot determine return target.')
             return redirect('sim_stock_list')
@@ -427,34 +470,40 @@ def sim_return_create(request):
             messages.error(request, 'Return target not found.')
             return redirect('sim_stock_list')
 
-        # Parse serial numbers
-        serial_numbers = [sn.strip() for sn in serial_numbers_text.split('\n') if sn.strip()]
+        # Parse serial numbers (ranges expanded lazily)
+        try:
+            serial_numbers, serial_report = collect_transfer_serials(serial_numbers_text, request.FILES.get('serial_file'))
+        except SerialRangeError as e:
+            messages.error(request, str(e))
+            return redirect('sim_return_create')
 
-        # Get SIM stocks
-        sims = SimStock.objects.filter(
-            serial_number__in=serial_numbers,
-            current_holder=user,
-            status='available'
-        )
+        if not serial_numbers:
+            messages.error(request, 'No serial numbers found.')
+            return redirect('sim_return_create')
 
-        if sims.count() != len(serial_numbers):
-            messages.error(request, 'Some serial numbers are invalid or not in your stock.')
+        # Resolve SIM stocks in chunks
+        sim_ids, missing_count, missing_sample = find_holdings(SimStock, serial_numbers, user)
+        if missing_count:
+            messages.error(request, f'{missing_count} serial numbers are invalid or not in your stock (e.g. {", ".join(missing_sample)}).')
             return redirect('sim_return_create')
 
         # Create return transfers
-        transfers = []
-        for sim in sims:
-            transfers.append(SimTransfer(
-                sim=sim,
-                from_user=user,
-                to_user=to_user,
-                transfer_type='return',
-                status='pending',
-                remark=remark
+        with transaction.atomic():
+            returned = bulk_create_chunked(SimTransfer, (
+                SimTransfer(
+                    sim_id=sim_id,
+                    from_user=user,
+                    to_user=to_user,
+                    transfer_type='return',
+                    status='pending',
+                    remark=remark
+                )
+                for sim_id in sim_ids
             ))
 
-        SimTransfer.objects.bulk_create(transfers)
-        messages.success(request, f'{len(transfers)} SIM cards returned to {to_user.name}. Pending acceptance.')
+        messages.success(request, f'{returned} SIM cards returned to {to_user.name}. Pending acceptance.')
+        if serial_report.batch_duplicate_count:
+            messages.warning(request, f'Ignored {serial_report.duplicate_summary()}.')
         return redirect('sim_transfer_history')
 
     return render(request, 'sim/return_create.html', {})
@@ -624,7 +673,7 @@ def ec_return_create(request):
         elif user.role == 'fos':
             to_user = user.supervisor
         elif user.role == 'supervisor':
-            to_user = User.objects.filter(role='admin').first()
+            to_user = request.scope.admin_user
         else:
             messages.error(request, 'Cannot determine return target.')
             return redirect('ec_stock_overview')
@@ -782,8 +831,7 @@ def sim_collect_from_retailer(request):
             return redirect('sim_collect_from_retailer')
 
     # Get retailers under this FOS with their total pending
-    from .models import RetailerFosMap
-    retailer_ids = RetailerFosMap.objects.filter(fos=request.user).values_list('retailer_id', flat=True)
+    retailer_ids = request.scope.retailer_ids
 
     # Get retailers with their total pending grouped by retailer
     from django.db.models import Prefetch
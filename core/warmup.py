@@ -0,0 +1,36 @@
+"""
+Process start-up warmup
+
+Each wfastcgi process serves requests one at a time on its main thread, and
+with CONN_MAX_AGE set that thread keeps its MySQL connection between
+requests (CONN_HEALTH_CHECKS pings it before reuse after an idle spell).
+``warm_up()`` runs from wsgi.py when a process starts, so the first request
+does not pay for the MySQL handshake or for building the process-wide tables.
+"""
+import logging
+import time
+
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Open each database connection and build the per-process tables; never raises"""
+    started = time.perf_counter()
+    try:
+        for connection in connections.all():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        from .master_data import get_master_bundle
+        from .routing import get_routing_table
+
+        get_routing_table()
+        get_master_bundle()
+    except DatabaseError:
+        # The first request will retry; a down database must not stop the process starting
+        logger.exception('Warmup failed')
+        return False
+    logger.info('Warmup done in %.0fms', (time.perf_counter() - started) * 1000)
+    return True
@@ -0,0 +1,354 @@
+"""
+Bulk work-order intake
+
+Operators send daily job sheets of hundreds of works. Rows from an Excel/CSV
+upload or a JSON list are validated against in-memory lookups (operators,
+service types, work-from roles, work master options and the cached pincode
+routing table), so validation costs a handful of queries for the whole sheet
+instead of several per row. Valid rows are inserted with batched
+``bulk_create`` together with their WorkReport rows, and each supervisor gets
+one summary message through the WhatsApp outbox.
+"""
+import logging
+import os
+import uuid
+from collections import Counter
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import CharField
+from django.utils import timezone
+
+from .models import (
+    User, WorkStb, WorkReport, Operator, TypeOfService, WorkFromTheRole,
+    WorkCategoryOption, WorkWarrantyOption, WorkJobTypeOption,
+    WorkDthTypeOption, WorkFiberTypeOption, WorkFrIssueOption,
+)
+from .notifications import queue_whatsapp
+from .routing import route_supervisor_id
+
+logger = logging.getLogger(__name__)
+
+WORK_INTAKE_BATCH_SIZE = 500
+MAX_INTAKE_ROWS = 5000
+REPORT_SAMPLE_SIZE = 50
+# Sheet row of the first work: row 1 is the header
+SHEET_FIRST_ROW = 2
+
+# Sheet header -> WorkStb field. JSON payloads use the field names directly.
+WORK_SHEET_COLUMNS = {
+    'Customer Name': 'customer_name',
+    'Address': 'address',
+    'Pincode': 'pincode',
+    'Mobile No': 'mobile_no',
+    'Alternate No': 'alternate_no',
+    'WhatsApp No': 'wp_no',
+    'Operator': 'operator',
+    'Service Type': 'type_of_service',
+    'Work From': 'work_from',
+    'Deadline': 'work_deadline_time',
+    'Amount': 'amount',
+    'Remark': 'remark',
+    'Warranty': 'warranty',
+    'Category': 'category',
+    'DTH Type': 'dth_type',
+    'Fiber Type': 'fiber_type',
+    'Job Type': 'job_type',
+    'FR Issue': 'fr_issue',
+}
+REQUIRED_FIELDS = ['customer_name', 'address', 'pincode', 'mobile_no', 'operator', 'type_of_service', 'work_from', 'amount']
+
+_OPTION_FIELDS = [
+    ('category', WorkCategoryOption),
+    ('warranty', WorkWarrantyOption),
+    ('job_type', WorkJobTypeOption),
+    ('dth_type', WorkDthTypeOption),
+    ('fiber_type', WorkFiberTypeOption),
+    ('fr_issue', WorkFrIssueOption),
+]
+
+# Free-text fields checked against the column width, so one overlong cell is a row error, not a DataError
+_MAX_LENGTHS = {
+    field: WorkStb._meta.get_field(field).max_length
+    for field in ('customer_name', 'pincode', 'mobile_no', 'alternate_no', 'wp_no')
+    if isinstance(WorkStb._meta.get_field(field), CharField)
+}
+
+# WorkStb.amount's precision: values are rounded to its decimal places and must fit its digits
+_AMOUNT_FIELD = WorkStb._meta.get_field('amount')
+_AMOUNT_STEP = Decimal(1).scaleb(-_AMOUNT_FIELD.decimal_places)
+_AMOUNT_LIMIT = Decimal(10) ** (_AMOUNT_FIELD.max_digits - _AMOUNT_FIELD.decimal_places)
+
+_DEADLINE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M',
+    '%d-%m-%Y %H:%M', '%d/%m/%Y %H:%M', '%d.%m.%Y %H:%M',
+    '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%d.%m.%Y',
+]
+
+
+class WorkIntakeError(ValueError):
+    """Raised when a sheet or payload cannot be read at all"""
+
+
+class WorkIntakeReport:
+    """Outcome of one intake: created works and per-row errors"""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.created = []
+        self.error_count = 0
+        self.errors = []   # [(row_number, message)], first REPORT_SAMPLE_SIZE only
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < REPORT_SAMPLE_SIZE:
+            self.errors.append((row_number, message))
+
+    def error_summary(self):
+        return '; '.join(f'row {row}: {message}' for row, message in self.errors)
+
+
+# ==================== READING ====================
+
+def _header_key(header):
+    return ' '.join(str(header).split()).lower()
+
+
+_HEADER_LOOKUP = {_header_key(header): field for header, field in WORK_SHEET_COLUMNS.items()}
+_HEADER_LOOKUP.update({field: field for field in WORK_SHEET_COLUMNS.values()})
+
+
+def read_work_sheet(upload):
+    """Read an uploaded .xlsx/.xls/.csv job sheet into a list of {field: text} rows"""
+    import pandas as pd
+
+    extension = os.path.splitext(upload.name or '')[1].lower()
+    try:
+        if extension == '.csv':
+            df = pd.read_csv(upload, dtype=str, keep_default_na=False)
+        else:
+            df = pd.read_excel(upload, dtype=str, keep_default_na=False)
+    except Exception as e:
+        raise WorkIntakeError(f'Could not read the file: {e}')
+
+    columns = {}
+    for column in df.columns:
+        field = _HEADER_LOOKUP.get(_header_key(column))
+        if field:
+            columns[column] = field
+    missing = [header for header, field in WORK_SHEET_COLUMNS.items() if field in REQUIRED_FIELDS and field not in columns.values()]
+    if missing:
+        raise WorkIntakeError(f'Missing columns: {", ".join(missing)}')
+    if len(df) > MAX_INTAKE_ROWS:
+        raise WorkIntakeError(f'The sheet has {len(df)} rows; the limit is {MAX_INTAKE_ROWS}.')
+
+    df = df[list(columns)].rename(columns=columns)
+    return df.to_dict('records')
+
+
+# ==================== VALIDATION ====================
+
+def _text(value):
+    if value is None:
+        return ''
+    text = str(value).strip()
+    # Numbers read from Excel as text can come through as "9876543210.0"
+    if text.endswith('.0') and text[:-2].isdigit():
+        text = text[:-2]
+    return text
+
+
+def _by_id_or_name(model):
+    lookup = {}
+    for obj in model.objects.all():
+        lookup[str(obj.pk)] = obj
+        lookup[obj.name.strip().lower()] = obj
+    return lookup
+
+
+def _option_lookup(model):
+    lookup = {}
+    for code, name in model.objects.filter(is_active=True).values_list('code', 'name'):
+        lookup[code.lower()] = code
+        lookup[name.strip().lower()] = code
+    return lookup
+
+
+def _parse_deadline(value):
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = _text(value)
+        if not text:
+            return None
+        for fmt in _DEADLINE_FORMATS:
+            try:
+                parsed = datetime.strptime(text, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f'Invalid deadline "{text}"')
+        if len(text) <= 10:
+            # Date only: due by the end of that day
+            parsed = parsed.replace(hour=23, minute=59)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class WorkRowValidator:
+    """Validates intake rows against lookups loaded once per intake"""
+
+    def __init__(self):
+        self.operators = _by_id_or_name(Operator)
+        self.services = _by_id_or_name(TypeOfService)
+        self.work_from = _by_id_or_name(WorkFromTheRole)
+        self.options = {field: _option_lookup(model) for field, model in _OPTION_FIELDS}
+
+    def build(self, row, created_by=None):
+        """Return an unsaved WorkStb for ``row`` or raise ValueError with the reasons"""
+        data = {field: _text(row.get(field)) for field in WORK_SHEET_COLUMNS.values() if field != 'work_deadline_time'}
+        problems = [f'{field.replace("_", " ")} is required' for field in REQUIRED_FIELDS if not data.get(field)]
+        if problems:
+            raise ValueError(', '.join(problems))
+
+        for field, max_length in _MAX_LENGTHS.items():
+            if len(data[field]) > max_length:
+                problems.append(f'{field.replace("_", " ")} is longer than {max_length} characters')
+
+        supervisor_id = route_supervisor_id(data['pincode'])
+        if not supervisor_id:
+            problems.append(f'pincode {data["pincode"]} is not assigned to a supervisor')
+
+        operator = self.operators.get(data['operator'].lower())
+        service = self.services.get(data['type_of_service'].lower())
+        work_from = self.work_from.get(data['work_from'].lower())
+        if not operator:
+            problems.append(f'unknown operator "{data["operator"]}"')
+        if not service:
+            problems.append(f'unknown service type "{data["type_of_service"]}"')
+        if not work_from:
+            problems.append(f'unknown work from "{data["work_from"]}"')
+
+        try:
+            amount = Decimal(data['amount'])
+            if amount < 0 or not amount.is_finite():
+                raise InvalidOperation
+            amount = amount.quantize(_AMOUNT_STEP, rounding=ROUND_HALF_UP)
+        except InvalidOperation:
+            amount = None
+            problems.append(f'invalid amount "{data["amount"]}"')
+        else:
+            # Past max_digits MySQL strict mode fails the whole bulk insert
+            if amount >= _AMOUNT_LIMIT:
+                problems.append(f'amount must be below {_AMOUNT_LIMIT}')
+
+        try:
+            deadline = _parse_deadline(row.get('work_deadline_time'))
+        except ValueError as e:
+            deadline = None
+            problems.append(str(e))
+
+        options = {}
+        for field, _ in _OPTION_FIELDS:
+            if not data[field]:
+                continue
+            code = self.options[field].get(data[field].lower())
+            if code is None:
+                problems.append(f'unknown {field.replace("_", " ")} "{data[field]}"')
+            options[field] = code
+
+        if problems:
+            raise ValueError(', '.join(problems))
+
+        work = WorkStb(
+            customer_name=data['customer_name'],
+            address=data['address'],
+            pincode=data['pincode'],
+            mobile_no=data['mobile_no'],
+            alternate_no=data['alternate_no'] or None,
+            wp_no=data['wp_no'] or None,
+            operator=operator,
+            type_of_service=service,
+            work_from=work_from,
+            work_deadline_time=deadline,
+            amount=amount,
+            remark=data['remark'] or None,
+            supervisor_id=supervisor_id,
+            # Only the id: API callers pass simplejwt's TokenUser, which is not a User instance
+            created_by_id=created_by.pk if created_by is not None else None,
+            # Same rule as WorkForm.save
+            kind='installation' if 'install' in (service.name or '').lower() else 'service',
+            **options,
+        )
+        return work
+
+
+# ==================== INSERTION ====================
+
+def bulk_create_works(works, batch_size=WORK_INTAKE_BATCH_SIZE):
+    """
+    Insert ``works`` and one WorkReport each, in batches and in one transaction.
+    bulk_create bypasses the WorkStb post_save signal, so the reports are
+    created here. Returns the saved works (with primary keys).
+    """
+    if not works:
+        return []
+
+    batch = uuid.uuid4().hex
+    for work in works:
+        work.intake_batch = batch
+    with transaction.atomic():
+        WorkStb.objects.bulk_create(works, batch_size=batch_size)
+        if any(work.pk is None for work in works):
+            # MySQL does not return ids from a bulk insert; re-read exactly this batch
+            saved = list(
+                WorkStb.objects.filter(intake_batch=batch)
+                .select_related('operator', 'type_of_service', 'work_from').order_by('id')
+            )
+        else:
+            saved = works
+        WorkReport.objects.bulk_create([WorkReport(work_id=work.pk) for work in saved], batch_size=batch_size)
+    return saved
+
+
+def intake_works(rows, created_by=None, notify=True, first_row=1):
+    """
+    Validate ``rows`` ({field: value} dicts), insert the valid ones and return
+    a WorkIntakeReport. Errors are numbered from ``first_row`` (SHEET_FIRST_ROW
+    for sheets, so they match the line the operator sees).
+    """
+    report = WorkIntakeReport()
+    validator = WorkRowValidator()
+    works = []
+    for number, row in enumerate(rows, start=first_row):
+        report.total_rows += 1
+        if not isinstance(row, dict):
+            report.add_error(number, 'not an object')
+            continue
+        try:
+            works.append(validator.build(row, created_by=created_by))
+        except ValueError as e:
+            report.add_error(number, str(e))
+
+    report.created = bulk_create_works(works)
+    logger.info('Work intake: %d rows, %d created, %d rejected', report.total_rows, len(report.created), report.error_count)
+
+    if notify and report.created:
+        queue_supervisor_notifications(Counter(work.supervisor_id for work in report.created if work.supervisor_id))
+    return report
+
+
+# ==================== NOTIFICATIONS ====================
+
+def queue_supervisor_notifications(counts):
+    """Queue one WhatsApp summary per supervisor ({supervisor_id: n}) on the outbox"""
+    for supervisor in User.objects.filter(pk__in=counts).only('id', 'name', 'phone', 'whatsapp_no'):
+        message = (
+            f"*New Works Received*\n\n"
+            f"{counts[supervisor.pk]} new work(s) were added for your area.\n"
+            f"Please assign them to technicians."
+        )
+        queue_whatsapp(supervisor.whatsapp_no or supervisor.phone, message, kind='work_summary')
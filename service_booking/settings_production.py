@@ -3,6 +3,7 @@ Production settings for IIS deployment
 """
 
 import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -35,11 +36,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For static files
+    'core.middleware.QueryInspectorMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RequestScopeMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -73,6 +76,11 @@ DATABASES = {
         'PASSWORD': os.environ.get('DB_PASSWORD', '1234'),
         'HOST': os.environ.get('DB_HOST', 'localhost'),
         'PORT': os.environ.get('DB_PORT', '3306'),
+        # Keep each wfastcgi process's connection between requests instead of
+        # reconnecting every time; must stay below MySQL's wait_timeout (8h default)
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        # Ping a reused connection before the request uses it
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
             'charset': 'utf8mb4',
@@ -80,6 +88,36 @@ DATABASES = {
     }
 }
 
+# Cache tiers (see core/caching.py). IIS runs several wfastcgi processes, so
+# 'default' must be shared between them: the file system by default, or the
+# database with DJANGO_SHARED_CACHE=db (run "manage.py createcachetable" once).
+# 'local' is each process's own LRU for large, rebuildable values.
+if os.environ.get('DJANGO_SHARED_CACHE', 'file') == 'db':
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'core_cache',
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        # The IIS app pool identity needs write access to this directory
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', os.path.join(BASE_DIR, 'cache')),
+    }
+
+CACHES = {
+    'default': {
+        **SHARED_CACHE,
+        'KEY_PREFIX': 'ybs',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ybs-local',
+        'KEY_PREFIX': 'ybs',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -119,11 +157,21 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
 }
 
+# API auth: stateless JWT for the app (core.api_auth), sessions for the web UI
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(hours=12),
+    'REFRESH_TOKEN_LIFETIME': timedelta(days=30),
+}
+
+# WhatsApp gateway (core.notifications); `manage.py check` warns while it is unset
+WHATSAPP_API_TOKEN = os.environ.get('WHATSAPP_API_TOKEN', '')
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
@@ -154,6 +202,10 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        'queries': {
+            'format': '{asctime} {levelname} {message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'file': {
@@ -167,6 +219,15 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        # One JSON line per request from core.query_budget
+        'queries': {
+            'level': 'INFO',
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs', 'queries.log'),
+            'maxBytes': 50 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'queries',
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
@@ -178,5 +239,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': False,
         },
+        'core.queries': {
+            'handlers': ['queries'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
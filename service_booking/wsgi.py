@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+import pymysql
 from django.core.wsgi import get_wsgi_application
 
+# Same MySQL driver as manage.py
+pymysql.install_as_MySQLdb()
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'service_booking.settings')
 
 application = get_wsgi_application()
+
+if os.environ.get('DJANGO_WARMUP', 'True') == 'True':
+    from core.warmup import warm_up
+
+    warm_up()